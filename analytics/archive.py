@@ -0,0 +1,320 @@
+"""
+Columnar transaction archive
+Copies closed days of `transactions` into one NumPy array per column, so
+backtests and reports scan history at memory bandwidth instead of through
+SQLite row by row. Arrays are saved as .npy files and loaded memory-mapped:
+a loaded day is a set of read-only views into the page cache, not a copy.
+
+Within a day, rows are sorted by user and then time, so one user's
+transactions are contiguous and in order. String columns are dictionary
+encoded into uint32 codes. The dictionaries are shared by all days and only
+ever appended to, so a code means the same value in every day.
+
+Layout:
+    <root>/manifest.json          archived days and their row counts
+    <root>/dictionaries.json      users, merchants and categories; position = code
+    <root>/<YYYY-MM-DD>/<column>.npy
+
+Columns:
+    ts             float64  seconds since the epoch of the stored (naive) timestamp
+    user           uint32   code into users
+    merchant       uint32   code into merchants
+    category       uint32   code into categories
+    amount         float64
+    international  uint8
+
+Usage:
+    python -m analytics.archive build                        # every closed day not yet archived
+    python -m analytics.archive build --start 2026-01-01 --end 2026-01-31
+    python -m analytics.archive info
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+import config
+
+
+COLUMNS = {
+    'ts': np.float64,
+    'user': np.uint32,
+    'merchant': np.uint32,
+    'category': np.uint32,
+    'amount': np.float64,
+    'international': np.uint8
+}
+
+# Dictionary-encoded columns and the transaction field each one encodes
+DICTIONARIES = {
+    'user': ('users', 'user_id'),
+    'merchant': ('merchants', 'merchant_id'),
+    'category': ('categories', 'merchant_category')
+}
+
+_DAY_QUERY = (
+    "SELECT timestamp, user_id, merchant_id, merchant_category, amount, is_international "
+    "FROM transactions WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+)
+
+VERSION = 1
+
+
+class Dictionary:
+    """Append-only mapping between strings and dense uint32 codes"""
+
+    def __init__(self, values: List[str] = None):
+
+        self.values = list(values or [])
+        self.index = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, values: List[str]) -> np.ndarray:
+
+        if not values:
+            return np.empty(0, dtype=np.uint32)
+
+        # Look up each distinct value once, then map the whole chunk through the result
+        uniques, inverse = np.unique(np.array(values, dtype=object), return_inverse=True)
+        codes = np.empty(len(uniques), dtype=np.uint32)
+        for i, value in enumerate(uniques):
+            code = self.index.get(value)
+            if code is None:
+                code = self.index[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes[inverse]
+
+    def decode(self, codes) -> List[str]:
+
+        values = self.values
+        return [values[code] for code in np.asarray(codes).tolist()]
+
+    def __len__(self):
+
+        return len(self.values)
+
+
+def epoch_seconds(timestamps: List[str]) -> np.ndarray:
+
+    micros = np.array(timestamps, dtype='datetime64[us]').astype(np.int64)
+    return micros / 1e6
+
+
+def _write_json(path: str, data):
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Archive:
+
+    def __init__(self, root: str = None):
+
+        self.root = root or config.ARCHIVE_DIR
+        self.manifest = {'version': VERSION, 'days': {}}
+        self.dictionaries = {name: Dictionary() for name, _ in DICTIONARIES.values()}
+
+        manifest_path = os.path.join(self.root, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('version') != VERSION:
+                raise ValueError(f"Unsupported archive version {self.manifest.get('version')}")
+
+            with open(os.path.join(self.root, 'dictionaries.json')) as f:
+                stored = json.load(f)
+            self.dictionaries = {name: Dictionary(stored[name]) for name in self.dictionaries}
+
+    def days(self, start_day: str = None, end_day: str = None) -> List[str]:
+
+        return sorted(
+            day for day in self.manifest['days']
+            if (start_day is None or day >= start_day) and (end_day is None or day <= end_day)
+        )
+
+    def rows(self, day: str) -> int:
+
+        return self.manifest['days'][day]['rows']
+
+    def load_day(self, day: str) -> Dict[str, np.ndarray]:
+
+        if day not in self.manifest['days']:
+            raise KeyError(f"{day} is not archived")
+
+        directory = os.path.join(self.root, day)
+        # Memory-mapped and read-only: pages are read on first touch and shared with the OS cache
+        return {
+            column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r')
+            for column in COLUMNS
+        }
+
+    def iter_days(self, start_day: str = None, end_day: str = None) -> Iterator[Tuple[str, Dict[str, np.ndarray]]]:
+
+        for day in self.days(start_day, end_day):
+            yield day, self.load_day(day)
+
+    def load_range(self, start_day: str = None, end_day: str = None) -> Dict[str, np.ndarray]:
+
+        days = self.days(start_day, end_day)
+        if len(days) == 1:
+            return self.load_day(days[0])
+
+        loaded = [self.load_day(day) for day in days]
+        columns = {
+            column: np.concatenate([data[column] for data in loaded]) if loaded
+            else np.empty(0, dtype=dtype)
+            for column, dtype in COLUMNS.items()
+        }
+        # Each day is sorted by user; across days the order has to be rebuilt
+        order = np.lexsort((columns['ts'], columns['user']))
+        return {column: values[order] for column, values in columns.items()}
+
+    def decode(self, column: str, codes) -> List[str]:
+
+        name, _ = DICTIONARIES[column]
+        return self.dictionaries[name].decode(codes)
+
+    def code(self, column: str, value: str) -> Optional[int]:
+
+        name, _ = DICTIONARIES[column]
+        return self.dictionaries[name].index.get(value)
+
+    def write_day(self, day: str, columns: Dict[str, np.ndarray]):
+
+        os.makedirs(self.root, exist_ok=True)
+        # Saved first: a day on disk never refers to a code the dictionaries do not have
+        _write_json(
+            os.path.join(self.root, 'dictionaries.json'),
+            {name: dictionary.values for name, dictionary in self.dictionaries.items()}
+        )
+
+        directory = os.path.join(self.root, day)
+        tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for column, dtype in COLUMNS.items():
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), np.ascontiguousarray(columns[column], dtype=dtype))
+
+        if os.path.exists(directory):
+            old_dir = f"{directory}.old"
+            os.replace(directory, old_dir)
+            os.replace(tmp_dir, directory)
+            shutil.rmtree(old_dir)
+        else:
+            os.replace(tmp_dir, directory)
+
+        self.manifest['days'][day] = {
+            'rows': int(len(columns['ts'])),
+            'built_at': datetime.now().isoformat()
+        }
+        _write_json(os.path.join(self.root, 'manifest.json'), self.manifest)
+
+
+def read_day(db, archive: Archive, day: str, chunk_rows: int = None) -> Dict[str, np.ndarray]:
+
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    chunks = {column: [] for column in COLUMNS}
+
+    for rows in db.iter_query(_DAY_QUERY, (day, next_day), batch_size=chunk_rows or config.ARCHIVE_CHUNK_ROWS):
+        chunks['ts'].append(epoch_seconds([row['timestamp'] for row in rows]))
+        for column, (name, field) in DICTIONARIES.items():
+            chunks[column].append(archive.dictionaries[name].encode([row[field] for row in rows]))
+        chunks['amount'].append(np.fromiter((row['amount'] for row in rows), dtype=np.float64, count=len(rows)))
+        chunks['international'].append(
+            np.fromiter((row['is_international'] or 0 for row in rows), dtype=np.uint8, count=len(rows))
+        )
+
+    columns = {
+        column: np.concatenate(parts) if parts else np.empty(0, dtype=COLUMNS[column])
+        for column, parts in chunks.items()
+    }
+    # Read in time order (an index range scan); user-major order is cheaper to get here than from SQLite
+    order = np.lexsort((columns['ts'], columns['user']))
+    return {column: values[order] for column, values in columns.items()}
+
+
+def build_archive(db, root: str = None, start_day: str = None, end_day: str = None,
+                  chunk_rows: int = None) -> Dict:
+
+    started = time.perf_counter()
+    archive = Archive(root)
+
+    # Today is still being written to, so by default only closed days are archived
+    end_day = end_day or (date.today() - timedelta(days=1)).isoformat()
+    if start_day is None:
+        archived = archive.days()
+        if archived:
+            start_day = (date.fromisoformat(archived[-1]) + timedelta(days=1)).isoformat()
+        else:
+            first = db.execute_query("SELECT MIN(timestamp) AS first FROM transactions")[0]['first']
+            start_day = first[:10] if first else end_day
+
+    report = {'days': 0, 'rows': 0}
+    day = date.fromisoformat(start_day)
+    while day.isoformat() <= end_day:
+        columns = read_day(db, archive, day.isoformat(), chunk_rows)
+        archive.write_day(day.isoformat(), columns)
+        report['days'] += 1
+        report['rows'] += len(columns['ts'])
+        day += timedelta(days=1)
+
+    report['start_day'] = start_day
+    report['end_day'] = end_day
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Build or inspect the columnar transaction archive")
+    parser.add_argument('--root', default=config.ARCHIVE_DIR, help="archive directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="archive days from the database")
+    build.add_argument('--start', help="first day (default: the day after the last archived day)")
+    build.add_argument('--end', help="last day (default: yesterday)")
+    build.add_argument('--db', default=config.DATABASE_PATH, help="SQLite database path")
+    build.add_argument('--chunk-rows', type=int, default=config.ARCHIVE_CHUNK_ROWS, help="rows fetched per chunk")
+
+    commands.add_parser('info', help="list archived days and time a full scan")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        from database.db import Database
+
+        report = build_archive(Database(args.db), args.root, args.start, args.end, args.chunk_rows)
+        print(
+            f"Archived {report['rows']:,} rows over {report['days']} days "
+            f"({report['start_day']} to {report['end_day']}) in {report['elapsed_seconds']}s"
+        )
+        return 0
+
+    archive = Archive(args.root)
+    started = time.perf_counter()
+    total_rows = 0
+    total_amount = 0.0
+    for day, columns in archive.iter_days():
+        total_amount += float(columns['amount'].sum())
+        total_rows += len(columns['amount'])
+        print(f"  {day}{archive.rows(day):>14,} rows")
+
+    elapsed = time.perf_counter() - started
+    sizes = ', '.join(f"{len(d):,} {name}" for name, d in archive.dictionaries.items())
+    print(f"{len(archive.days())} days, {total_rows:,} rows, {sizes}")
+    print(f"Scanned amount (total {total_amount:,.2f}) in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
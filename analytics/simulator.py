@@ -0,0 +1,331 @@
+"""
+What-if threshold simulator
+Answers "how many alerts would we have raised if these config values were
+different?" over archived history, for a whole grid of values at once. The
+per-transaction quantities every threshold is compared against are computed
+once per period:
+- amounts
+- rolling 24-hour spend
+- per-user counts in the last minute, hour and day
+- category counts
+
+The arrays are sorted, or turned into cumulative histograms. Each grid point
+is then a handful of binary searches and table lookups, not a replay through
+RuleEngine.
+
+Simulated rules and their parameters:
+    AMOUNT_THRESHOLD    AMOUNT_THRESHOLD_MEDIUM, AMOUNT_THRESHOLD_HIGH
+    VELOCITY            VELOCITY_MAX_PER_MINUTE, VELOCITY_MAX_PER_HOUR, VELOCITY_MAX_PER_DAY
+    DAILY_LIMIT         DAILY_LIMIT_MEDIUM, DAILY_LIMIT_HIGH
+    HIGH_RISK_MERCHANT  HIGH_RISK_MERCHANTS, MEDIUM_RISK_MERCHANTS
+    RAPID_SUCCESSION    RAPID_SUCCESSION_WINDOW
+
+Windows match the live engine, which evaluates a transaction after storing
+it: each window includes the transaction itself and the same user's earlier
+transactions at most window seconds older. Times are compared at
+millisecond resolution. The sketch, anomaly and custom rules keep
+sequential state and are not simulated.
+
+Usage:
+    python -m analytics.simulator --start 2026-01-01 --end 2026-01-31 \\
+        --grid '{"AMOUNT_THRESHOLD_HIGH": [400000, 500000], "VELOCITY_MAX_PER_HOUR": [5, 8]}'
+    python -m analytics.simulator --start 2026-01-01 --end 2026-01-31 --grid-file grid.json --json
+"""
+
+from datetime import date, timedelta
+from itertools import product
+from typing import Dict, List, Optional
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from analytics.archive import Archive, epoch_seconds
+import config
+
+
+PARAMETERS = {
+    'AMOUNT_THRESHOLD_MEDIUM': 'AMOUNT_THRESHOLD',
+    'AMOUNT_THRESHOLD_HIGH': 'AMOUNT_THRESHOLD',
+    'VELOCITY_MAX_PER_MINUTE': 'VELOCITY',
+    'VELOCITY_MAX_PER_HOUR': 'VELOCITY',
+    'VELOCITY_MAX_PER_DAY': 'VELOCITY',
+    'DAILY_LIMIT_MEDIUM': 'DAILY_LIMIT',
+    'DAILY_LIMIT_HIGH': 'DAILY_LIMIT',
+    'HIGH_RISK_MERCHANTS': 'HIGH_RISK_MERCHANT',
+    'MEDIUM_RISK_MERCHANTS': 'HIGH_RISK_MERCHANT',
+    'RAPID_SUCCESSION_WINDOW': 'RAPID_SUCCESSION'
+}
+
+SEVERITIES = {
+    'AMOUNT_THRESHOLD': ['HIGH', 'MEDIUM'],
+    'VELOCITY': ['CRITICAL', 'HIGH', 'MEDIUM'],
+    'DAILY_LIMIT': ['HIGH', 'MEDIUM'],
+    'HIGH_RISK_MERCHANT': ['HIGH', 'MEDIUM'],
+    'RAPID_SUCCESSION': ['HIGH', 'MEDIUM']
+}
+
+# Fixed in the rules themselves rather than in config
+_MINUTE, _HOUR, _DAY = 60, 3600, 86400
+
+
+def baseline() -> Dict:
+
+    return {name: getattr(config, name) for name in PARAMETERS}
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+
+    unknown = sorted(set(grid) - set(PARAMETERS))
+    if unknown:
+        raise ValueError(f"Cannot simulate {', '.join(unknown)}; supported: {', '.join(PARAMETERS)}")
+
+    names = list(grid)
+    return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+
+class Simulator:
+    """Alert counts per rule and severity for any parameter values, over one set of archived columns"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: List[str], count_from: float = None):
+
+        # Sorted by user and then time, as the archive returns them
+        self.ts = columns['ts']
+        self.amount = columns['amount']
+        self.category = columns['category']
+        self.categories = [category.lower() for category in categories]
+
+        # Rows before count_from only give windows their history; they raise no alerts
+        self.counted = np.ones(len(self.ts), dtype=bool) if count_from is None else self.ts >= count_from
+        self.transactions = int(self.counted.sum())
+
+        # One axis for all users: each user's times are offset past the previous user's,
+        # by more than any window, so a window never reaches into another user's rows
+        ms = np.round(np.asarray(self.ts) * 1000).astype(np.int64)
+        user = columns['user']
+        segment = np.zeros(len(ms), dtype=np.int64)
+        segment[1:] = user[1:] != user[:-1]
+        np.cumsum(segment, out=segment)
+        self._ms = ms - (ms.min() if len(ms) else 0)
+        self._segment = segment
+        self._span = int(self._ms.max()) + 1 if len(ms) else 1
+
+        self._starts = {}
+        self._velocity_tables = {}
+        self._sorted_amounts = np.sort(self.amount[self.counted])
+        self._sorted_daily_totals = None
+        self._category_counts = np.bincount(self.category[self.counted], minlength=len(categories))
+
+    def _window_start(self, seconds: float) -> np.ndarray:
+
+        # Index of the first row in each row's window; the window ends at the row itself
+        starts = self._starts.get(seconds)
+        if starts is None:
+            window = int(round(seconds * 1000))
+            keys = self._segment * (self._span + window) + self._ms
+            starts = self._starts[seconds] = np.searchsorted(keys, keys - window, side='left')
+        return starts
+
+    def window_counts(self, seconds: float) -> np.ndarray:
+
+        return np.arange(1, len(self.ts) + 1) - self._window_start(seconds)
+
+    def _count_above(self, sorted_values: np.ndarray, threshold: float) -> int:
+
+        return int(len(sorted_values) - np.searchsorted(sorted_values, threshold, side='right'))
+
+    def _tiered(self, sorted_values: np.ndarray, medium: float, high: float) -> Dict:
+
+        # if value > high: HIGH, elif value > medium: MEDIUM
+        above_high = self._count_above(sorted_values, high)
+        above_medium = self._count_above(sorted_values, medium)
+        return {'HIGH': above_high, 'MEDIUM': max(above_medium - above_high, 0)}
+
+    def amount_threshold(self, params: Dict) -> Dict:
+
+        return self._tiered(self._sorted_amounts, params['AMOUNT_THRESHOLD_MEDIUM'], params['AMOUNT_THRESHOLD_HIGH'])
+
+    def daily_limit(self, params: Dict) -> Dict:
+
+        if self._sorted_daily_totals is None:
+            cumulative = np.concatenate(([0.0], np.cumsum(self.amount, dtype=np.float64)))
+            totals = cumulative[1:] - cumulative[self._window_start(_DAY)]
+            self._sorted_daily_totals = np.sort(totals[self.counted])
+
+        return self._tiered(self._sorted_daily_totals, params['DAILY_LIMIT_MEDIUM'], params['DAILY_LIMIT_HIGH'])
+
+    def _velocity_table(self, caps: tuple) -> np.ndarray:
+
+        table = self._velocity_tables.get(caps)
+        if table is not None:
+            return table
+
+        # Histogram of (minute, hour, day) counts, each clipped at the largest threshold asked
+        # for, since beyond that only ">= threshold" matters
+        counts = [
+            np.minimum(self.window_counts(seconds)[self.counted], cap)
+            for seconds, cap in zip((_MINUTE, _HOUR, _DAY), caps)
+        ]
+        shape = tuple(cap + 1 for cap in caps)
+        flat = np.ravel_multi_index(counts, shape)
+        histogram = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+
+        # table[m, h, d] = rows with minute count < m, hour count < h and day count >= d
+        table = np.zeros((shape[0] + 1, shape[1] + 1, shape[2] + 1), dtype=np.int64)
+        table[1:, 1:, :-1] = histogram[:, :, ::-1].cumsum(axis=2)[:, :, ::-1].cumsum(axis=0).cumsum(axis=1)
+        self._velocity_tables[caps] = table
+        return table
+
+    def velocity(self, params: Dict, caps: tuple = None) -> Dict:
+
+        thresholds = tuple(max(int(params[name]), 0) for name in (
+            'VELOCITY_MAX_PER_MINUTE', 'VELOCITY_MAX_PER_HOUR', 'VELOCITY_MAX_PER_DAY'
+        ))
+        caps = tuple(max(cap, threshold) for cap, threshold in zip(caps or thresholds, thresholds))
+        table = self._velocity_table(caps)
+        minute, hour, day = thresholds
+        everything = table.shape[0] - 1, table.shape[1] - 1
+
+        # The rule checks minute, then hour, then day, and stops at the first that fires
+        return {
+            'CRITICAL': int(table[everything[0], everything[1], 0] - table[minute, everything[1], 0]),
+            'HIGH': int(table[minute, everything[1], 0] - table[minute, hour, 0]),
+            'MEDIUM': int(table[minute, hour, day])
+        }
+
+    def high_risk_merchant(self, params: Dict) -> Dict:
+
+        high = {c.lower() for c in params['HIGH_RISK_MERCHANTS']}
+        medium = {c.lower() for c in params['MEDIUM_RISK_MERCHANTS']} - high
+        is_high = np.array([c in high for c in self.categories], dtype=bool)
+        is_medium = np.array([c in medium for c in self.categories], dtype=bool)
+        return {
+            'HIGH': int(self._category_counts[is_high].sum()),
+            'MEDIUM': int(self._category_counts[is_medium].sum())
+        }
+
+    def rapid_succession(self, params: Dict) -> Dict:
+
+        # Two or more rows in the window is HIGH; a lone row is compared with itself,
+        # 0 seconds apart, which the rule reports as MEDIUM
+        counts = self.window_counts(params['RAPID_SUCCESSION_WINDOW'])[self.counted]
+        lone = int(np.count_nonzero(counts == 1))
+        return {'HIGH': len(counts) - lone, 'MEDIUM': lone}
+
+    def simulate(self, params: Dict, velocity_caps: tuple = None) -> Dict[str, Dict]:
+
+        return {
+            'AMOUNT_THRESHOLD': self.amount_threshold(params),
+            'VELOCITY': self.velocity(params, velocity_caps),
+            'DAILY_LIMIT': self.daily_limit(params),
+            'HIGH_RISK_MERCHANT': self.high_risk_merchant(params),
+            'RAPID_SUCCESSION': self.rapid_succession(params)
+        }
+
+    def run(self, grid: Dict[str, List]) -> List[Dict]:
+
+        base = baseline()
+        scenarios = [{}] + expand_grid(grid)
+
+        # One velocity table sized for every scenario, instead of one per scenario
+        caps = tuple(
+            max(int(dict(base, **changes)[name]) for changes in scenarios)
+            for name in ('VELOCITY_MAX_PER_MINUTE', 'VELOCITY_MAX_PER_HOUR', 'VELOCITY_MAX_PER_DAY')
+        )
+
+        results = []
+        for changes in scenarios:
+            alerts = self.simulate(dict(base, **changes), caps)
+            results.append({
+                'changes': changes,
+                'alerts': alerts,
+                'total': sum(sum(severities.values()) for severities in alerts.values())
+            })
+        return results
+
+
+def load_period(archive: Archive, start_day: str, end_day: str) -> Simulator:
+
+    # The day before the period is loaded too, so windows at its start see their history
+    history_day = (date.fromisoformat(start_day) - timedelta(days=1)).isoformat()
+    if not archive.days(start_day, end_day):
+        raise ValueError(f"No archived days between {start_day} and {end_day}")
+
+    columns = archive.load_range(history_day, end_day)
+    count_from = float(epoch_seconds([start_day])[0])
+    return Simulator(columns, archive.dictionaries['categories'].values, count_from=count_from)
+
+
+# Column headings of the comparison table
+_SHORT_NAMES = {
+    'AMOUNT_THRESHOLD': 'AMOUNT',
+    'VELOCITY': 'VELOCITY',
+    'DAILY_LIMIT': 'DAILY',
+    'HIGH_RISK_MERCHANT': 'RISK_MERCHANT',
+    'RAPID_SUCCESSION': 'RAPID'
+}
+
+
+def format_table(results: List[Dict], transactions: int) -> str:
+
+    # One row per scenario: the values it changes, then alerts per rule and severity
+    parameters = list(dict.fromkeys(name for result in results for name in result['changes']))
+    base = baseline()
+    counts = [(rule, severity) for rule, severities in SEVERITIES.items() for severity in severities]
+
+    headers = ['#'] + parameters + [f"{_SHORT_NAMES[rule]}:{severity[0]}" for rule, severity in counts] + ['TOTAL', 'DELTA']
+    rows = []
+    for i, result in enumerate(results):
+        values = dict(base, **result['changes'])
+        rows.append(
+            ['baseline' if i == 0 else str(i)]
+            + [str(values[name]) for name in parameters]
+            + [f"{result['alerts'][rule][severity]:,}" for rule, severity in counts]
+            + [f"{result['total']:,}", f"{result['total'] - results[0]['total']:+,}"]
+        )
+
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+    lines = ['  '.join(cell.rjust(width) for cell, width in zip(headers, widths))]
+    lines.append('-' * len(lines[0]))
+    lines.extend('  '.join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+    lines.append(f"\n{transactions:,} transactions; severities: C=CRITICAL, H=HIGH, M=MEDIUM")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Count the alerts a grid of config values would have raised")
+    parser.add_argument('--start', required=True, help="first day of the period (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, help="last day of the period (YYYY-MM-DD)")
+    parser.add_argument('--grid', help='JSON object of parameter -> list of values')
+    parser.add_argument('--grid-file', help="JSON file holding the same object")
+    parser.add_argument('--root', default=config.ARCHIVE_DIR, help="archive directory")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.grid_file:
+        with open(args.grid_file) as f:
+            grid = json.load(f)
+    else:
+        grid = json.loads(args.grid) if args.grid else {}
+
+    started = time.perf_counter()
+    try:
+        simulator = load_period(Archive(args.root), args.start, args.end)
+        results = simulator.run(grid)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({'transactions': simulator.transactions, 'scenarios': results}, indent=2))
+    else:
+        print(format_table(results, simulator.transactions))
+        print(f"{len(results)} scenarios in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
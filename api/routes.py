@@ -1,9 +1,22 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, send_file
 from typing import Dict
-from utils.validators import validate_transaction_data, validate_alert_resolution
+from functools import wraps
+from utils.validators import (
+    validate_transaction_data, validate_alert_resolution, validate_idempotency_key,
+    validate_bulk_alert_resolution, validate_alert_claim, validate_alert_lease, validate_export_request,
+    validate_timestamp
+)
 from utils.logger import log_api_request, log_error
+from utils.cache import LRUCache
+from rules.dsl import RuleDefinitionError
+from services.admission import AdmissionController, classify
+from services.export import ExportError, ExportManager
+from services.transaction_service import IdempotencyConflictError, IdempotencyInProgressError
 from datetime import datetime
+import hashlib
+import config
+import os
 import time
 
 
@@ -13,13 +26,80 @@ api = Blueprint('api', __name__)
 
 transaction_service = None
 alert_manager = None
+export_manager = None
+response_cache = None
+admission = None
 
 
-def init_routes(txn_service, alert_mgr):
+def init_routes(txn_service, alert_mgr, export_mgr=None):
 
-    global transaction_service, alert_manager
+    global transaction_service, alert_manager, export_manager, response_cache, admission
     transaction_service = txn_service
     alert_manager = alert_mgr
+    export_manager = export_mgr or ExportManager(txn_service.db)
+    response_cache = LRUCache(
+        max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes=config.RESPONSE_CACHE_MAX_BYTES
+    )
+    admission = AdmissionController() if config.ADMISSION_MAX_IN_FLIGHT else None
+
+
+def cached_response(version_keys):
+
+    # Serves a stored body while the data versions it was built from are unchanged (a commit by
+    # another process invalidates every entry), and answers If-None-Match with 304 from the stored ETag
+    def decorator(view):
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            start_time = time.time()
+            
+            keys = version_keys(*args, **kwargs)
+            version = transaction_service.db.data_version(*keys)
+            cache_key = (request.path, request.query_string)
+            
+            entry = response_cache.get(cache_key)
+            if entry is None or entry['version'] != version:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                
+                body = response.get_data()
+                entry = {
+                    'version': version,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'body': body,
+                    'mimetype': response.mimetype
+                }
+                response_cache.put(cache_key, entry, size=len(body))
+            else:
+                log_api_request('GET', request.path, 200, time.time() - start_time)
+            
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+        
+        return wrapper
+    
+    return decorator
+
+
+def _report_date() -> str:
+
+    return request.args.get('date', datetime.now().date().isoformat())
+
+
+def read_snapshot(view):
+
+    # GET handlers read through a read-only connection pinned to one snapshot,
+    # so reports never hold the writer used by ingestion
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with transaction_service.db.read_snapshot():
+            return view(*args, **kwargs)
+    
+    return wrapper
 
 
 @api.route('/health', methods=['GET'])
@@ -30,7 +110,9 @@ def health_check():
     response = {
         'status': 'healthy',
         'service': 'Transaction Monitoring API',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'ready': current_app.config.get('READY', False),
+        'time_to_ready_ms': current_app.config.get('TIME_TO_READY_MS')
     }
     
     duration = time.time() - start_time
@@ -46,6 +128,15 @@ def create_transaction():
     
     try:
 
+        idempotency_key = request.headers.get('Idempotency-Key')
+        
+        if idempotency_key is not None:
+            is_valid, error_message = validate_idempotency_key(idempotency_key)
+            if not is_valid:
+                log_api_request('POST', '/api/transactions', 400)
+                return jsonify({'error': error_message}), 400
+        
+
         data = request.get_json()
         
         if not data:
@@ -53,13 +144,35 @@ def create_transaction():
             return jsonify({'error': 'No JSON data provided'}), 400
         
 
+        if idempotency_key is not None:
+            # Compared against the stored request, so a reused key with another body is refused
+            stored = transaction_service.get_idempotent_result(idempotency_key, data)
+            if stored is not None:
+                duration = time.time() - start_time
+                log_api_request('POST', '/api/transactions', 200, duration)
+                return jsonify(stored), 200, {'Idempotent-Replayed': 'true'}
+        
+
         is_valid, error_message = validate_transaction_data(data)
         if not is_valid:
             log_api_request('POST', '/api/transactions', 400)
             return jsonify({'error': error_message}), 400
         
 
-        result = transaction_service.process_transaction(data)
+        # Validated first: the lane depends on the amount and category
+        if admission is not None:
+            admitted, reason = admission.acquire(classify(data))
+            if not admitted:
+                log_api_request('POST', '/api/transactions', 429, time.time() - start_time)
+                return jsonify({'error': 'Too many transactions in progress', 'reason': reason}), 429, {
+                    'Retry-After': str(config.ADMISSION_RETRY_AFTER_SECONDS)
+                }
+        
+        try:
+            result = transaction_service.process_transaction(data, idempotency_key=idempotency_key)
+        finally:
+            if admission is not None:
+                admission.release()
         
 
         duration = time.time() - start_time
@@ -68,6 +181,14 @@ def create_transaction():
         
         return jsonify(result), status_code
     
+    except IdempotencyConflictError as e:
+        log_api_request('POST', '/api/transactions', 422)
+        return jsonify({'error': str(e)}), 422
+    
+    except IdempotencyInProgressError as e:
+        log_api_request('POST', '/api/transactions', 409)
+        return jsonify({'error': str(e)}), 409, {'Retry-After': '1'}
+    
     except Exception as e:
         log_error("Error processing transaction", e)
         log_api_request('POST', '/api/transactions', 500)
@@ -75,6 +196,7 @@ def create_transaction():
 
 
 @api.route('/api/transactions', methods=['GET'])
+@read_snapshot
 def get_transactions():
 
     start_time = time.time()
@@ -107,6 +229,8 @@ def get_transactions():
 
 
 @api.route('/api/transactions/<transaction_id>', methods=['GET'])
+@cached_response(lambda transaction_id: ())
+@read_snapshot
 def get_transaction(transaction_id: str):
 
     start_time = time.time()
@@ -130,6 +254,8 @@ def get_transaction(transaction_id: str):
 
 
 @api.route('/api/alerts', methods=['GET'])
+@cached_response(lambda: ('alerts',))
+@read_snapshot
 def get_alerts():
 
     start_time = time.time()
@@ -161,6 +287,8 @@ def get_alerts():
 
 
 @api.route('/api/alerts/<alert_id>', methods=['GET'])
+@cached_response(lambda alert_id: ('alerts:updated',))
+@read_snapshot
 def get_alert(alert_id: str):
 
     start_time = time.time()
@@ -183,6 +311,45 @@ def get_alert(alert_id: str):
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@api.route('/api/alerts/resolve', methods=['PUT'])
+def resolve_alerts():
+
+    start_time = time.time()
+    
+    try:
+
+        data = request.get_json()
+        
+        if not data:
+            log_api_request('PUT', '/api/alerts/resolve', 400)
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+
+        is_valid, error_message = validate_bulk_alert_resolution(data)
+        if not is_valid:
+            log_api_request('PUT', '/api/alerts/resolve', 400)
+            return jsonify({'error': error_message}), 400
+        
+
+        result = alert_manager.resolve_alerts(
+            resolution=data['resolution'],
+            reviewed_by=data['reviewed_by'],
+            notes=data.get('notes'),
+            alert_ids=data.get('alert_ids'),
+            filters=data.get('filter')
+        )
+        
+        duration = time.time() - start_time
+        log_api_request('PUT', '/api/alerts/resolve', 200, duration)
+        
+        return jsonify(result), 200
+    
+    except Exception as e:
+        log_error("Error resolving alerts in bulk", e)
+        log_api_request('PUT', '/api/alerts/resolve', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
 @api.route('/api/alerts/<alert_id>/resolve', methods=['PUT'])
 def resolve_alert(alert_id: str):
 
@@ -225,52 +392,209 @@ def resolve_alert(alert_id: str):
         return jsonify({'error': 'Internal server error'}), 500
 
 
-@api.route('/api/reports/daily', methods=['GET'])
-def daily_report():
+@api.route('/api/alerts/claim', methods=['POST'])
+def claim_alerts():
 
     start_time = time.time()
     
     try:
 
-        date_str = request.args.get('date', datetime.now().date().isoformat())
+        data = request.get_json()
+        
+        if not data:
+            log_api_request('POST', '/api/alerts/claim', 400)
+            return jsonify({'error': 'No JSON data provided'}), 400
         
 
-        start_datetime = f"{date_str}T00:00:00"
-        end_datetime = f"{date_str}T23:59:59"
+        is_valid, error_message = validate_alert_claim(data)
+        if not is_valid:
+            log_api_request('POST', '/api/alerts/claim', 400)
+            return jsonify({'error': error_message}), 400
         
-        transactions = transaction_service.get_transactions(
-            start_date=start_datetime,
-            end_date=end_datetime
+
+        alerts = alert_manager.claim_alerts(
+            analyst=data['analyst'],
+            limit=data.get('limit', 1),
+            lease_seconds=data.get('lease_seconds'),
+            severities=data.get('severities')
         )
         
+        duration = time.time() - start_time
+        log_api_request('POST', '/api/alerts/claim', 200, duration)
+        
+        return jsonify({
+            'count': len(alerts),
+            'alerts': [alert.to_dict() for alert in alerts]
+        }), 200
+    
+    except Exception as e:
+        log_error("Error claiming alerts", e)
+        log_api_request('POST', '/api/alerts/claim', 500)
+        return jsonify({'error': 'Internal server error'}), 500
 
-        all_alerts = alert_manager.db.execute_query(
-            "SELECT * FROM alerts WHERE timestamp >= ? AND timestamp <= ?",
-            (start_datetime, end_datetime)
-        )
+
+@api.route('/api/alerts/leases/<action>', methods=['POST'])
+def update_alert_leases(action: str):
+
+    start_time = time.time()
+    path = f'/api/alerts/leases/{action}'
+    
+    try:
+        if action not in ('renew', 'release'):
+            log_api_request('POST', path, 404)
+            return jsonify({'error': 'Unknown lease action'}), 404
         
 
-        total_volume = sum(txn['amount'] for txn in transactions)
+        data = request.get_json()
+        
+        if not data:
+            log_api_request('POST', path, 400)
+            return jsonify({'error': 'No JSON data provided'}), 400
         
 
-        alerts_by_severity = {}
-        for alert in all_alerts:
-            severity = alert['severity']
-            alerts_by_severity[severity] = alerts_by_severity.get(severity, 0) + 1
+        is_valid, error_message = validate_alert_lease(data)
+        if not is_valid:
+            log_api_request('POST', path, 400)
+            return jsonify({'error': error_message}), 400
         
 
-        alerts_by_rule = {}
-        for alert in all_alerts:
-            rule = alert['rule_name']
-            alerts_by_rule[rule] = alerts_by_rule.get(rule, 0) + 1
+        if action == 'renew':
+            result = alert_manager.renew_leases(data['analyst'], data['alert_ids'], data.get('lease_seconds'))
+        else:
+            result = alert_manager.release_leases(data['analyst'], data['alert_ids'])
+        
+        duration = time.time() - start_time
+        log_api_request('POST', path, 200, duration)
+        
+        return jsonify(result), 200
+    
+    except Exception as e:
+        log_error(f"Error on alert lease {action}", e)
+        log_api_request('POST', path, 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/exports', methods=['POST'])
+def create_export():
+
+    start_time = time.time()
+    
+    try:
+
+        data = request.get_json()
+        
+        if not data:
+            log_api_request('POST', '/api/exports', 400)
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+
+        is_valid, error_message = validate_export_request(data)
+        if not is_valid:
+            log_api_request('POST', '/api/exports', 400)
+            return jsonify({'error': error_message}), 400
+        
+
+        try:
+            job = export_manager.submit(
+                kind=data['kind'],
+                fmt=data.get('format'),
+                start_date=data.get('start_date'),
+                end_date=data.get('end_date'),
+                user_id=data.get('user_id')
+            )
+        except ExportError as e:
+            log_api_request('POST', '/api/exports', 400)
+            return jsonify({'error': str(e)}), 400
+        
+        duration = time.time() - start_time
+        log_api_request('POST', '/api/exports', 202, duration)
+        
+        # Runs in the background; the client polls the job for progress
+        return jsonify(job.to_dict()), 202
+    
+    except Exception as e:
+        log_error("Error starting export", e)
+        log_api_request('POST', '/api/exports', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/exports/<job_id>', methods=['GET'])
+def get_export(job_id: str):
+
+    start_time = time.time()
+    
+    try:
+        job = export_manager.get(job_id)
+        
+        if not job:
+            log_api_request('GET', f'/api/exports/{job_id}', 404)
+            return jsonify({'error': 'Export not found'}), 404
+        
+        duration = time.time() - start_time
+        log_api_request('GET', f'/api/exports/{job_id}', 200, duration)
+        
+        return jsonify(job.to_dict()), 200
+    
+    except Exception as e:
+        log_error(f"Error retrieving export {job_id}", e)
+        log_api_request('GET', f'/api/exports/{job_id}', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/exports/<job_id>/download', methods=['GET'])
+def download_export(job_id: str):
+
+    try:
+        job = export_manager.get(job_id)
+        
+        if not job:
+            log_api_request('GET', f'/api/exports/{job_id}/download', 404)
+            return jsonify({'error': 'Export not found'}), 404
+        
+        if job.status != 'COMPLETED':
+            log_api_request('GET', f'/api/exports/{job_id}/download', 409)
+            return jsonify({'error': f'Export is {job.status}'}), 409
+        
+        log_api_request('GET', f'/api/exports/{job_id}/download', 200)
+        
+        # Streamed from disk by the WSGI file wrapper, not read into memory
+        return send_file(
+            os.path.abspath(job.path),
+            as_attachment=True,
+            download_name=os.path.basename(job.path)
+        )
+    
+    except Exception as e:
+        log_error(f"Error downloading export {job_id}", e)
+        log_api_request('GET', f'/api/exports/{job_id}/download', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/reports/daily', methods=['GET'])
+@cached_response(lambda: (f'transactions:{_report_date()}', f'alerts:{_report_date()}'))
+@read_snapshot
+def daily_report():
+
+    start_time = time.time()
+    
+    try:
+
+        date_str = request.args.get('date', datetime.now().date().isoformat())
+        
+
+        start_datetime = f"{date_str}T00:00:00"
+        end_datetime = f"{date_str}T23:59:59"
+        
+        totals = transaction_service.get_transaction_totals(start_datetime, end_datetime)
+        alert_counts = alert_manager.get_alert_counts(start_datetime, end_datetime)
         
         report = {
             'date': date_str,
-            'total_transactions': len(transactions),
-            'total_volume': total_volume,
-            'alerts_triggered': len(all_alerts),
-            'alerts_by_severity': alerts_by_severity,
-            'alerts_by_rule': alerts_by_rule
+            'total_transactions': totals['total_transactions'],
+            'total_volume': totals['total_volume'],
+            'alerts_triggered': alert_counts['total_alerts'],
+            'alerts_by_severity': alert_counts['by_severity'],
+            'alerts_by_rule': alert_counts['by_rule']
         }
         
         duration = time.time() - start_time
@@ -285,6 +609,7 @@ def daily_report():
 
 
 @api.route('/api/users/<user_id>/stats', methods=['GET'])
+@read_snapshot
 def get_user_stats(user_id: str):
 
     start_time = time.time()
@@ -303,3 +628,140 @@ def get_user_stats(user_id: str):
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@api.route('/api/rules/reload', methods=['POST'])
+def reload_rules():
+
+    start_time = time.time()
+    
+    try:
+        rule_engine = transaction_service.rule_engine
+        loaded = rule_engine.load_custom_rules()
+        
+        duration = time.time() - start_time
+        log_api_request('POST', '/api/rules/reload', 200, duration)
+        
+        return jsonify({
+            'custom_rules_loaded': loaded,
+            'active_rules': [rule.name for rule in rule_engine.get_active_rules()]
+        }), 200
+    
+    except (RuleDefinitionError, OSError, ValueError) as e:
+        log_api_request('POST', '/api/rules/reload', 400)
+        return jsonify({'error': f'Could not load rules: {e}'}), 400
+    
+    except Exception as e:
+        log_error("Error reloading rules", e)
+        log_api_request('POST', '/api/rules/reload', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/shadow', methods=['GET'])
+def get_shadow_summary():
+
+    start_time = time.time()
+    
+    try:
+        shadow = transaction_service.rule_engine.shadow
+        if shadow is None:
+            log_api_request('GET', '/api/shadow', 404)
+            return jsonify({'error': 'Shadow mode is not enabled'}), 404
+        
+        today = datetime.now().date().isoformat()
+        start_date = request.args.get('start_date', f"{today}T00:00:00")
+        end_date = request.args.get('end_date', f"{today}T23:59:59")
+        
+        for value in (start_date, end_date):
+            is_valid, error_message = validate_timestamp(value)
+            if not is_valid:
+                log_api_request('GET', '/api/shadow', 400)
+                return jsonify({'error': error_message}), 400
+        
+        summary = shadow.summary(start_date, end_date)
+        summary['stats'] = shadow.stats()
+        
+        duration = time.time() - start_time
+        log_api_request('GET', '/api/shadow', 200, duration)
+        
+        return jsonify(summary), 200
+    
+    except Exception as e:
+        log_error("Error summarizing shadow alerts", e)
+        log_api_request('GET', '/api/shadow', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/shadow/reload', methods=['POST'])
+def reload_shadow_rules():
+
+    start_time = time.time()
+    
+    try:
+        shadow = transaction_service.rule_engine.shadow
+        if shadow is None:
+            log_api_request('POST', '/api/shadow/reload', 404)
+            return jsonify({'error': 'Shadow mode is not enabled'}), 404
+        
+        loaded = shadow.load(shadow.rules_path)
+        
+        duration = time.time() - start_time
+        log_api_request('POST', '/api/shadow/reload', 200, duration)
+        
+        return jsonify({'shadow_rules_loaded': loaded, 'rules': [rule.name for rule in shadow.rules]}), 200
+    
+    except (RuleDefinitionError, OSError, ValueError) as e:
+        log_api_request('POST', '/api/shadow/reload', 400)
+        return jsonify({'error': f'Could not load shadow rules: {e}'}), 400
+    
+    except Exception as e:
+        log_error("Error reloading shadow rules", e)
+        log_api_request('POST', '/api/shadow/reload', 500)
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+
+    start_time = time.time()
+    
+    try:
+        db = transaction_service.db
+        
+        metrics = {
+            'caches': {
+                'transactions': db.transaction_cache.stats(),
+                'alerts': db.alert_cache.stats(),
+                'responses': response_cache.stats(),
+                'idempotency': transaction_service.idempotency_cache.stats()
+            }
+        }
+        
+        if transaction_service.executor is not None:
+            metrics['executor'] = transaction_service.executor.stats()
+        
+        if transaction_service.user_state is not None:
+            metrics['user_state'] = transaction_service.user_state.stats()
+        
+        if transaction_service.rule_engine.shadow is not None:
+            metrics['shadow'] = transaction_service.rule_engine.shadow.stats()
+        
+        if admission is not None:
+            metrics['admission'] = admission.stats()
+        
+        metrics['rule_engine'] = transaction_service.rule_engine.stats()
+        
+        # Rules that keep in-memory state report its size
+        metrics['rules'] = {
+            rule.name: rule.stats()
+            for rule in transaction_service.rule_engine.rules
+            if hasattr(rule, 'stats')
+        }
+        
+        duration = time.time() - start_time
+        log_api_request('GET', '/api/metrics', 200, duration)
+        
+        return jsonify(metrics), 200
+    
+    except Exception as e:
+        log_error("Error collecting metrics", e)
+        log_api_request('GET', '/api/metrics', 500)
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,261 @@
+"""
+Socket decision protocol
+A Unix-domain or TCP listener for co-located services that need a decision
+without HTTP. Each frame is one JSON transaction (the POST /api/transactions
+body); each response is the same JSON the API returns with 201.
+
+Framing:
+    line    newline-delimited JSON (default)
+    length  4-byte big-endian length followed by the JSON bytes
+
+Optional request keys, removed before validation:
+    request_id       echoed back in the response
+    idempotency_key  same semantics as the Idempotency-Key header
+
+Clients may pipeline: every complete frame in the receive buffer is decided
+in order and the responses go back in one write.
+
+Usage:
+    python -m api.socket_server unix:/tmp/transaction_monitor.sock
+    python -m api.socket_server tcp:127.0.0.1:5001 --framing length
+"""
+
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+
+from services.transaction_service import IdempotencyConflictError, IdempotencyInProgressError
+from utils.validators import validate_transaction_data, validate_idempotency_key
+from utils.logger import logger, log_error
+import config
+
+
+_LENGTH = struct.Struct('>I')
+
+
+class FrameTooLarge(ValueError):
+    pass
+
+
+class LineCodec:
+
+    def split(self, buffer: bytearray, max_bytes: int) -> Tuple[List[bytes], int]:
+
+        frames = []
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            frame = bytes(buffer[start:end]).strip()
+            if frame:
+                frames.append(frame)
+            start = end + 1
+
+        if len(buffer) - start > max_bytes:
+            raise FrameTooLarge(f"Frame exceeds {max_bytes} bytes")
+        return frames, start
+
+    def encode(self, payload: Dict) -> bytes:
+
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class LengthPrefixCodec:
+
+    def split(self, buffer: bytearray, max_bytes: int) -> Tuple[List[bytes], int]:
+
+        frames = []
+        start = 0
+        while len(buffer) - start >= _LENGTH.size:
+            (length,) = _LENGTH.unpack_from(buffer, start)
+            if length > max_bytes:
+                raise FrameTooLarge(f"Frame exceeds {max_bytes} bytes")
+            end = start + _LENGTH.size + length
+            if end > len(buffer):
+                break
+            frames.append(bytes(buffer[start + _LENGTH.size:end]))
+            start = end
+        return frames, start
+
+    def encode(self, payload: Dict) -> bytes:
+
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return _LENGTH.pack(len(body)) + body
+
+
+CODECS = {
+    'line': LineCodec,
+    'length': LengthPrefixCodec
+}
+
+
+class DecisionHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+
+        if self.request.family in (socket.AF_INET, socket.AF_INET6):
+            # Small pipelined responses must not wait for Nagle's algorithm
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+
+        codec = self.server.codec
+        max_bytes = self.server.max_frame_bytes
+        buffer = bytearray()
+
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            buffer += chunk
+
+            try:
+                frames, consumed = codec.split(buffer, max_bytes)
+            except FrameTooLarge as e:
+                self.request.sendall(codec.encode({'error': str(e)}))
+                return
+            del buffer[:consumed]
+
+            if frames:
+                self.request.sendall(b''.join(codec.encode(self.server.decide(frame)) for frame in frames))
+
+
+class DecisionServerMixin:
+
+    daemon_threads = True
+
+    def setup_decisions(self, transaction_service, framing: str, max_frame_bytes: int):
+
+        self.transaction_service = transaction_service
+        self.codec = CODECS[framing]()
+        self.max_frame_bytes = max_frame_bytes
+
+    def decide(self, frame: bytes) -> Dict:
+
+        try:
+            data = json.loads(frame)
+        except ValueError:
+            return {'error': 'Invalid JSON'}
+
+        if not isinstance(data, dict):
+            return {'error': 'Request must be a JSON object'}
+
+        request_id = data.pop('request_id', None)
+        response = self._decide(data, data.pop('idempotency_key', None))
+        if request_id is not None:
+            response['request_id'] = request_id
+        return response
+
+    def _decide(self, data: Dict, idempotency_key: Optional[str]) -> Dict:
+
+        try:
+            if idempotency_key is not None:
+                is_valid, error_message = validate_idempotency_key(idempotency_key)
+                if not is_valid:
+                    return {'error': error_message}
+
+                stored = self.transaction_service.get_idempotent_result(idempotency_key, data)
+                if stored is not None:
+                    return dict(stored, idempotent_replayed=True)
+
+            is_valid, error_message = validate_transaction_data(data)
+            if not is_valid:
+                return {'error': error_message}
+
+            # The stored result may be shared with the idempotency cache, so it is copied
+            return dict(self.transaction_service.process_transaction(data, idempotency_key=idempotency_key))
+
+        except (IdempotencyConflictError, IdempotencyInProgressError) as e:
+            return {'error': str(e)}
+
+        except Exception as e:
+            log_error("Error processing socket transaction", e)
+            return {'error': 'Internal server error'}
+
+
+class UnixDecisionServer(DecisionServerMixin, socketserver.ThreadingUnixStreamServer):
+    pass
+
+
+class TCPDecisionServer(DecisionServerMixin, socketserver.ThreadingTCPServer):
+
+    allow_reuse_address = True
+
+
+def parse_address(address: str):
+
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+
+    if address.startswith('tcp:'):
+        address = address[len('tcp:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def create_server(transaction_service, address: str, framing: str = 'line',
+                  max_frame_bytes: int = None):
+
+    kind, target = parse_address(address)
+
+    if kind == 'unix':
+        # A socket file left by a previous run would make bind() fail
+        if os.path.exists(target) and stat.S_ISSOCK(os.stat(target).st_mode):
+            os.remove(target)
+        server = UnixDecisionServer(target, DecisionHandler)
+    else:
+        server = TCPDecisionServer(target, DecisionHandler)
+
+    server.setup_decisions(transaction_service, framing, max_frame_bytes or config.SOCKET_MAX_FRAME_BYTES)
+    return server
+
+
+def start_server(transaction_service, address: str, framing: str = 'line'):
+
+    server = create_server(transaction_service, address, framing)
+    thread = threading.Thread(target=server.serve_forever, name='socket-decisions', daemon=True)
+    thread.start()
+    logger.info(f"Socket decisions listening on {address} ({framing} framing)")
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Serve transaction decisions over a Unix or TCP socket")
+    parser.add_argument('address', nargs='?', default=config.SOCKET_LISTEN,
+                        help="unix:/path/to.sock or tcp:host:port")
+    parser.add_argument('--framing', choices=sorted(CODECS), default=config.SOCKET_FRAMING)
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    if not args.address:
+        parser.error("an address is required when SOCKET_LISTEN is not configured")
+
+    from database.db import Database
+    from services.rule_engine import RuleEngine
+    from services.alert_manager import AlertManager
+    from services.transaction_service import TransactionService
+
+    db = Database(args.db)
+    alert_manager = AlertManager(db)
+    transaction_service = TransactionService(db, RuleEngine(), alert_manager)
+
+    server = create_server(transaction_service, args.address, args.framing)
+    logger.info(f"Socket decisions listening on {args.address} ({args.framing} framing)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,26 @@
 
-from flask import Flask
+from flask import Flask, request
 from api.routes import api, init_routes
+from api.socket_server import start_server
+from services.export import ExportManager
+from services.shadow import ShadowEvaluator
+from services.snapshot import SnapshotScheduler, restore_snapshot
 from database.db import Database
 from services.rule_engine import RuleEngine
 from services.alert_manager import AlertManager
 from services.transaction_service import TransactionService
-from utils.logger import setup_logger, logger
+from utils.logger import logger
 import config
+import atexit
+import threading
+import time
 import os
 
 
-def create_app():
-
+def create_app(lazy: bool = None, socket_listener: bool = True):
 
+    lazy = config.LAZY_STARTUP if lazy is None else lazy
+    
     app = Flask(__name__)
     
 
@@ -20,36 +28,93 @@ def create_app():
     logger.info("Starting Transaction Monitoring API")
     logger.info("=" * 50)
     
-
-    log_dir = os.path.dirname(config.LOG_FILE)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-        logger.info(f"Created logs directory: {log_dir}")
+    app.config['READY'] = False
+    app.config['TIME_TO_READY_MS'] = None
     
-
-    logger.info(f"Initializing database: {config.DATABASE_PATH}")
-    db = Database(config.DATABASE_PATH)
-    logger.info("Database initialized successfully")
+    init_lock = threading.Lock()
+    services = {}
     
+    def initialize_services():
 
-    logger.info("Initializing services...")
-    rule_engine = RuleEngine()
-    logger.info(f"Rule engine initialized with {len(rule_engine.get_active_rules())} active rules")
-    
-    alert_manager = AlertManager(db)
-    logger.info("Alert manager initialized")
-    
-    transaction_service = TransactionService(db, rule_engine, alert_manager)
-    logger.info("Transaction service initialized")
-    
-
-    init_routes(transaction_service, alert_manager)
-    logger.info("API routes initialized")
+        if app.config['READY']:
+            return
+        
+        with init_lock:
+            if app.config['READY']:
+                return
+            
+            # Counted from here, so idle time before a lazy app's first request is not included
+            started_at = time.perf_counter()
+            
+            logger.info(f"Initializing database: {config.DATABASE_PATH}")
+            db = Database(config.DATABASE_PATH)
+            logger.info("Database initialized successfully")
+            
+            logger.info("Initializing services...")
+            rule_engine = RuleEngine()
+            logger.info(f"Rule engine initialized with {len(rule_engine.get_active_rules())} active rules")
+            
+            if config.SHADOW_RULES_PATH:
+                shadow = ShadowEvaluator(db)
+                logger.info(f"Shadow mode: {shadow.load()} candidate rules from {config.SHADOW_RULES_PATH}")
+                rule_engine.shadow = shadow.start()
+                atexit.register(shadow.stop)
+            
+            alert_manager = AlertManager(db)
+            logger.info("Alert manager initialized")
+            
+            transaction_service = TransactionService(db, rule_engine, alert_manager)
+            services['transaction_service'] = transaction_service
+            logger.info("Transaction service initialized")
+            
+            export_manager = ExportManager(db)
+            
+            init_routes(transaction_service, alert_manager, export_manager)
+            logger.info("API routes initialized")
+            
+            if config.SNAPSHOT_PATH:
+                # Restored before serving, so the first decisions already see pre-restart activity
+                report = restore_snapshot(transaction_service, config.SNAPSHOT_PATH)
+                if report['loaded']:
+                    logger.info(
+                        f"Restored rule state from {config.SNAPSHOT_PATH}: {report['users']} users, "
+                        f"{report['replayed']} transactions replayed in {report['elapsed_ms']} ms"
+                    )
+                else:
+                    logger.info(f"Rule state starts cold: {report['reason']}")
+                
+                scheduler = SnapshotScheduler(transaction_service, config.SNAPSHOT_PATH).start()
+                atexit.register(scheduler.stop)
+            
+            time_to_ready_ms = (time.perf_counter() - started_at) * 1000
+            app.config['TIME_TO_READY_MS'] = round(time_to_ready_ms, 2)
+            app.config['READY'] = True
+            logger.info(f"Application ready in {time_to_ready_ms:.1f} ms")
     
 
     app.register_blueprint(api)
     logger.info("API blueprint registered")
     
+    def initialize_before_request():
+
+        # /health answers without building services, so a probe can see a process that is not ready
+        if request.endpoint != 'api.health_check':
+            initialize_services()
+    
+    if lazy:
+        # Services are built by the first request, so short-lived processes that never serve skip it
+        app.before_request(initialize_before_request)
+        logger.info("Lazy startup: services will initialize on the first request")
+    else:
+        initialize_services()
+    
+    if config.SOCKET_LISTEN and socket_listener:
+        # Socket clients never pass through before_request, so the listener and the services it
+        # decides with are started now even under lazy startup. It shares this process's
+        # services, so response caches see its writes
+        initialize_services()
+        start_server(services['transaction_service'], config.SOCKET_LISTEN, config.SOCKET_FRAMING)
+    
     logger.info("=" * 50)
     logger.info("Application initialization complete")
     logger.info(f"API will listen on {config.API_HOST}:{config.API_PORT}")
@@ -60,7 +125,12 @@ def create_app():
 
 if __name__ == '__main__':
 
-    app = create_app()
+    # Under the debug reloader this parent process only watches files and the child it spawns
+    # serves, so only the child warms up and binds the socket
+    reloader_parent = config.DEBUG_MODE and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    
+    # A long-running server warms up before accepting connections
+    app = create_app(lazy=reloader_parent, socket_listener=not reloader_parent)
     
     logger.info("Starting Flask server...")
     
@@ -0,0 +1,138 @@
+"""
+Storage layout benchmark: row-format vs compact transactions
+Loads identical rows into both layouts through the same `transactions`
+INSERT, then reports file size, insert throughput and read latency of the
+hot queries.
+
+Usage:
+    python -m benchmarks.compact_storage                   # 1M rows per layout
+    python -m benchmarks.compact_storage --rows 200000
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from database.compact import convert
+from database.migrator import migrate
+from utils.ids import new_id
+
+
+CATEGORIES = ['electronics', 'groceries', 'travel', 'crypto_exchange', 'jewelry', 'fuel']
+METHODS = ['credit_card', 'debit_card', 'upi', 'net_banking', 'wallet']
+COUNTRIES = ['IN'] * 9 + ['US', 'AE', 'SG', 'GB']
+
+
+def generate(rows: int, users: int, merchants: int, seed: int = 7) -> List[tuple]:
+
+    rng = random.Random(seed)
+    start_ts = datetime(2024, 1, 1)
+    data = []
+    for i in range(rows):
+        country = rng.choice(COUNTRIES)
+        data.append((
+            new_id('TXN'), f"USER_{rng.randint(0, users - 1):06d}", round(rng.uniform(10, 50000), 2),
+            f"MERCHANT_{rng.randint(0, merchants - 1):05d}", rng.choice(CATEGORIES), rng.choice(METHODS),
+            (start_ts + timedelta(seconds=i * 2)).isoformat(), None, int(country != 'IN'), country
+        ))
+    return data
+
+
+def run(layout: str, data: List[tuple], batch: int, users: int, workdir: str) -> dict:
+
+    db_path = os.path.join(workdir, f"{layout}.db")
+    migrate(db_path)
+    if layout == 'compact':
+        convert(db_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    started = time.perf_counter()
+    for offset in range(0, len(data), batch):
+        conn.executemany(
+            """INSERT INTO transactions (transaction_id, user_id, amount, merchant_id, merchant_category,
+               payment_method, timestamp, location, is_international, merchant_country)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            data[offset:offset + batch]
+        )
+        conn.commit()
+    insert_seconds = time.perf_counter() - started
+
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    rng = random.Random(11)
+    window_start = data[len(data) // 2][6]
+    started = time.perf_counter()
+    lookups = 2000
+    for _ in range(lookups):
+        conn.execute(
+            "SELECT * FROM transactions WHERE user_id = ? AND timestamp >= ? ORDER BY timestamp DESC",
+            (f"USER_{rng.randint(0, users - 1):06d}", window_start)
+        ).fetchall()
+    window_ms = (time.perf_counter() - started) * 1000 / lookups
+
+    day = data[len(data) // 2][6][:10]
+    started = time.perf_counter()
+    conn.execute(
+        "SELECT COUNT(*), SUM(amount) FROM transaction_amounts WHERE timestamp >= ? AND timestamp <= ?",
+        (f"{day}T00:00:00", f"{day}T23:59:59")
+    ).fetchone()
+    totals_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for row in data[:lookups]:
+        conn.execute("SELECT * FROM transactions WHERE transaction_id = ?", (row[0],)).fetchone()
+    point_ms = (time.perf_counter() - started) * 1000 / lookups
+
+    conn.close()
+
+    return {
+        'layout': layout,
+        'rows': len(data),
+        'file_bytes': page_size * page_count,
+        'insert_rows_per_sec': len(data) / insert_seconds,
+        'user_window_ms': window_ms,
+        'point_lookup_ms': point_ms,
+        'daily_totals_ms': totals_ms
+    }
+
+
+def report(results: List[dict]):
+
+    print(f"\n{'layout':<10}{'rows':>12}{'file MB':>10}{'bytes/row':>11}{'insert rows/s':>15}"
+          f"{'user window ms':>16}{'point ms':>10}{'daily totals ms':>17}")
+    for r in results:
+        print(f"{r['layout']:<10}{r['rows']:>12,}{r['file_bytes'] / 1024 / 1024:>10.1f}"
+              f"{r['file_bytes'] / r['rows']:>11.0f}{r['insert_rows_per_sec']:>15,.0f}"
+              f"{r['user_window_ms']:>16.3f}{r['point_lookup_ms']:>10.3f}{r['daily_totals_ms']:>17.2f}")
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Compare row-format and compact transaction storage")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="rows to load per layout")
+    parser.add_argument('--users', type=int, default=100_000, help="distinct user IDs")
+    parser.add_argument('--merchants', type=int, default=5_000, help="distinct merchant IDs")
+    parser.add_argument('--batch', type=int, default=50_000, help="rows per committed batch")
+    args = parser.parse_args(argv)
+
+    data = generate(args.rows, args.users, args.merchants)
+    workdir = tempfile.mkdtemp(prefix='bench_storage_')
+    try:
+        results = [run(layout, data, args.batch, args.users, workdir) for layout in ('row', 'compact')]
+        report(results)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Insert throughput benchmark: random vs time-ordered primary keys
+Loads the real transactions schema with IDs from the old uuid4 scheme and
+from utils.ids, reporting rows/second as the table grows.
+
+Usage:
+    python -m benchmarks.insert_ids                        # 10M rows per scheme
+    python -m benchmarks.insert_ids --rows 1000000 --batch 50000
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from database.migrator import migrate
+from utils.ids import new_id
+
+
+def random_id() -> str:
+
+    return f"TXN_{uuid.uuid4().hex[:12].upper()}"
+
+
+def ordered_id() -> str:
+
+    return new_id('TXN')
+
+
+SCHEMES = {
+    'uuid4': random_id,
+    'ulid': ordered_id
+}
+
+
+def run(scheme: str, make_id: Callable[[], str], rows: int, batch: int, workdir: str) -> dict:
+
+    db_path = os.path.join(workdir, f"{scheme}.db")
+    migrate(db_path)
+
+    rng = random.Random(7)
+    start_ts = datetime(2024, 1, 1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    checkpoints = []
+    inserted = 0
+    total_seconds = 0.0
+    while inserted < rows:
+        size = min(batch, rows - inserted)
+
+        # Row generation is kept outside the timed section
+        chunk = []
+        for i in range(size):
+            ts = start_ts + timedelta(milliseconds=(inserted + i) * 10)
+            chunk.append((
+                make_id(), f"USER_{rng.randint(0, 99999):05d}", round(rng.uniform(10, 50000), 2),
+                f"MERCHANT_{rng.randint(0, 999):03d}", 'groceries', 'upi', ts.isoformat()
+            ))
+
+        started = time.perf_counter()
+        conn.executemany(
+            """INSERT INTO transactions (transaction_id, user_id, amount, merchant_id,
+               merchant_category, payment_method, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            chunk
+        )
+        conn.commit()
+        elapsed = time.perf_counter() - started
+
+        inserted += size
+        total_seconds += elapsed
+        checkpoints.append((inserted, size / elapsed))
+
+    conn.close()
+
+    return {
+        'scheme': scheme,
+        'rows': inserted,
+        'seconds': total_seconds,
+        'rows_per_sec': inserted / total_seconds,
+        'final_batch_rows_per_sec': checkpoints[-1][1],
+        'db_bytes': os.path.getsize(db_path),
+        'checkpoints': checkpoints
+    }
+
+
+def report(results: List[dict], points: int = 10):
+
+    for result in results:
+        print(f"\n{result['scheme']}: {result['rows']:,} rows in {result['seconds']:.1f}s "
+              f"({result['rows_per_sec']:,.0f} rows/s overall, "
+              f"{result['final_batch_rows_per_sec']:,.0f} rows/s on the last batch, "
+              f"{result['db_bytes'] / 1024 / 1024:,.1f} MB)")
+
+        checkpoints = result['checkpoints']
+        step = max(1, len(checkpoints) // points)
+        for rows, rate in checkpoints[step - 1::step]:
+            print(f"    {rows:>12,} rows  {rate:>12,.0f} rows/s")
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Compare insert throughput of random and time-ordered IDs")
+    parser.add_argument('--rows', type=int, default=10_000_000, help="rows to insert per scheme")
+    parser.add_argument('--batch', type=int, default=100_000, help="rows per committed batch")
+    parser.add_argument('--scheme', choices=sorted(SCHEMES), action='append',
+                        help="run only this scheme (repeatable)")
+    parser.add_argument('--workdir', help="directory for the benchmark databases (default: temporary)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_ids_')
+    os.makedirs(workdir, exist_ok=True)
+
+    try:
+        results = [
+            run(scheme, SCHEMES[scheme], args.rows, args.batch, workdir)
+            for scheme in (args.scheme or ['uuid4', 'ulid'])
+        ]
+        report(results)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
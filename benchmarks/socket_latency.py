@@ -0,0 +1,173 @@
+"""
+Decision latency benchmark: HTTP vs socket protocol
+Runs the Flask API (werkzeug server) and the socket listener against the same
+temporary database and sends identical transactions through each.
+
+Usage:
+    python -m benchmarks.socket_latency
+    python -m benchmarks.socket_latency --requests 5000 --pipeline 64
+"""
+
+from typing import Callable, List, Optional
+import argparse
+import http.client
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import config
+
+
+def payload(i: int) -> dict:
+
+    return {
+        'user_id': f"USER_BENCH_{i % 500:04d}",
+        'amount': 1500,
+        'merchant_id': 'MERCHANT_BENCH',
+        'merchant_category': 'groceries',
+        'payment_method': 'upi'
+    }
+
+
+def percentile(samples: List[float], pct: float) -> float:
+
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure(name: str, send: Callable[[int], None], requests: int) -> dict:
+
+    samples = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t = time.perf_counter()
+        send(i)
+        samples.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'name': name,
+        'requests': requests,
+        'p50_ms': percentile(samples, 50),
+        'p99_ms': percentile(samples, 99),
+        'per_sec': requests / elapsed
+    }
+
+
+def http_sender(port: int) -> Callable[[int], None]:
+
+    def send(i: int):
+
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.request('POST', '/api/transactions', body=json.dumps(payload(i)),
+                     headers={'Content-Type': 'application/json'})
+        conn.getresponse().read()
+        conn.close()
+
+    return send
+
+
+def socket_sender(sock: socket.socket, codec) -> Callable[[int], None]:
+
+    buffer = bytearray()
+
+    def send(i: int):
+
+        sock.sendall(codec.encode(payload(i)))
+        while True:
+            frames, consumed = codec.split(buffer, 1 << 20)
+            if frames:
+                del buffer[:consumed]
+                return
+            buffer.extend(sock.recv(65536))
+
+    return send
+
+
+def pipelined(name: str, sock: socket.socket, codec, requests: int, depth: int) -> dict:
+
+    buffer = bytearray()
+    received = 0
+    started = time.perf_counter()
+    for offset in range(0, requests, depth):
+        batch = range(offset, min(requests, offset + depth))
+        sock.sendall(b''.join(codec.encode(payload(i)) for i in batch))
+        expected = received + len(batch)
+        while received < expected:
+            buffer.extend(sock.recv(65536))
+            frames, consumed = codec.split(buffer, 1 << 20)
+            del buffer[:consumed]
+            received += len(frames)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'name': name,
+        'requests': requests,
+        'p50_ms': None,
+        'p99_ms': None,
+        'per_sec': requests / elapsed
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Compare decision latency over HTTP and the socket protocol")
+    parser.add_argument('--requests', type=int, default=2000, help="requests per transport")
+    parser.add_argument('--pipeline', type=int, default=32, help="requests in flight for the pipelined run")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench_socket_')
+    config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    from api import routes
+    from api.socket_server import create_server
+
+    logging.getLogger('transaction_monitor').setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    app = create_app(lazy=False)
+    http_server = make_server('127.0.0.1', 0, app, threaded=True)
+    unix_path = os.path.join(workdir, 'decisions.sock')
+    servers = [
+        create_server(routes.transaction_service, f"unix:{unix_path}"),
+        create_server(routes.transaction_service, 'tcp:127.0.0.1:0')
+    ]
+    for server in [http_server] + servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        unix_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        unix_sock.connect(unix_path)
+        tcp_sock = socket.create_connection(servers[1].server_address)
+        tcp_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        codec = servers[0].codec
+
+        results = [
+            measure('http', http_sender(http_server.server_port), args.requests),
+            measure('tcp socket', socket_sender(tcp_sock, codec), args.requests),
+            measure('unix socket', socket_sender(unix_sock, codec), args.requests),
+            pipelined(f"unix pipelined x{args.pipeline}", unix_sock, codec, args.requests, args.pipeline)
+        ]
+
+        print(f"\n{'transport':<24}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for r in results:
+            p50 = f"{r['p50_ms']:.3f}" if r['p50_ms'] is not None else '-'
+            p99 = f"{r['p99_ms']:.3f}" if r['p99_ms'] is not None else '-'
+            print(f"{r['name']:<24}{r['requests']:>10,}{p50:>10}{p99:>10}{r['per_sec']:>10,.0f}")
+    finally:
+        http_server.shutdown()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
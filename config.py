@@ -1,5 +1,8 @@
 
 DATABASE_PATH = "transaction_monitor.db"
+SQLITE_WAL = True
+COMPACT_STORAGE = False
+SQLITE_PROGRESS_STEPS = 1000  # VM steps between deadline checks on read-only connections
 
 
 AMOUNT_THRESHOLD_MEDIUM = 200000 
@@ -31,11 +34,138 @@ MEDIUM_RISK_MERCHANTS = [
 ]
 
 
+# AMOUNT_ANOMALY: z-score of log(amount) against the user's own history
+AMOUNT_ANOMALY_METHOD = "ewma"  # or "zscore" for the all-time Welford mean/variance
+AMOUNT_ANOMALY_MIN_HISTORY = 10
+AMOUNT_ANOMALY_Z_THRESHOLD = 4.0
+AMOUNT_ANOMALY_Z_CRITICAL = 8.0
+AMOUNT_ANOMALY_MIN_STD = 0.25
+AMOUNT_ANOMALY_EWMA_ALPHA = 0.1
+
+
+# MERCHANT_FAN_IN: distinct users per merchant, counted in count-min sketches
+MERCHANT_FANIN_WINDOW = 600
+MERCHANT_FANIN_BUCKET_SECONDS = 60
+MERCHANT_FANIN_MEDIUM = 25
+MERCHANT_FANIN_HIGH = 50
+MERCHANT_FANIN_EPSILON = 0.0005  # overcount bound, as a fraction of events per bucket
+MERCHANT_FANIN_DELTA = 0.01      # probability of exceeding that bound
+
+
+# MERCHANT_DIVERSITY: distinct merchants/categories per user, counted in HyperLogLog registers.
+# Off by default: the registers live in this process, so payments stored by another process
+# (ingest CLI, socket server) never reach them until the user is evicted and rebuilt
+MERCHANT_DIVERSITY_ENABLED = False
+MERCHANT_DIVERSITY_WINDOW = 86400
+MERCHANT_DIVERSITY_BUCKET_SECONDS = 3600
+MERCHANT_DIVERSITY_MERCHANTS_MEDIUM = 10
+MERCHANT_DIVERSITY_MERCHANTS_HIGH = 20
+MERCHANT_DIVERSITY_CATEGORIES_MEDIUM = 6
+MERCHANT_DIVERSITY_PRECISION = 6            # 64 one-byte registers per bucket, ~13% standard error
+MERCHANT_DIVERSITY_MAX_USERS = 100000
+MERCHANT_DIVERSITY_MAX_BYTES = 32 * 1024 * 1024
+
+
 RAPID_SUCCESSION_WINDOW = 60
 VELOCITY_HOUR_WINDOW = 3600
 VELOCITY_DAY_WINDOW = 86400
 
 
+CUSTOM_RULES_PATH = "rules/custom_rules.json"
+
+
+# Time budgets for rules that read the database; rules that do not always run. None disables
+RULE_BUDGET_MS = 100
+RULE_BUDGETS_MS = {}              # per-rule overrides, e.g. {"DAILY_LIMIT": 150}
+RULE_DEADLINE_MS = 250            # all database rules of one transaction together
+RULE_BREAKER_FAILURES = 5         # consecutive failed or overrun rules before the breaker opens
+RULE_BREAKER_COOLDOWN_SECONDS = 10
+
+
+# Analyst work queue: claims take the oldest OPEN alerts of the highest severity first
+ALERT_SEVERITY_PRIORITY = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+ALERT_LEASE_SECONDS = 900
+ALERT_LEASE_MAX_SECONDS = 4 * 3600
+ALERT_CLAIM_MAX_BATCH = 100
+
+
+IDEMPOTENCY_CACHE_SIZE = 10000
+IDEMPOTENCY_TTL_SECONDS = 86400
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = 3600
+# How long a duplicate waits for an in-flight request with its key, and when that reservation counts as abandoned
+IDEMPOTENCY_PENDING_WAIT_SECONDS = 5
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = 60
+
+
+OBJECT_CACHE_MAX_ENTRIES = 100000
+OBJECT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+RESPONSE_CACHE_MAX_ENTRIES = 4096
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+ORDERED_EXECUTION = True
+ORDERED_EXECUTOR_WORKERS = 8
+
+
+# In-memory rule windows for active users; requires ORDERED_EXECUTION, 0 bytes disables.
+# Off by default: rows written by another process (ingest CLI, socket server) never reach this copy
+USER_STATE_MAX_USERS = 1000000
+USER_STATE_MAX_BYTES = 0
+
+
+# e.g. "state.snapshot"; None disables snapshots of in-memory rule state
+SNAPSHOT_PATH = None
+SNAPSHOT_INTERVAL_SECONDS = 300
+SNAPSHOT_REPLAY_MARGIN_SECONDS = 60
+SNAPSHOT_MAX_AGE_SECONDS = 3600
+
+
+INGEST_COMMIT_SIZE = 5000
+INGEST_COMMIT_INTERVAL_SECONDS = 1.0
+INGEST_QUEUE_SIZE = 10000
+INGEST_PROGRESS_SECONDS = 10
+
+
+# Bulk exports: Parquet when pyarrow is installed, else gzip CSV
+EXPORT_DIR = "exports"
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_MAX_CONCURRENT = 2
+EXPORT_PROGRESS_SECONDS = 10
+EXPORT_RETENTION_SECONDS = 24 * 3600
+
+
+# Memory-mapped per-day column arrays for backtests (python -m analytics.archive)
+ARCHIVE_DIR = "archive"
+ARCHIVE_CHUNK_ROWS = 100000
+
+
+LAZY_STARTUP = True
+
+
+# e.g. "rules/shadow_rules.json": candidate rules scored off the request path; None disables
+SHADOW_RULES_PATH = None
+SHADOW_WORKERS = 2
+SHADOW_QUEUE_SIZE = 10000
+SHADOW_FLUSH_SIZE = 500
+SHADOW_FLUSH_INTERVAL_SECONDS = 1.0
+
+
+# e.g. "unix:/tmp/transaction_monitor.sock" or "tcp:127.0.0.1:5001"; None disables the listener
+SOCKET_LISTEN = None
+SOCKET_FRAMING = "line"
+SOCKET_MAX_FRAME_BYTES = 1024 * 1024
+
+
+# Admission control for POST /api/transactions; ADMISSION_MAX_IN_FLIGHT = None disables it
+ADMISSION_MAX_IN_FLIGHT = 16
+ADMISSION_QUEUE_SIZE = {"priority": 64, "standard": 16}
+ADMISSION_QUEUE_TIMEOUT_MS = {"priority": 1000, "standard": 200}
+ADMISSION_PRIORITY_AMOUNT = 100000   # amounts from here up take the priority lane
+ADMISSION_RETRY_AFTER_SECONDS = 1
+
+
 API_HOST = "0.0.0.0"
 API_PORT = 5000
 DEBUG_MODE = True
@@ -0,0 +1,114 @@
+"""
+Compact transaction storage
+Converts the row-format transactions table into dictionary-encoded dimension
+tables plus an integer-keyed fact table, behind a `transactions` view.
+
+The conversion is opt-in (COMPACT_STORAGE in config.py, or this command) and
+one-way. Alerts stay in row format: they are updated in place on resolution.
+
+Usage:
+    python -m database.compact status [--db PATH]
+    python -m database.compact convert [--db PATH] [--vacuum]
+"""
+
+from typing import List, Optional
+import argparse
+import os
+import sqlite3
+import threading
+
+from database.migrator import migrate, split_statements
+import config
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'compact_schema.sql')
+
+# Databases already confirmed compact by this process
+_verified = set()
+_verified_lock = threading.Lock()
+
+
+def is_compact(conn: sqlite3.Connection) -> bool:
+
+    row = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'transactions'"
+    ).fetchone()
+    return row is not None and row[0] == 'view'
+
+
+def convert(db_path: str, vacuum: bool = False) -> bool:
+
+    key = os.path.abspath(db_path)
+    if key in _verified:
+        return False
+
+    # The row-format table must exist and be fully migrated before it is rewritten
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if is_compact(conn):
+                conn.execute("ROLLBACK")
+                converted = False
+            else:
+                with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+                    for statement in split_statements(f.read()):
+                        conn.execute(statement)
+                conn.execute("COMMIT")
+                converted = True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if converted and vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    with _verified_lock:
+        _verified.add(key)
+
+    return converted
+
+
+def storage_status(db_path: str) -> dict:
+
+    conn = sqlite3.connect(db_path)
+    try:
+        compact = is_compact(conn)
+        table = 'transaction_facts' if compact else 'transactions'
+        try:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        except sqlite3.OperationalError:
+            rows = 0
+    finally:
+        conn.close()
+
+    return {
+        'layout': 'compact' if compact else 'row',
+        'transactions': rows,
+        'file_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Convert transactions to the compact storage layout")
+    parser.add_argument('command', choices=['status', 'convert'])
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="SQLite database path")
+    parser.add_argument('--vacuum', action='store_true', help="rebuild the file afterwards to release freed pages")
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        converted = convert(args.db, vacuum=args.vacuum)
+        print("Converted transactions to the compact layout" if converted else "Already compact")
+
+    status = storage_status(args.db)
+    print(f"layout: {status['layout']}, transactions: {status['transactions']:,}, "
+          f"file: {status['file_bytes'] / 1024 / 1024:,.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
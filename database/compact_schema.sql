@@ -0,0 +1,128 @@
+-- Compact transaction storage (applied by database/compact.py, not by the migrator)
+--
+-- Repeated strings move to dimension tables keyed by small integers, amounts are
+-- stored as integer paise, and `transactions` becomes a view with the original
+-- columns so every existing query and INSERT keeps working unchanged.
+-- created_at is kept as Unix seconds; the view formats it back like datetime('now').
+
+CREATE TABLE IF NOT EXISTS users (
+    user_key INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS merchants (
+    merchant_key INTEGER PRIMARY KEY,
+    merchant_id TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS merchant_categories (
+    category_key INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS payment_methods (
+    method_key INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS countries (
+    country_key INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS transaction_facts (
+    txn_key INTEGER PRIMARY KEY,
+    transaction_id TEXT NOT NULL UNIQUE,
+    user_key INTEGER NOT NULL REFERENCES users(user_key),
+    amount_paise INTEGER NOT NULL,
+    merchant_key INTEGER NOT NULL REFERENCES merchants(merchant_key),
+    category_key INTEGER NOT NULL REFERENCES merchant_categories(category_key),
+    method_key INTEGER NOT NULL REFERENCES payment_methods(method_key),
+    timestamp TEXT NOT NULL,
+    location TEXT,
+    is_international INTEGER NOT NULL DEFAULT 0,
+    country_key INTEGER REFERENCES countries(country_key),
+    created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+);
+
+-- Same access paths as idx_transactions_user_time and idx_transactions_time_amount
+CREATE INDEX IF NOT EXISTS idx_transaction_facts_user_time ON transaction_facts(user_key, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transaction_facts_time_amount ON transaction_facts(timestamp, amount_paise);
+
+-- Copy existing rows in their original insertion order
+INSERT OR IGNORE INTO users (user_id) SELECT user_id FROM transactions ORDER BY rowid;
+INSERT OR IGNORE INTO merchants (merchant_id) SELECT merchant_id FROM transactions ORDER BY rowid;
+INSERT OR IGNORE INTO merchant_categories (name) SELECT DISTINCT merchant_category FROM transactions;
+INSERT OR IGNORE INTO payment_methods (name) SELECT DISTINCT payment_method FROM transactions;
+INSERT OR IGNORE INTO countries (code) SELECT DISTINCT merchant_country FROM transactions WHERE merchant_country IS NOT NULL;
+
+INSERT INTO transaction_facts (
+    transaction_id, user_key, amount_paise, merchant_key, category_key, method_key,
+    timestamp, location, is_international, country_key, created_at
+)
+SELECT
+    t.transaction_id, u.user_key, CAST(ROUND(t.amount * 100) AS INTEGER), m.merchant_key,
+    c.category_key, p.method_key, t.timestamp, t.location, COALESCE(t.is_international, 0),
+    co.country_key, CAST(strftime('%s', COALESCE(t.created_at, 'now')) AS INTEGER)
+FROM transactions t
+JOIN users u ON u.user_id = t.user_id
+JOIN merchants m ON m.merchant_id = t.merchant_id
+JOIN merchant_categories c ON c.name = t.merchant_category
+JOIN payment_methods p ON p.name = t.payment_method
+LEFT JOIN countries co ON co.code = t.merchant_country
+ORDER BY t.rowid;
+
+DROP TABLE transactions;
+
+-- LEFT JOINs (the keys are NOT NULL, so no row is lost) let SQLite skip the
+-- dimension lookups a query does not use, e.g. COUNT/SUM over a time range
+CREATE VIEW transactions AS
+SELECT
+    f.transaction_id,
+    u.user_id,
+    f.amount_paise / 100.0 AS amount,
+    m.merchant_id,
+    c.name AS merchant_category,
+    p.name AS payment_method,
+    f.timestamp,
+    f.location,
+    f.is_international,
+    co.code AS merchant_country,
+    datetime(f.created_at, 'unixepoch') AS created_at
+FROM transaction_facts f
+LEFT JOIN users u ON u.user_key = f.user_key
+LEFT JOIN merchants m ON m.merchant_key = f.merchant_key
+LEFT JOIN merchant_categories c ON c.category_key = f.category_key
+LEFT JOIN payment_methods p ON p.method_key = f.method_key
+LEFT JOIN countries co ON co.country_key = f.country_key;
+
+DROP VIEW IF EXISTS transaction_amounts;
+
+CREATE VIEW transaction_amounts AS
+SELECT transaction_id, timestamp, amount_paise / 100.0 AS amount FROM transaction_facts;
+
+CREATE TRIGGER transactions_insert INSTEAD OF INSERT ON transactions
+BEGIN
+    INSERT OR IGNORE INTO users (user_id) VALUES (NEW.user_id);
+    INSERT OR IGNORE INTO merchants (merchant_id) VALUES (NEW.merchant_id);
+    INSERT OR IGNORE INTO merchant_categories (name) VALUES (NEW.merchant_category);
+    INSERT OR IGNORE INTO payment_methods (name) VALUES (NEW.payment_method);
+    INSERT OR IGNORE INTO countries (code) VALUES (COALESCE(NEW.merchant_country, 'IN'));
+
+    INSERT INTO transaction_facts (
+        transaction_id, user_key, amount_paise, merchant_key, category_key, method_key,
+        timestamp, location, is_international, country_key, created_at
+    ) VALUES (
+        NEW.transaction_id,
+        (SELECT user_key FROM users WHERE user_id = NEW.user_id),
+        CAST(ROUND(NEW.amount * 100) AS INTEGER),
+        (SELECT merchant_key FROM merchants WHERE merchant_id = NEW.merchant_id),
+        (SELECT category_key FROM merchant_categories WHERE name = NEW.merchant_category),
+        (SELECT method_key FROM payment_methods WHERE name = NEW.payment_method),
+        NEW.timestamp,
+        NEW.location,
+        COALESCE(NEW.is_international, 0),
+        (SELECT country_key FROM countries WHERE code = COALESCE(NEW.merchant_country, 'IN')),
+        CAST(strftime('%s', COALESCE(NEW.created_at, 'now')) AS INTEGER)
+    );
+END;
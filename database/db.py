@@ -1,9 +1,17 @@
 
 import sqlite3
 from contextlib import contextmanager
-from typing import List, Dict, Any, Optional
-import os
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from database.migrator import migrate
+from database.compact import convert as convert_to_compact, is_compact
+from utils.cache import LRUCache, estimate_size
+from datetime import datetime, timedelta, timezone
 import config
+import threading
+import json
+import time
+import os
 
 
 class Database:
@@ -12,36 +20,249 @@ class Database:
     def __init__(self, db_path: str = None):
 
         self.db_path = db_path or config.DATABASE_PATH
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._writer_pid = None
+        self._versions = {}
+        self._version_lock = threading.Lock()
+        self._external_version = 0
+        self.transaction_cache = LRUCache(
+            max_entries=config.OBJECT_CACHE_MAX_ENTRIES,
+            max_bytes=config.OBJECT_CACHE_MAX_BYTES
+        )
+        self.alert_cache = LRUCache(
+            max_entries=config.OBJECT_CACHE_MAX_ENTRIES,
+            max_bytes=config.OBJECT_CACHE_MAX_BYTES
+        )
+        self._rollback_listeners = []
+        self._storage = None
         self.init_database()
     
     def init_database(self):
 
-        schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
+        # Only migrations newer than the recorded schema_version are executed
+        migrate(self.db_path)
         
-        with open(schema_path, 'r') as f:
-            schema_sql = f.read()
+        if config.COMPACT_STORAGE:
+            # One-way rewrite of transactions into dimension tables behind a view
+            convert_to_compact(self.db_path)
         
-        with self.get_connection() as conn:
-            conn.executescript(schema_sql)
-            conn.commit()
+        if config.SQLITE_WAL:
+            # WAL lets read-only connections run concurrently with the writer
+            with self.get_connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
     
     @contextmanager
-    def get_connection(self):
+    def get_connection(self, readonly: bool = False):
 
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        if readonly:
+            pinned = getattr(self._local, 'read_conn', None)
+            if pinned is not None:
+                yield pinned
+                return
+            
+            conn = self._connect_readonly()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
         
+        # All inserts and updates share one writer connection, one statement batch at a time
+        self._acquire_writer()
         try:
-            yield conn
-        except Exception as e:
-            conn.rollback()
-            raise e
+            conn = self._get_writer()
+            in_batch = getattr(self._local, 'in_batch', False)
+            if in_batch:
+                self._check_batch(conn)
+            try:
+                yield conn
+            except Exception as e:
+                # Inside write_batch() a failed statement usually only undoes itself; the batch decides
+                if not in_batch:
+                    conn.rollback()
+                raise e
+            if in_batch and conn.in_transaction:
+                self._local.batch_written = True
+        finally:
+            self._write_lock.release()
+    
+    def _check_batch(self, conn: sqlite3.Connection):
+
+        # Some errors (disk full, I/O) make SQLite roll back the whole open transaction; a later statement
+        # would silently start a new one, so the rest of the batch would commit without its first part
+        if self._local.batch_written and not conn.in_transaction:
+            raise sqlite3.OperationalError("write batch was rolled back by SQLite")
+    
+    def _acquire_writer(self):
+
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is None:
+            self._write_lock.acquire()
+        elif not self._write_lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            # Same error an interrupted statement raises, so callers under a deadline handle one case
+            raise sqlite3.OperationalError("interrupted: writer busy past the deadline")
+    
+    @contextmanager
+    def read_snapshot(self):
+
+        if getattr(self._local, 'read_conn', None) is not None:
+            yield self
+            return
+        
+        conn = self._connect_readonly()
+        try:
+            # A deferred transaction pins every read in the block to the same snapshot
+            conn.execute("BEGIN")
+            self._local.read_conn = conn
+            yield self
         finally:
+            self._local.read_conn = None
+            conn.rollback()
             conn.close()
     
+    @contextmanager
+    def deadline(self, seconds: float):
+
+        # Reads this thread runs inside the block are interrupted once it passes, and waits for the
+        # writer give up. Writes are never interrupted: that would roll back their whole transaction
+        previous = getattr(self._local, 'deadline', None)
+        self._local.deadline = time.monotonic() + seconds
+        try:
+            yield self
+        finally:
+            self._local.deadline = previous
+    
+    def _past_deadline(self) -> bool:
+
+        deadline = getattr(self._local, 'deadline', None)
+        return deadline is not None and time.monotonic() > deadline
+    
+    @contextmanager
+    def write_batch(self):
+
+        if getattr(self._local, 'in_batch', False):
+            yield self
+            return
+        
+        with self._write_lock:
+            conn = self._get_writer()
+            # Reads in this thread go through the writer so rules see the uncommitted batch
+            self._local.read_conn = conn
+            self._local.in_batch = True
+            self._local.batch_written = False
+            self._local.after_commit = []
+            try:
+                yield self
+                self._check_batch(conn)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                # Rows cached during the batch were never committed
+                self.transaction_cache.clear()
+                self.alert_cache.clear()
+                for listener in self._rollback_listeners:
+                    listener()
+                raise e
+            finally:
+                self._local.read_conn = None
+                self._local.in_batch = False
+                pending, self._local.after_commit = self._local.after_commit, []
+            
+            # Only reached once the COMMIT succeeded; a rollback drops the queue with the batch
+            for callback in pending:
+                callback()
+    
+    def _after_commit(self, callback):
+
+        # Inside write_batch() readers must not learn about rows before they are committed
+        if getattr(self._local, 'in_batch', False):
+            self._local.after_commit.append(callback)
+        else:
+            callback()
+    
+    def add_rollback_listener(self, callback):
+
+        # Called when a write batch rolls back, for in-memory state derived from its rows
+        self._rollback_listeners.append(callback)
+    
+    def _invalidate_alerts(self, alert_ids: Optional[List[str]] = None):
+
+        # Dropped now and again after the commit: a reader may cache the old committed row in between
+        def invalidate():
+            if alert_ids is None:
+                self.alert_cache.clear()
+            for alert_id in alert_ids or []:
+                self.alert_cache.invalidate(alert_id)
+        
+        invalidate()
+        if getattr(self._local, 'in_batch', False):
+            self._after_commit(invalidate)
+    
+    def bump_version(self, *keys: str):
+
+        # A bump seen before the commit would let a reader cache the old rows under the new version
+        self._after_commit(lambda: self._bump_now(keys))
+    
+    def _bump_now(self, keys: Tuple[str, ...]):
+
+        with self._version_lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+    
+    def data_version(self, *keys: str) -> Tuple:
+
+        # Local counters are precise for this process's writes; any commit from elsewhere moves them all
+        external = self.external_version()
+        return (('external', external),) + tuple((key, self._versions.get(key, 0)) for key in keys)
+    
+    def external_version(self) -> int:
+
+        # PRAGMA data_version on the writer only changes when another connection commits, i.e. another
+        # process or Database; while this process holds the writer, the last value seen is reused
+        if not self._write_lock.acquire(blocking=False):
+            return self._external_version
+        try:
+            version = self._get_writer().execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._write_lock.release()
+        
+        if version != self._external_version:
+            # Alerts are mutable, so rows cached before an outside update may be stale
+            self.alert_cache.clear()
+            self._external_version = version
+        return version
+    
+    def close(self):
+
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+    
+    def _get_writer(self) -> sqlite3.Connection:
+
+        # A connection inherited through fork() must not be reused by the child
+        if self._writer is None or self._writer_pid != os.getpid():
+            self._writer = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._writer.row_factory = sqlite3.Row
+            self._writer_pid = os.getpid()
+        return self._writer
+    
+    def _connect_readonly(self) -> sqlite3.Connection:
+
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        # Checked every few thousand VM steps; a true result aborts the statement with "interrupted"
+        conn.set_progress_handler(self._past_deadline, config.SQLITE_PROGRESS_STEPS)
+        return conn
+    
     def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
 
-        with self.get_connection() as conn:
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
             
             if params:
@@ -62,62 +283,104 @@ class Database:
             else:
                 cursor.execute(query)
             
-            conn.commit()
+            if not getattr(self._local, 'in_batch', False):
+                conn.commit()
             return cursor.rowcount
     
     def insert_transaction(self, transaction) -> bool:
 
-        query = """
-        INSERT INTO transactions (
-            transaction_id, user_id, amount, merchant_id, 
-            merchant_category, payment_method, timestamp,
-            location, is_international, merchant_country
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        row = {
+            'transaction_id': transaction.transaction_id,
+            'user_id': transaction.user_id,
+            'amount': transaction.amount,
+            'merchant_id': transaction.merchant_id,
+            'merchant_category': transaction.merchant_category,
+            'payment_method': transaction.payment_method,
+            'timestamp': transaction.timestamp,
+            'location': transaction.location,
+            'is_international': 1 if transaction.is_international else 0,
+            'merchant_country': transaction.merchant_country,
+            'created_at': _utc_now()
+        }
+        
+        query = f"""
+        INSERT INTO transactions ({', '.join(row)})
+        VALUES ({', '.join('?' for _ in row)})
         """
         
-        params = (
-            transaction.transaction_id,
-            transaction.user_id,
-            transaction.amount,
-            transaction.merchant_id,
-            transaction.merchant_category,
-            transaction.payment_method,
-            transaction.timestamp,
-            transaction.location,
-            1 if transaction.is_international else 0,
-            transaction.merchant_country
-        )
+        self.execute_update(query, tuple(row.values()))
+        self.bump_version('transactions', f"transactions:{transaction.timestamp[:10]}")
         
-        self.execute_update(query, params)
+        # The row written is exactly what a later SELECT returns, so it seeds the cache
+        self._after_commit(
+            lambda: self.transaction_cache.put(transaction.transaction_id, row, size=estimate_size(row))
+        )
         return True
     
     def insert_alert(self, alert) -> bool:
 
-        query = """
-        INSERT INTO alerts (
-            alert_id, transaction_id, rule_name, severity,
-            details, timestamp, status
-        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        row = {
+            'alert_id': alert.alert_id,
+            'transaction_id': alert.transaction_id,
+            'rule_name': alert.rule_name,
+            'severity': alert.severity,
+            'details': alert.details,
+            'timestamp': alert.timestamp,
+            'status': alert.status,
+            'resolved_at': alert.resolved_at,
+            'resolved_by': alert.resolved_by,
+            'resolution_notes': alert.resolution_notes,
+            'created_at': _utc_now(),
+            'lease_owner': alert.lease_owner,
+            'lease_expires_at': alert.lease_expires_at
+        }
+        
+        query = f"""
+        INSERT INTO alerts ({', '.join(row)})
+        VALUES ({', '.join('?' for _ in row)})
         """
         
-        params = (
-            alert.alert_id,
-            alert.transaction_id,
-            alert.rule_name,
-            alert.severity,
-            alert.details,
-            alert.timestamp,
-            alert.status
-        )
+        self.execute_update(query, tuple(row.values()))
+        self.bump_version('alerts', f"alerts:{alert.timestamp[:10]}")
         
-        self.execute_update(query, params)
+        self._after_commit(lambda: self.alert_cache.put(alert.alert_id, row, size=estimate_size(row)))
         return True
     
     def get_transaction(self, transaction_id: str) -> Optional[Dict]:
 
-        query = "SELECT * FROM transactions WHERE transaction_id = ?"
-        results = self.execute_query(query, (transaction_id,))
-        return results[0] if results else None
+        row = self.transaction_cache.get(transaction_id)
+        if row is None:
+            query = "SELECT * FROM transactions WHERE transaction_id = ?"
+            results = self.execute_query(query, (transaction_id,))
+            if not results:
+                return None
+            
+            row = results[0]
+            # Read through the writer inside a batch, so the row may not be committed yet
+            self._after_commit(
+                lambda: self.transaction_cache.put(transaction_id, row, size=estimate_size(row))
+            )
+        
+        return dict(row)
+    
+    def get_alert(self, alert_id: str) -> Optional[Dict]:
+
+        # Drops cached alerts if another process has committed since the last check
+        self.external_version()
+        row = self.alert_cache.get(alert_id)
+        if row is None:
+            # An update racing with this read must not leave a stale row behind
+            version = self.data_version('alerts:updated')
+            
+            results = self.execute_query("SELECT * FROM alerts WHERE alert_id = ?", (alert_id,))
+            if not results:
+                return None
+            
+            row = results[0]
+            if self.data_version('alerts:updated') == version:
+                self._after_commit(lambda: self.alert_cache.put(alert_id, row, size=estimate_size(row)))
+        
+        return dict(row)
     
     def get_user_transactions_in_window(self, user_id: str, start_time: str, end_time: str = None) -> List[Dict]:
 
@@ -136,6 +399,56 @@ class Database:
             """
             return self.execute_query(query, (user_id, start_time))
     
+    def iter_query(self, query: str, params: tuple = (), batch_size: int = 1000) -> Iterator[List[Dict]]:
+
+        # One cursor held open for the whole scan, read batch_size rows at a time. That is one read
+        # transaction for the whole scan, which keeps WAL checkpoints from completing until it ends
+        with self.get_connection(readonly=True) as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [dict(row) for row in rows]
+
+    def _transaction_storage(self) -> str:
+
+        # Compact storage keeps the rows in transaction_facts behind a view; both number rows in insertion order.
+        # The layout only changes when init_database() converts it, so it is looked up once
+        if self._storage is None:
+            with self.get_connection(readonly=True) as conn:
+                self._storage = 'transaction_facts' if is_compact(conn) else 'transactions'
+        return self._storage
+    
+    def transaction_high_water(self) -> int:
+
+        # Transactions are never deleted, so a rowid above this one was stored later
+        table = self._transaction_storage()
+        return self.execute_query(f"SELECT COALESCE(MAX(rowid), 0) AS position FROM {table}")[0]['position']
+    
+    def iter_transactions_stored_since(self, position: int, start_time: str,
+                                       batch_size: int = 1000) -> Iterator[Dict]:
+
+        # Rows timestamped from start_time on, then rows stored after the position whatever their
+        # timestamp; two range scans, since an OR of the two conditions is planned as a full scan
+        if self._transaction_storage() == 'transaction_facts':
+            select = (
+                "SELECT t.* FROM transaction_facts f JOIN transactions t ON t.transaction_id = f.transaction_id "
+            )
+            queries = [
+                (select + "WHERE f.timestamp >= ? AND f.rowid <= ? ORDER BY f.timestamp", (start_time, position)),
+                (select + "WHERE f.rowid > ? ORDER BY f.rowid", (position,))
+            ]
+        else:
+            queries = [
+                ("SELECT * FROM transactions WHERE timestamp >= ? AND rowid <= ? ORDER BY timestamp",
+                 (start_time, position)),
+                ("SELECT * FROM transactions WHERE rowid > ? ORDER BY rowid", (position,))
+            ]
+        for query, params in queries:
+            for rows in self.iter_query(query, params, batch_size):
+                yield from rows
+    
     def get_alerts(self, status: str = None, severity: str = None) -> List[Dict]:
 
         query = "SELECT * FROM alerts WHERE 1=1"
@@ -156,11 +469,11 @@ class Database:
     def update_alert_status(self, alert_id: str, status: str, 
                            resolved_by: str = None, notes: str = None) -> bool:
 
-        from datetime import datetime
-        
+        # Resolving ends any lease, so the alert leaves the analyst's queue
         query = """
         UPDATE alerts 
-        SET status = ?, resolved_at = ?, resolved_by = ?, resolution_notes = ?
+        SET status = ?, resolved_at = ?, resolved_by = ?, resolution_notes = ?,
+            lease_owner = NULL, lease_expires_at = NULL
         WHERE alert_id = ?
         """
         
@@ -172,5 +485,330 @@ class Database:
             alert_id
         )
         
-        self.execute_update(query, params)
-        return True
\ No newline at end of file
+        updated = self.execute_update(query, params) > 0
+        if updated:
+            self.bump_version('alerts', 'alerts:updated')
+        self._invalidate_alerts([alert_id])
+        return updated
+    
+    def bulk_update_alert_status(self, status: str, resolved_by: str = None, notes: str = None,
+                                 alert_ids: List[str] = None, filters: Dict = None) -> Tuple[int, List[str]]:
+
+        assignments = (
+            "status = ?, resolved_at = ?, resolved_by = ?, resolution_notes = ?, "
+            "lease_owner = NULL, lease_expires_at = NULL"
+        )
+        values = [
+            status,
+            datetime.now().isoformat() if status != 'OPEN' else None,
+            resolved_by,
+            notes
+        ]
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            if alert_ids is not None:
+                # The whole ID list is bound as one JSON parameter, so this stays a single statement
+                ids_json = json.dumps(list(dict.fromkeys(alert_ids)))
+                
+                cursor.execute(
+                    """
+                    SELECT ids.value AS alert_id FROM json_each(?) AS ids
+                    WHERE NOT EXISTS (SELECT 1 FROM alerts WHERE alerts.alert_id = ids.value)
+                    """,
+                    (ids_json,)
+                )
+                not_found = [row['alert_id'] for row in cursor.fetchall()]
+                
+                # Alerts someone already resolved keep their first resolver, as on the filter path
+                cursor.execute(
+                    f"UPDATE alerts SET {assignments} "
+                    f"WHERE alert_id IN (SELECT value FROM json_each(?)) AND status = 'OPEN'",
+                    tuple(values + [ids_json])
+                )
+            else:
+                conditions = ["status = 'OPEN'"]
+                params = []
+                
+                if 'rule_name' in filters:
+                    conditions.append("rule_name = ?")
+                    params.append(filters['rule_name'])
+                
+                if 'severity' in filters:
+                    conditions.append("severity = ?")
+                    params.append(filters['severity'])
+                
+                if 'start_time' in filters:
+                    conditions.append("timestamp >= ?")
+                    params.append(filters['start_time'])
+                
+                if 'end_time' in filters:
+                    conditions.append("timestamp <= ?")
+                    params.append(filters['end_time'])
+                
+                not_found = []
+                cursor.execute(
+                    f"UPDATE alerts SET {assignments} WHERE {' AND '.join(conditions)}",
+                    tuple(values + params)
+                )
+            
+            updated = cursor.rowcount
+            conn.commit()
+        
+        if updated:
+            self.bump_version('alerts', 'alerts:updated')
+        
+        self._invalidate_alerts(alert_ids)
+        
+        return updated, not_found
+    
+    def count_by_rule_and_severity(self, table: str, start_time: str, end_time: str) -> List[Dict]:
+
+        # A GROUP BY over a time range sorts every matching row in a temp B-tree. Instead, the distinct
+        # (rule_name, severity) pairs are walked with MIN() seeks and each pair's range is counted, all
+        # on a (rule_name, severity, timestamp) index: the cost follows the pairs, not the rows
+        counts = []
+        with self.read_snapshot():
+            rule_name = ''
+            while True:
+                rule_name = self.execute_query(
+                    f"SELECT MIN(rule_name) AS value FROM {table} WHERE rule_name > ?", (rule_name,)
+                )[0]['value']
+                if rule_name is None:
+                    return counts
+                
+                severity = ''
+                while True:
+                    severity = self.execute_query(
+                        f"SELECT MIN(severity) AS value FROM {table} WHERE rule_name = ? AND severity > ?",
+                        (rule_name, severity)
+                    )[0]['value']
+                    if severity is None:
+                        break
+                    
+                    n = self.execute_query(
+                        f"SELECT COUNT(*) AS n FROM {table} "
+                        "WHERE rule_name = ? AND severity = ? AND timestamp >= ? AND timestamp <= ?",
+                        (rule_name, severity, start_time, end_time)
+                    )[0]['n']
+                    if n:
+                        counts.append({'rule_name': rule_name, 'severity': severity, 'n': n})
+    
+    def claim_alerts(self, owner: str, limit: int, lease_seconds: int,
+                     severities: List[str]) -> List[Dict]:
+
+        now = datetime.now(timezone.utc)
+        now_text = now.strftime('%Y-%m-%d %H:%M:%S')
+        expires_at = (now + timedelta(seconds=lease_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        # One UPDATE per severity, highest first; each is a range of the partial OPEN index.
+        # Select-and-lease in a single statement means two analysts can never claim the same alert.
+        # The planner would pick idx_alerts_status_severity_time, which needs a table lookup for
+        # every live lease it skips; the covering partial index skips them in the index itself
+        query = """
+        UPDATE alerts SET lease_owner = ?, lease_expires_at = ?
+        WHERE alert_id IN (
+            SELECT alert_id FROM alerts INDEXED BY idx_alerts_open_queue
+            WHERE status = 'OPEN' AND severity = ?
+              AND (lease_expires_at IS NULL OR lease_expires_at <= ?)
+            ORDER BY timestamp
+            LIMIT ?
+        )
+        RETURNING *
+        """
+        
+        claimed = []
+        with self.get_connection() as conn:
+            for severity in severities:
+                remaining = limit - len(claimed)
+                if remaining <= 0:
+                    break
+                
+                cursor = conn.execute(query, (owner, expires_at, severity, now_text, remaining))
+                rows = [dict(row) for row in cursor.fetchall()]
+                claimed.extend(sorted(rows, key=lambda row: row['timestamp']))
+            
+            if not getattr(self._local, 'in_batch', False):
+                conn.commit()
+        
+        if claimed:
+            self.bump_version('alerts', 'alerts:updated')
+            self._invalidate_alerts([row['alert_id'] for row in claimed])
+        return claimed
+    
+    def renew_alert_leases(self, owner: str, alert_ids: List[str], lease_seconds: int) -> List[str]:
+
+        expires_at = (
+            datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+        ).strftime('%Y-%m-%d %H:%M:%S')
+        
+        # An expired lease can still be renewed until another analyst claims the alert
+        return self._update_leases(
+            "lease_expires_at = ?",
+            (expires_at,),
+            owner,
+            alert_ids
+        )
+    
+    def release_alert_leases(self, owner: str, alert_ids: List[str]) -> List[str]:
+
+        return self._update_leases(
+            "lease_owner = NULL, lease_expires_at = NULL",
+            (),
+            owner,
+            alert_ids
+        )
+    
+    def _update_leases(self, assignments: str, values: Tuple, owner: str, alert_ids: List[str]) -> List[str]:
+
+        ids_json = json.dumps(list(dict.fromkeys(alert_ids)))
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                f"""
+                UPDATE alerts SET {assignments}
+                WHERE alert_id IN (SELECT value FROM json_each(?))
+                  AND status = 'OPEN' AND lease_owner = ?
+                RETURNING alert_id
+                """,
+                values + (ids_json, owner)
+            )
+            updated = [row['alert_id'] for row in cursor.fetchall()]
+            if not getattr(self._local, 'in_batch', False):
+                conn.commit()
+        
+        if updated:
+            self.bump_version('alerts', 'alerts:updated')
+            self._invalidate_alerts(updated)
+        return updated
+    
+    def insert_shadow_alerts(self, rows: List[Dict]) -> int:
+
+        if not rows:
+            return 0
+        
+        columns = list(rows[0])
+        query = f"""
+        INSERT INTO shadow_alerts ({', '.join(columns)})
+        VALUES ({', '.join('?' for _ in columns)})
+        """
+        
+        # One statement and one commit for the whole batch, so the writer lock is taken once
+        with self.get_connection() as conn:
+            conn.executemany(query, [tuple(row[column] for column in columns) for row in rows])
+            if not getattr(self._local, 'in_batch', False):
+                conn.commit()
+        return len(rows)
+    
+    def get_idempotent_response(self, idempotency_key: str, max_age_seconds: int = None) -> Optional[Dict]:
+
+        # An empty response is a reservation whose write transaction has not committed
+        query = "SELECT * FROM idempotency_keys WHERE idempotency_key = ? AND response != ''"
+        params = [idempotency_key]
+        
+        if max_age_seconds:
+            query += " AND created_at >= datetime('now', ?)"
+            params.append(f"-{int(max_age_seconds)} seconds")
+        
+        results = self.execute_query(query, tuple(params))
+        return results[0] if results else None
+    
+    def reserve_idempotency_key(self, idempotency_key: str, transaction_id: str, fingerprint: str,
+                                max_age_seconds: int = None, pending_seconds: int = None) -> bool:
+
+        # Run inside the write batch that stores the transaction, so the key and its row commit together
+        if max_age_seconds:
+            self.execute_update(
+                "DELETE FROM idempotency_keys WHERE idempotency_key = ? AND created_at < datetime('now', ?)",
+                (idempotency_key, f"-{int(max_age_seconds)} seconds")
+            )
+        if pending_seconds:
+            # Reserved but never answered: the worker that took it crashed while scoring
+            self.execute_update(
+                "DELETE FROM idempotency_keys WHERE idempotency_key = ? AND response = '' "
+                "AND created_at < datetime('now', ?)",
+                (idempotency_key, f"-{int(pending_seconds)} seconds")
+            )
+        
+        query = """
+        INSERT OR IGNORE INTO idempotency_keys (
+            idempotency_key, transaction_id, response, fingerprint
+        ) VALUES (?, ?, '', ?)
+        """
+        
+        return self.execute_update(query, (idempotency_key, transaction_id, fingerprint)) > 0
+    
+    def save_idempotent_response(self, idempotency_key: str, response: str):
+
+        self.execute_update(
+            "UPDATE idempotency_keys SET response = ? WHERE idempotency_key = ?",
+            (response, idempotency_key)
+        )
+    
+    def release_idempotency_key(self, idempotency_key: str):
+
+        # Only an unanswered reservation; a stored decision stays for replays
+        self.execute_update(
+            "DELETE FROM idempotency_keys WHERE idempotency_key = ? AND response = ''",
+            (idempotency_key,)
+        )
+    
+    def purge_idempotency_keys(self, max_age_seconds: int) -> int:
+
+        return self.execute_update(
+            "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+            (f"-{int(max_age_seconds)} seconds",)
+        )
+    
+    def get_user_amount_stats(self, user_id: str) -> Optional[Dict]:
+
+        results = self.execute_query("SELECT * FROM user_amount_stats WHERE user_id = ?", (user_id,))
+        return results[0] if results else None
+    
+    def update_user_amount_stats(self, user_id: str, value: float, alpha: float):
+
+        # Welford and EWMA steps in one upsert; SET expressions read the pre-update row
+        query = """
+        INSERT INTO user_amount_stats (user_id, count, mean, m2, ewma, ewm_var, updated_at)
+        VALUES (?1, 1, ?2, 0.0, ?2, 0.0, datetime('now'))
+        ON CONFLICT(user_id) DO UPDATE SET
+            count = count + 1,
+            mean = mean + (?2 - mean) / (count + 1),
+            m2 = m2 + (?2 - mean) * (?2 - (mean + (?2 - mean) / (count + 1))),
+            ewma = ewma + ?3 * (?2 - ewma),
+            ewm_var = (1 - ?3) * (ewm_var + ?3 * (?2 - ewma) * (?2 - ewma)),
+            updated_at = excluded.updated_at
+        """
+        
+        self.execute_update(query, (user_id, value, alpha))
+    
+    def get_ingest_checkpoint(self, source: str) -> Optional[Dict]:
+
+        results = self.execute_query("SELECT * FROM ingest_checkpoints WHERE source = ?", (source,))
+        return results[0] if results else None
+    
+    def save_ingest_checkpoint(self, source: str, records: int, byte_offset: Optional[int],
+                               accepted: int, rejected: int):
+
+        query = """
+        INSERT INTO ingest_checkpoints (source, records, byte_offset, accepted, rejected, updated_at)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(source) DO UPDATE SET
+            records = excluded.records,
+            byte_offset = excluded.byte_offset,
+            accepted = excluded.accepted,
+            rejected = excluded.rejected,
+            updated_at = excluded.updated_at
+        """
+        
+        self.execute_update(query, (source, records, byte_offset, accepted, rejected))
+    
+    def delete_ingest_checkpoint(self, source: str):
+
+        self.execute_update("DELETE FROM ingest_checkpoints WHERE source = ?", (source,))
+
+
+def _utc_now() -> str:
+
+    # Same format as SQLite's datetime('now')
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,7 @@
+-- Idempotency keys: stored decision for each client-supplied key
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key TEXT PRIMARY KEY,
+    transaction_id TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now'))
+);
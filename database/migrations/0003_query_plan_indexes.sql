@@ -0,0 +1,19 @@
+-- Indexes backing the hot queries checked by database/query_audit.py
+
+-- Prefix of idx_transactions_user_time, so it only costs writes
+DROP INDEX IF EXISTS idx_transactions_user_id;
+
+-- Daily totals (COUNT/SUM over a time range) are answered from the index alone
+DROP INDEX IF EXISTS idx_transactions_timestamp;
+CREATE INDEX IF NOT EXISTS idx_transactions_time_amount ON transactions(timestamp, amount);
+
+-- Alert listings filter on status/severity and always sort by timestamp
+DROP INDEX IF EXISTS idx_alerts_status;
+DROP INDEX IF EXISTS idx_alerts_severity;
+CREATE INDEX IF NOT EXISTS idx_alerts_status_severity_time ON alerts(status, severity, timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_status_time ON alerts(status, timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_severity_time ON alerts(severity, timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_rule_time ON alerts(rule_name, timestamp);
+
+-- Daily report alert breakdown and unfiltered listings
+CREATE INDEX IF NOT EXISTS idx_alerts_time_severity_rule ON alerts(timestamp, severity, rule_name);
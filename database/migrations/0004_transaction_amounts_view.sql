@@ -0,0 +1,4 @@
+-- Narrow view for amount aggregates. The compact storage layout redefines it over
+-- transaction_facts alone, so totals never pay for the dimension lookups.
+CREATE VIEW IF NOT EXISTS transaction_amounts AS
+SELECT transaction_id, timestamp, amount FROM transactions;
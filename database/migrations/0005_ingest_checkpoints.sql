@@ -0,0 +1,9 @@
+-- Resume points for `python -m services.ingest`, committed with each chunk of rows
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source TEXT PRIMARY KEY,
+    records INTEGER NOT NULL,
+    byte_offset INTEGER,
+    accepted INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT (datetime('now'))
+);
@@ -0,0 +1,11 @@
+-- Running per-user amount statistics for AMOUNT_ANOMALY (log-amount space).
+-- One small row per user keyed by user_id, so no separate rowid B-tree is kept.
+CREATE TABLE IF NOT EXISTS user_amount_stats (
+    user_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    ewma REAL NOT NULL,
+    ewm_var REAL NOT NULL,
+    updated_at TEXT
+) WITHOUT ROWID;
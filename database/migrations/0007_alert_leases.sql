@@ -0,0 +1,10 @@
+-- Lease columns for the analyst work queue (POST /api/alerts/claim).
+-- A lease is live while lease_expires_at (UTC, datetime('now') format) is in the future.
+ALTER TABLE alerts ADD COLUMN lease_owner TEXT;
+ALTER TABLE alerts ADD COLUMN lease_expires_at TEXT;
+
+-- Only OPEN alerts are claimable, so the queue index stays as small as the backlog
+-- however many resolved alerts accumulate
+CREATE INDEX IF NOT EXISTS idx_alerts_open_queue
+    ON alerts(severity, timestamp, lease_expires_at, alert_id)
+    WHERE status = 'OPEN';
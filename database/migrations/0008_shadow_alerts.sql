@@ -0,0 +1,13 @@
+-- Would-be alerts of candidate rules evaluated in shadow mode (SHADOW_RULES_PATH).
+-- Never shown to analysts; kept apart so live alert queries and indexes are unaffected.
+CREATE TABLE IF NOT EXISTS shadow_alerts (
+    shadow_alert_id TEXT PRIMARY KEY,
+    transaction_id TEXT NOT NULL,
+    rule_name TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    details TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_shadow_alerts_time_rule ON shadow_alerts(timestamp, rule_name, severity);
@@ -0,0 +1,6 @@
+-- Fingerprint of the request body a key was first used with, so reusing the key
+-- for a different transaction is refused; NULL on keys stored before this migration.
+ALTER TABLE idempotency_keys ADD COLUMN fingerprint TEXT;
+
+-- Expired keys are purged by age
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at);
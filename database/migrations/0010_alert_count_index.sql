@@ -0,0 +1,3 @@
+-- Daily report alert breakdown: per (rule_name, severity) pair, a count over the
+-- report's time range, each answered by one range search on this index
+CREATE INDEX IF NOT EXISTS idx_alerts_rule_severity_time ON alerts(rule_name, severity, timestamp);
@@ -0,0 +1,5 @@
+-- The shadow summary counts each (rule_name, severity) pair's time range with one
+-- range search here; the time-leading index only served a GROUP BY that sorted
+-- every alert in the range, and no other query used it
+DROP INDEX IF EXISTS idx_shadow_alerts_time_rule;
+CREATE INDEX IF NOT EXISTS idx_shadow_alerts_rule_severity_time ON shadow_alerts(rule_name, severity, timestamp);
@@ -0,0 +1,182 @@
+"""
+Versioned schema migrations
+Applies numbered SQL files from database/migrations exactly once per database
+
+Usage:
+    python -m database.migrator status [--db PATH]
+    python -m database.migrator upgrade [--db PATH]
+"""
+
+from typing import List, NamedTuple, Optional
+import argparse
+import os
+import re
+import sqlite3
+import threading
+
+import config
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Databases already confirmed up to date by this process: (abspath, latest version)
+_verified = set()
+_verified_lock = threading.Lock()
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: str
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+
+    migrations.sort()
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+
+    return migrations
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def migrate(db_path: str, directory: str = MIGRATIONS_DIR) -> List[int]:
+
+    migrations = discover_migrations(directory)
+    latest = migrations[-1].version if migrations else 0
+    key = (os.path.abspath(db_path), latest)
+
+    if key in _verified:
+        return []
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if current_version(conn) >= latest:
+            applied = []
+        else:
+            applied = _apply_pending(conn, migrations)
+    finally:
+        conn.close()
+
+    with _verified_lock:
+        _verified.add(key)
+
+    return applied
+
+
+def _apply_pending(conn: sqlite3.Connection, migrations: List[Migration]) -> List[int]:
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT (datetime('now'))
+        )
+    """)
+
+    applied = []
+    for migration in migrations:
+        # BEGIN IMMEDIATE takes the write lock, so concurrent starters apply each file once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) >= migration.version:
+                conn.execute("ROLLBACK")
+                continue
+
+            with open(migration.path, 'r', encoding='utf-8') as f:
+                for statement in split_statements(f.read()):
+                    conn.execute(statement)
+
+            conn.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (migration.version, migration.name)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        applied.append(migration.version)
+
+    return applied
+
+
+def split_statements(sql: str) -> List[str]:
+
+    # executescript() would commit on our behalf, so statements are run one by one
+    statements = []
+    buffer = ''
+    for line in sql.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            buffer = ''
+
+    leftover = [l for l in buffer.splitlines() if l.strip() and not l.strip().startswith('--')]
+    if leftover:
+        raise ValueError(f"Incomplete SQL statement: {leftover[0][:80]}")
+
+    return statements
+
+
+def migration_status(db_path: str, directory: str = MIGRATIONS_DIR) -> List[dict]:
+
+    conn = sqlite3.connect(db_path)
+    try:
+        try:
+            rows = conn.execute("SELECT version, applied_at FROM schema_version").fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+    finally:
+        conn.close()
+
+    applied = dict(rows)
+    return [
+        {
+            'version': m.version,
+            'name': m.name,
+            'applied_at': applied.get(m.version)
+        }
+        for m in discover_migrations(directory)
+    ]
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Manage database schema migrations")
+    parser.add_argument('command', choices=['status', 'upgrade'])
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    if args.command == 'upgrade':
+        applied = migrate(args.db)
+        print(f"Applied {len(applied)} migration(s): {applied}" if applied else "Schema is up to date")
+        return
+
+    for entry in migration_status(args.db):
+        state = f"applied {entry['applied_at']}" if entry['applied_at'] else "pending"
+        print(f"{entry['version']:04d}  {entry['name']:<40} {state}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Query plan audit
+Replays the API and service workload against a representative database,
+captures every SQL statement issued and checks its EXPLAIN QUERY PLAN.
+
+A statement fails the audit when its plan contains a full table scan or a
+temporary B-tree (sort/group/distinct that no index satisfies).
+
+Usage:
+    python -m database.query_audit                # seeded temporary database
+    python -m database.query_audit --db prod.db   # audit against a copy of a real database
+    python -m database.query_audit --compact      # audit the compact storage layout
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Optional
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+from database.compact import convert as convert_to_compact
+from database.db import Database
+
+
+_FULL_SCAN = re.compile(r'^SCAN (TABLE )?(\w+)( AS \w+)?$')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(\.\d+)?(?![\w.])')
+_IN_LIST = re.compile(r'IN \((\?, )*\?\)')
+
+_AUDITED_VERBS = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+# Statements whose full scans are intentional, with the reason recorded
+ALLOWED_SCANS = {
+    "SELECT type FROM sqlite_master WHERE name = ?":
+        "schema lookup, once per Database; sqlite_master is small and always in memory",
+}
+
+
+class TracingDatabase(Database):
+    """Database that records every statement executed on its connections"""
+
+    def __init__(self, db_path: str):
+
+        self.statements = {}
+        super().__init__(db_path)
+
+    @contextmanager
+    def get_connection(self, *args, **kwargs):
+
+        with super().get_connection(*args, **kwargs) as conn:
+            conn.set_trace_callback(self._record)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    def _record(self, sql: str):
+
+        statement = ' '.join(sql.split())
+        if not statement.upper().startswith(_AUDITED_VERBS):
+            return
+
+        key = normalize(statement)
+        entry = self.statements.setdefault(key, {'sql': statement, 'calls': 0})
+        entry['calls'] += 1
+
+
+def normalize(sql: str) -> str:
+
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _IN_LIST.sub('IN (?)', sql)
+
+
+def explain(db_path: str, sql: str) -> List[str]:
+
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    finally:
+        conn.close()
+
+
+def check_plan(plan: List[str]) -> List[str]:
+
+    problems = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match:
+            problems.append(f"full scan of {match.group(2)}")
+        if 'USE TEMP B-TREE' in detail:
+            problems.append(detail.lower())
+    return problems
+
+
+def seed(db_path: str, users: int = 500, days: int = 30, per_user_per_day: int = 2):
+
+    rng = random.Random(42)
+    categories = ['electronics', 'groceries', 'travel', 'crypto_exchange', 'jewelry', 'fuel']
+    methods = ['credit_card', 'debit_card', 'upi', 'net_banking', 'wallet']
+    severities = ['MEDIUM', 'HIGH', 'CRITICAL']
+    rule_names = ['AMOUNT_THRESHOLD', 'VELOCITY', 'DAILY_LIMIT', 'HIGH_RISK_MERCHANT', 'RAPID_SUCCESSION']
+    now = datetime.now()
+
+    transactions = []
+    alerts = []
+    for user in range(users):
+        for _ in range(days * per_user_per_day):
+            txn_id = f"TXN_SEED_{len(transactions):08d}"
+            timestamp = (now - timedelta(seconds=rng.randint(0, days * 86400))).isoformat()
+            transactions.append((
+                txn_id, f"USER_{user:05d}", round(rng.lognormvariate(8, 1.5), 2),
+                f"MERCHANT_{rng.randint(0, 999):03d}", rng.choice(categories),
+                rng.choice(methods), timestamp
+            ))
+            if rng.random() < 0.1:
+                alerts.append((
+                    f"ALERT_SEED_{len(alerts):08d}", txn_id, rng.choice(rule_names),
+                    rng.choice(severities), 'seeded alert', timestamp,
+                    'OPEN' if rng.random() < 0.3 else 'FALSE_POSITIVE'
+                ))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            """INSERT INTO transactions (transaction_id, user_id, amount, merchant_id,
+               merchant_category, payment_method, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            transactions
+        )
+        conn.executemany(
+            """INSERT INTO alerts (alert_id, transaction_id, rule_name, severity,
+               details, timestamp, status) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            alerts
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_workload(db: TracingDatabase):
+
+    from flask import Flask
+    from api.routes import api, init_routes
+    from services.rule_engine import RuleEngine
+    from services.alert_manager import AlertManager
+    from services.transaction_service import TransactionService
+    from services.ingest import ingest
+    from services.snapshot import write_snapshot, restore_snapshot
+    from services.export import ExportJob, run_export
+    from analytics.archive import build_archive
+    from services.shadow import ShadowEvaluator
+
+    logging.getLogger('transaction_monitor').setLevel(logging.WARNING)
+
+    rule_engine = RuleEngine()
+    alert_manager = AlertManager(db)
+    transaction_service = TransactionService(db, rule_engine, alert_manager)
+    init_routes(transaction_service, alert_manager)
+
+    shadow = ShadowEvaluator(db, workers=1)
+    shadow.load(os.path.join(os.path.dirname(__file__), '..', 'rules', 'shadow_rules.example.json'))
+    rule_engine.shadow = shadow.start()
+
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    client = app.test_client()
+
+    today = datetime.now().date().isoformat()
+    payload = {
+        'user_id': 'USER_00001',
+        'amount': 650000,
+        'merchant_id': 'MERCHANT_001',
+        'merchant_category': 'crypto_exchange',
+        'payment_method': 'credit_card'
+    }
+
+    created = client.post('/api/transactions', json=payload).get_json()
+    client.post('/api/transactions', json=dict(payload, amount=1200), headers={'Idempotency-Key': 'audit-key'})
+    client.post('/api/transactions', json=dict(payload, amount=1200), headers={'Idempotency-Key': 'audit-key'})
+
+    client.get('/api/transactions')
+    client.get('/api/transactions?user_id=USER_00002')
+    client.get(f'/api/transactions?start_date={today}T00:00:00&end_date={today}T23:59:59')
+    client.get(f'/api/transactions?user_id=USER_00002&start_date={today}T00:00:00')
+    client.get(f"/api/transactions/{created['transaction_id']}")
+
+    client.get('/api/alerts')
+    client.get('/api/alerts?status=OPEN')
+    client.get('/api/alerts?severity=HIGH')
+    client.get('/api/alerts?status=OPEN&severity=HIGH')
+
+    alert_id = created['alerts'][0]['alert_id']
+    client.get(f'/api/alerts/{alert_id}')
+    client.put(f'/api/alerts/{alert_id}/resolve', json={
+        'resolution': 'FALSE_POSITIVE',
+        'reviewed_by': 'QUERY_AUDIT'
+    })
+
+    client.put('/api/alerts/resolve', json={
+        'resolution': 'FALSE_POSITIVE',
+        'reviewed_by': 'QUERY_AUDIT',
+        'alert_ids': [alert_id, 'ALERT_SEED_00000001', 'ALERT_MISSING']
+    })
+    client.put('/api/alerts/resolve', json={
+        'resolution': 'FALSE_POSITIVE',
+        'reviewed_by': 'QUERY_AUDIT',
+        'filter': {'rule_name': 'VELOCITY', 'severity': 'MEDIUM', 'start_time': f'{today}T00:00:00'}
+    })
+
+    claimed = client.post('/api/alerts/claim', json={'analyst': 'QUERY_AUDIT', 'limit': 5}).get_json()
+    claimed_ids = [alert['alert_id'] for alert in claimed['alerts']] or ['ALERT_MISSING']
+    client.post('/api/alerts/leases/renew', json={'analyst': 'QUERY_AUDIT', 'alert_ids': claimed_ids})
+    client.post('/api/alerts/leases/release', json={'analyst': 'QUERY_AUDIT', 'alert_ids': claimed_ids})
+
+    client.get('/api/reports/daily')
+    client.get(f'/api/reports/daily?date={today}')
+    client.get('/api/users/USER_00003/stats')
+
+    alert_manager.get_alert_statistics()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+        for i in range(3):
+            f.write(json.dumps(dict(payload, user_id=f"USER_{i:05d}", amount=1500)) + '\n')
+    try:
+        ingest(transaction_service, f.name, resume=True)
+    finally:
+        os.remove(f.name)
+
+    snapshot_path = os.path.join(os.path.dirname(db.db_path), 'audit.snapshot')
+    write_snapshot(transaction_service, snapshot_path)
+    restore_snapshot(TransactionService(db, RuleEngine(), alert_manager), snapshot_path)
+
+    export_range = {'start_date': f'{today}T00:00:00', 'end_date': f'{today}T23:59:59'}
+    for kind, filters in [
+        ('transactions', export_range),
+        ('transactions', dict(export_range, user_id='USER_00002')),
+        ('alerts', export_range)
+    ]:
+        export_path = os.path.join(os.path.dirname(db.db_path), f'audit_{kind}.csv.gz')
+        run_export(db, ExportJob(kind=kind, format='csv.gz', path=export_path, filters=filters))
+
+    build_archive(db, os.path.join(os.path.dirname(db.db_path), 'archive'), end_day=today)
+
+    shadow.stop()
+    client.get('/api/shadow')
+
+
+def audit(db_path: Optional[str] = None, verbose: bool = False, compact: bool = False) -> int:
+
+    workdir = tempfile.mkdtemp(prefix='query_audit_')
+    audit_path = os.path.join(workdir, 'audit.db')
+
+    try:
+        if db_path:
+            source = sqlite3.connect(db_path)
+            target = sqlite3.connect(audit_path)
+            source.backup(target)
+            source.close()
+            target.close()
+            db = TracingDatabase(audit_path)
+        else:
+            db = TracingDatabase(audit_path)
+            seed(audit_path)
+
+        if compact:
+            convert_to_compact(audit_path)
+
+        run_workload(db)
+
+        failures = 0
+        for key, entry in sorted(db.statements.items()):
+            plan = explain(audit_path, entry['sql'])
+            problems = [] if key in ALLOWED_SCANS else check_plan(plan)
+            failures += bool(problems)
+
+            status = 'FAIL' if problems else 'ok  '
+            print(f"[{status}] ({entry['calls']}x) {key}")
+            if problems or verbose:
+                for detail in plan:
+                    print(f"         {detail}")
+            for problem in problems:
+                print(f"         -> {problem}")
+
+        print(f"\n{len(db.statements)} statements audited, {failures} with full scans or temp B-trees")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Check query plans of every statement the API issues")
+    parser.add_argument('--db', help="audit against a copy of this database instead of seeded data")
+    parser.add_argument('--verbose', action='store_true', help="print the plan of every statement")
+    parser.add_argument('--compact', action='store_true', help="convert to the compact storage layout first")
+    args = parser.parse_args(argv)
+
+    return audit(args.db, args.verbose, args.compact)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,7 @@ Represents a security alert
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
-import uuid
+from utils.ids import new_id
 
 
 @dataclass
@@ -23,6 +23,8 @@ class Alert:
     resolved_at: Optional[str] = None
     resolved_by: Optional[str] = None
     resolution_notes: Optional[str] = None
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[str] = None
     
     def to_dict(self):
         """Convert alert to dictionary format"""
@@ -36,14 +38,16 @@ class Alert:
             'status': self.status,
             'resolved_at': self.resolved_at,
             'resolved_by': self.resolved_by,
-            'resolution_notes': self.resolution_notes
+            'resolution_notes': self.resolution_notes,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at
         }
     
     @classmethod
     def from_dict(cls, data: dict):
         """Create alert from dictionary"""
         return cls(
-            alert_id=data.get('alert_id', f"ALERT_{uuid.uuid4().hex[:12].upper()}"),
+            alert_id=data.get('alert_id') or new_id('ALERT'),
             transaction_id=data['transaction_id'],
             rule_name=data['rule_name'],
             severity=data['severity'],
@@ -52,14 +56,16 @@ class Alert:
             status=data.get('status', 'OPEN'),
             resolved_at=data.get('resolved_at'),
             resolved_by=data.get('resolved_by'),
-            resolution_notes=data.get('resolution_notes')
+            resolution_notes=data.get('resolution_notes'),
+            lease_owner=data.get('lease_owner'),
+            lease_expires_at=data.get('lease_expires_at')
         )
     
     @classmethod
     def create_from_rule_result(cls, transaction_id: str, rule_result: dict):
         """Create alert from rule evaluation result"""
         return cls(
-            alert_id=f"ALERT_{uuid.uuid4().hex[:12].upper()}",
+            alert_id=new_id('ALERT'),
             transaction_id=transaction_id,
             rule_name=rule_result['rule_name'],
             severity=rule_result['severity'],
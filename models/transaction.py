@@ -6,7 +6,7 @@ Represents a financial transaction
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
-import uuid
+from utils.ids import new_id
 
 
 @dataclass
@@ -43,7 +43,7 @@ class Transaction:
     def from_dict(cls, data: dict):
         """Create transaction from dictionary"""
         return cls(
-            transaction_id=data.get('transaction_id', f"TXN_{uuid.uuid4().hex[:12].upper()}"),
+            transaction_id=data.get('transaction_id') or new_id('TXN'),
             user_id=data['user_id'],
             amount=float(data['amount']),
             merchant_id=data['merchant_id'],
@@ -0,0 +1,53 @@
+
+from rules.base_rule import BaseRule
+from typing import Optional, Dict
+import math
+import config
+
+
+class AmountAnomalyRule(BaseRule):
+
+    # Scores each amount against the user's own running baseline (Welford mean/variance
+    # and an EWMA of log-amounts), so state is O(1) per user and history is never scanned
+    def __init__(self):
+        super().__init__("AMOUNT_ANOMALY")
+        self.method = config.AMOUNT_ANOMALY_METHOD
+        self.min_history = config.AMOUNT_ANOMALY_MIN_HISTORY
+        self.z_threshold = config.AMOUNT_ANOMALY_Z_THRESHOLD
+        self.z_critical = config.AMOUNT_ANOMALY_Z_CRITICAL
+        self.min_std = config.AMOUNT_ANOMALY_MIN_STD
+        self.alpha = config.AMOUNT_ANOMALY_EWMA_ALPHA
+    
+    def evaluate(self, transaction, db) -> Optional[Dict]:
+
+        stats = db.get_user_amount_stats(transaction.user_id)
+        
+        if not stats or stats['count'] < self.min_history:
+            return None
+        
+
+        if self.method == 'ewma':
+            baseline, variance = stats['ewma'], stats['ewm_var']
+        else:
+            baseline, variance = stats['mean'], stats['m2'] / (stats['count'] - 1)
+        
+        # A user who always pays the same amount would otherwise flag on any change
+        std = max(math.sqrt(max(variance, 0.0)), self.min_std)
+        z_score = (math.log1p(transaction.amount) - baseline) / std
+        
+        if z_score < self.z_threshold:
+            return None
+        
+
+        typical = math.expm1(baseline)
+        return {
+            'triggered': True,
+            'rule_name': self.name,
+            'severity': 'CRITICAL' if z_score >= self.z_critical else 'HIGH',
+            'details': f'Amount ₹{transaction.amount:,.0f} is {z_score:.1f} standard deviations above '
+                       f'this user\'s typical ₹{typical:,.0f} ({stats["count"]} prior transactions)'
+        }
+    
+    def observe(self, transaction, db):
+
+        db.update_user_amount_stats(transaction.user_id, math.log1p(transaction.amount), self.alpha)
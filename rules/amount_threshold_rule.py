@@ -6,6 +6,8 @@ import config
 
 class AmountThresholdRule(BaseRule):
     
+    reads_database = False
+    
     def __init__(self):
         super().__init__("AMOUNT_THRESHOLD")
         self.medium_threshold = config.AMOUNT_THRESHOLD_MEDIUM
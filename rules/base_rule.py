@@ -5,6 +5,8 @@ from typing import Optional, Dict
 
 class BaseRule(ABC):
 
+    # Rules that never query the database set this to False and are exempt from time budgets
+    reads_database = True
     
     def __init__(self, name: str):
 
@@ -16,6 +18,25 @@ class BaseRule(ABC):
 
         pass
     
+    def observe(self, transaction, db):
+
+        # Called after every rule has evaluated, so stateful rules learn from the transaction
+        pass
+    
+    def dump_state(self) -> Optional[bytes]:
+
+        # Rules with in-memory state return it here so a snapshot can restore it after a restart
+        return None
+    
+    def load_state(self, data: memoryview):
+
+        pass
+    
+    def replay(self, transaction):
+
+        # Catches restored state up with a transaction stored after the snapshot; may repeat one
+        pass
+    
     def is_enabled(self) -> bool:
 
         return self.enabled
@@ -0,0 +1,65 @@
+from typing import List, Dict, Optional
+from datetime import timedelta
+
+
+class EvaluationContext:
+
+    def __init__(self, transaction, db, prefetch_seconds: int = 0):
+
+        self.transaction = transaction
+        self.db = db
+        self.prefetch_seconds = prefetch_seconds
+        self._end_time = transaction.get_timestamp_obj().isoformat()
+        self._start_time = None
+        self._window_rows = []
+        self._features = {}
+
+    def __getattr__(self, name):
+
+        # Anything the context does not memoize goes straight to the database
+        if name == 'db':
+            raise AttributeError(name)
+        return getattr(self.db, name)
+
+    def get_user_transactions_in_window(self, user_id: str, start_time: str, end_time: str = None) -> List[Dict]:
+
+        if user_id != self.transaction.user_id or end_time != self._end_time:
+            return self.db.get_user_transactions_in_window(user_id, start_time, end_time)
+
+        if self._start_time is None or start_time < self._start_time:
+            fetch_start = start_time
+            if self.prefetch_seconds:
+                prefetch_start = (
+                    self.transaction.get_timestamp_obj() - timedelta(seconds=self.prefetch_seconds)
+                ).isoformat()
+                fetch_start = min(start_time, prefetch_start)
+
+            self._window_rows = self.db.get_user_transactions_in_window(user_id, fetch_start, end_time)
+            self._start_time = fetch_start
+
+        if start_time == self._start_time:
+            return list(self._window_rows)
+        return [row for row in self._window_rows if row['timestamp'] >= start_time]
+
+    def fork(self) -> 'EvaluationContext':
+
+        # Same fetched window rows, but its own feature cache, for rules compiled from another file
+        context = EvaluationContext(self.transaction, self.db, self.prefetch_seconds)
+        context._start_time = self._start_time
+        context._window_rows = self._window_rows
+        return context
+
+    def window_transactions(self, seconds: int) -> List[Dict]:
+
+        start_time = (self.transaction.get_timestamp_obj() - timedelta(seconds=seconds)).isoformat()
+        return self.get_user_transactions_in_window(
+            self.transaction.user_id,
+            start_time,
+            self._end_time
+        )
+
+    def feature(self, name: str, extractor) -> Optional[float]:
+
+        if name not in self._features:
+            self._features[name] = extractor(self)
+        return self._features[name]
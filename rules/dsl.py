@@ -0,0 +1,288 @@
+"""
+Declarative rule definitions
+Compiles JSON/YAML rule specs into closures evaluated by the rule engine
+"""
+
+from dataclasses import fields
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import operator
+import json
+import os
+
+from rules.base_rule import BaseRule
+from rules.context import EvaluationContext
+from models.transaction import Transaction
+import config
+
+
+SEVERITIES = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+
+TRANSACTION_FIELDS = {f.name for f in fields(Transaction)}
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda left, right: left in right,
+    'not_in': lambda left, right: left not in right,
+}
+
+
+class RuleDefinitionError(ValueError):
+    """Raised when a rule definition cannot be compiled"""
+
+
+class DeclarativeRule(BaseRule):
+    """A rule compiled from a declarative definition"""
+
+    def __init__(self, name: str, tiers: List[Tuple[str, Callable, Callable]],
+                 enabled: bool = True, window_seconds: int = 0):
+
+        super().__init__(name)
+        self.tiers = tiers
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+
+    def evaluate(self, transaction, db) -> Optional[Dict]:
+
+        context = db if isinstance(db, EvaluationContext) else EvaluationContext(transaction, db)
+
+        for severity, matches, render in self.tiers:
+            if matches(transaction, context):
+                return {
+                    'triggered': True,
+                    'rule_name': self.name,
+                    'severity': severity,
+                    'details': render(transaction, context)
+                }
+
+        return None
+
+
+def load_rule_file(path: str) -> List[DeclarativeRule]:
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise RuleDefinitionError("PyYAML is required to load YAML rule definitions")
+        definition = yaml.safe_load(text)
+    else:
+        definition = json.loads(text)
+
+    return compile_rules(definition or {})
+
+
+def compile_rules(definition: Dict) -> List[DeclarativeRule]:
+
+    feature_specs = definition.get('features') or {}
+    extractors = {name: _compile_feature(name, spec) for name, spec in feature_specs.items()}
+    window_seconds = max((spec['window'] for spec in feature_specs.values()), default=0)
+
+    compiled = []
+    seen = set()
+    for spec in definition.get('rules') or []:
+        rule = _compile_rule(spec, extractors)
+        if rule.name in seen:
+            raise RuleDefinitionError(f"Duplicate rule name: {rule.name}")
+        seen.add(rule.name)
+        rule.window_seconds = window_seconds
+        # Without window features a rule only looks at the transaction itself
+        rule.reads_database = window_seconds > 0
+        compiled.append(rule)
+
+    return compiled
+
+
+def _compile_feature(name: str, spec: Dict) -> Callable:
+
+    aggregate = spec.get('aggregate')
+    window = spec.get('window')
+
+    if not isinstance(window, int) or window <= 0:
+        raise RuleDefinitionError(f"Feature {name}: window must be a positive number of seconds")
+
+    if aggregate == 'count':
+        compute = len
+    elif aggregate == 'sum':
+        compute = lambda rows: sum(row['amount'] for row in rows)
+    elif aggregate == 'max':
+        compute = lambda rows: max((row['amount'] for row in rows), default=0)
+    elif aggregate == 'avg':
+        compute = lambda rows: sum(row['amount'] for row in rows) / len(rows) if rows else 0
+    elif aggregate == 'distinct':
+        field = spec.get('field')
+        if field not in TRANSACTION_FIELDS:
+            raise RuleDefinitionError(f"Feature {name}: unknown field {field!r}")
+        compute = lambda rows: len({row[field] for row in rows})
+    else:
+        raise RuleDefinitionError(f"Feature {name}: unknown aggregate {aggregate!r}")
+
+    def extract(context):
+        return compute(context.window_transactions(window))
+
+    return extract
+
+
+def _compile_rule(spec: Dict, extractors: Dict[str, Callable]) -> DeclarativeRule:
+
+    name = spec.get('name')
+    if not name or not isinstance(name, str):
+        raise RuleDefinitionError("Every rule needs a name")
+
+    tiers = []
+    for tier in spec.get('tiers') or []:
+        severity = tier.get('severity')
+        if severity not in SEVERITIES:
+            raise RuleDefinitionError(f"Rule {name}: severity must be one of {', '.join(SEVERITIES)}")
+
+        matches = _compile_tier(name, tier, extractors)
+        if matches is None:
+            # Folded to a condition that can never hold
+            continue
+
+        render = _compile_message(name, tier.get('message') or f"{name} triggered", extractors)
+        tiers.append((severity, matches, render))
+
+    return DeclarativeRule(name, tiers, enabled=bool(spec.get('enabled', True)) and bool(tiers))
+
+
+def _compile_tier(rule_name: str, tier: Dict, extractors: Dict[str, Callable]) -> Optional[Callable]:
+
+    all_conditions = _dedupe([_compile_condition(rule_name, c, extractors) for c in tier.get('all') or []])
+    any_conditions = _dedupe([_compile_condition(rule_name, c, extractors) for c in tier.get('any') or []])
+
+    if not all_conditions and not any_conditions:
+        raise RuleDefinitionError(f"Rule {rule_name}: every tier needs 'all' or 'any' conditions")
+
+    if any(check is None for _, _, check in all_conditions):
+        return None
+
+    any_conditions = [c for c in any_conditions if c[2] is not None]
+    if tier.get('any') and not any_conditions:
+        return None
+
+    # Cheap field checks run before windowed features so most transactions short-circuit
+    all_checks = [check for _, _, check in sorted(all_conditions, key=lambda c: c[0])]
+    any_checks = [check for _, _, check in sorted(any_conditions, key=lambda c: c[0])]
+
+    if not any_checks:
+        if len(all_checks) == 1:
+            return all_checks[0]
+        return lambda txn, ctx: all(check(txn, ctx) for check in all_checks)
+
+    if not all_checks:
+        return lambda txn, ctx: any(check(txn, ctx) for check in any_checks)
+
+    return lambda txn, ctx: (
+        all(check(txn, ctx) for check in all_checks)
+        and any(check(txn, ctx) for check in any_checks)
+    )
+
+
+def _compile_condition(rule_name: str, condition: Dict, extractors: Dict[str, Callable]):
+
+    op_name = condition.get('op')
+    if op_name not in OPERATORS:
+        raise RuleDefinitionError(f"Rule {rule_name}: unknown operator {op_name!r}")
+
+    value = _fold_value(rule_name, condition.get('value'))
+    compare = OPERATORS[op_name]
+
+    if op_name in ('in', 'not_in'):
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            raise RuleDefinitionError(f"Rule {rule_name}: '{op_name}' needs a list value")
+        value = frozenset(v.lower() if isinstance(v, str) else v for v in value)
+        if op_name == 'in' and not value:
+            return (0, None, None)
+        case_fold = any(isinstance(v, str) for v in value)
+    else:
+        case_fold = isinstance(value, str)
+        if case_fold:
+            value = value.lower()
+
+    if 'field' in condition:
+        field = condition['field']
+        if field not in TRANSACTION_FIELDS:
+            raise RuleDefinitionError(f"Rule {rule_name}: unknown field {field!r}")
+
+        getter = operator.attrgetter(field)
+        if case_fold:
+            check = lambda txn, ctx: compare(str(getter(txn)).lower(), value)
+        else:
+            check = lambda txn, ctx: compare(getter(txn), value)
+        return (0, (field, op_name, _hashable(value)), check)
+
+    if 'feature' in condition:
+        feature = condition['feature']
+        if feature not in extractors:
+            raise RuleDefinitionError(f"Rule {rule_name}: unknown feature {feature!r}")
+
+        extract = extractors[feature]
+        check = lambda txn, ctx: compare(ctx.feature(feature, extract), value)
+        return (1, ('feature:' + feature, op_name, _hashable(value)), check)
+
+    raise RuleDefinitionError(f"Rule {rule_name}: condition needs a 'field' or 'feature'")
+
+
+def _fold_value(rule_name: str, value: Any) -> Any:
+
+    # {"config": "AMOUNT_THRESHOLD_HIGH", "multiply": 0.8} is resolved once, at load time
+    if isinstance(value, dict):
+        name = value.get('config')
+        if not name or not hasattr(config, name):
+            raise RuleDefinitionError(f"Rule {rule_name}: unknown config value {name!r}")
+
+        resolved = getattr(config, name)
+        if 'multiply' in value:
+            resolved = resolved * value['multiply']
+        if 'add' in value:
+            resolved = resolved + value['add']
+        return resolved
+
+    return value
+
+
+def _compile_message(rule_name: str, template: str, extractors: Dict[str, Callable]) -> Callable:
+
+    names = {name.split('.')[0].split('[')[0] for _, name, _, _ in Formatter().parse(template) if name}
+
+    unknown = names - TRANSACTION_FIELDS - set(extractors)
+    if unknown:
+        raise RuleDefinitionError(f"Rule {rule_name}: unknown placeholder(s) {', '.join(sorted(unknown))}")
+
+    if not names:
+        return lambda txn, ctx: template
+
+    field_names = names & TRANSACTION_FIELDS
+    feature_names = names - field_names
+
+    def render(txn, ctx):
+        values = {name: getattr(txn, name) for name in field_names}
+        for name in feature_names:
+            values[name] = ctx.feature(name, extractors[name])
+        return template.format_map(values)
+
+    return render
+
+
+def _dedupe(conditions: List[Tuple]) -> List[Tuple]:
+
+    unique = {}
+    for condition in conditions:
+        unique.setdefault(condition[1], condition)
+    return list(unique.values())
+
+
+def _hashable(value: Any) -> Any:
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(value, key=repr))
+    return value
@@ -6,6 +6,8 @@ import config
 
 class HighRiskMerchantRule(BaseRule):
 
+    reads_database = False
+
     def __init__(self):
         super().__init__("HIGH_RISK_MERCHANT")
         self.high_risk_categories = config.HIGH_RISK_MERCHANTS
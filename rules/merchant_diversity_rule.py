@@ -0,0 +1,197 @@
+
+from rules.base_rule import BaseRule
+from utils.cache import LRUCache
+from utils.sketches import HyperLogLog, merge_registers
+from utils.packing import Packer, Unpacker
+from typing import Optional, Dict, List
+from datetime import datetime, timedelta
+import math
+import sys
+import threading
+import config
+
+
+class MerchantDiversityRule(BaseRule):
+
+    # Distinct merchants and categories per user in a sliding window. Each user
+    # keeps one pair of HyperLogLog registers per time bucket; the window's
+    # estimate is the register-wise max over its live buckets
+    def __init__(self):
+        super().__init__("MERCHANT_DIVERSITY")
+        self.enabled = config.MERCHANT_DIVERSITY_ENABLED
+        self.window_seconds = config.MERCHANT_DIVERSITY_WINDOW
+        self.bucket_seconds = config.MERCHANT_DIVERSITY_BUCKET_SECONDS
+        self.precision = config.MERCHANT_DIVERSITY_PRECISION
+        self.merchants_medium = config.MERCHANT_DIVERSITY_MERCHANTS_MEDIUM
+        self.merchants_high = config.MERCHANT_DIVERSITY_MERCHANTS_HIGH
+        self.categories_medium = config.MERCHANT_DIVERSITY_CATEGORIES_MEDIUM
+        # user_id -> {bucket: (merchant registers, category registers)}
+        self.user_state = LRUCache(
+            max_entries=config.MERCHANT_DIVERSITY_MAX_USERS,
+            max_bytes=config.MERCHANT_DIVERSITY_MAX_BYTES
+        )
+        self._lock = threading.Lock()
+    
+    def _bucket(self, ts: float) -> int:
+
+        return int(ts // self.bucket_seconds)
+    
+    def _span(self) -> int:
+
+        return math.ceil(self.window_seconds / self.bucket_seconds)
+    
+    def _new_bucket(self):
+
+        size = 1 << self.precision
+        return bytearray(size), bytearray(size)
+    
+    def _add(self, buckets: Dict, merchant_id: str, merchant_category: str, ts: float):
+
+        bucket = self._bucket(ts)
+        pair = buckets.get(bucket)
+        if pair is None:
+            pair = buckets[bucket] = self._new_bucket()
+        HyperLogLog(self.precision, pair[0]).add(merchant_id)
+        HyperLogLog(self.precision, pair[1]).add(merchant_category)
+    
+    def _rebuild(self, transaction, db) -> Dict:
+
+        # Evicted or never seen (e.g. after a restart): replay the window from the
+        # database. The evaluation context has usually prefetched these rows already
+        if hasattr(db, 'window_transactions'):
+            rows = db.window_transactions(self.window_seconds)
+        else:
+            current_time = transaction.get_timestamp_obj()
+            rows = db.get_user_transactions_in_window(
+                transaction.user_id,
+                (current_time - timedelta(seconds=self.window_seconds)).isoformat(),
+                current_time.isoformat()
+            )
+        
+        buckets = {}
+        for row in rows:
+            ts = datetime.fromisoformat(row['timestamp']).timestamp()
+            self._add(buckets, row['merchant_id'], row['merchant_category'], ts)
+        return buckets
+    
+    def _state(self, transaction, db) -> Dict:
+
+        with self._lock:
+            buckets = self.user_state.get(transaction.user_id)
+        if buckets is not None:
+            return buckets
+        
+        # Replayed without the lock so a slow read never stalls other users' evaluations
+        rebuilt = self._rebuild(transaction, db)
+        with self._lock:
+            # Another thread may have rebuilt or observed this user meanwhile; keep its copy
+            buckets = self.user_state.get(transaction.user_id)
+            if buckets is None:
+                buckets = rebuilt
+                self.user_state.put(transaction.user_id, buckets, self._size(buckets))
+        return buckets
+    
+    def _size(self, buckets: Dict) -> int:
+
+        return sys.getsizeof(buckets) + len(buckets) * (2 << self.precision)
+    
+    def _live_registers(self, buckets: Dict, ts: float, index: int) -> List[bytearray]:
+
+        current = self._bucket(ts)
+        return [pair[index] for b, pair in buckets.items() if current - self._span() < b <= current]
+    
+    def _estimate(self, buckets: Dict, ts: float, index: int, key: str) -> int:
+
+        merged = merge_registers(self._live_registers(buckets, ts, index)) or bytearray(1 << self.precision)
+        sketch = HyperLogLog(self.precision, merged)
+        # Adding is idempotent, so the current transaction counts once whether or not it was observed
+        sketch.add(key)
+        return sketch.count()
+    
+    def evaluate(self, transaction, db) -> Optional[Dict]:
+
+        ts = transaction.get_timestamp_obj().timestamp()
+        buckets = self._state(transaction, db)
+        with self._lock:
+            merchants = self._estimate(buckets, ts, 0, transaction.merchant_id)
+            categories = self._estimate(buckets, ts, 1, transaction.merchant_category)
+        
+
+        if merchants >= self.merchants_high:
+            severity = 'HIGH'
+        elif merchants >= self.merchants_medium or categories >= self.categories_medium:
+            severity = 'MEDIUM'
+        else:
+            return None
+        
+        return {
+            'triggered': True,
+            'rule_name': self.name,
+            'severity': severity,
+            'details': f'User paid about {merchants} distinct merchants across {categories} categories '
+                       f'in the last {self.window_seconds // 3600} hours (limit: {self.merchants_medium} merchants, '
+                       f'{self.categories_medium} categories)'
+        }
+    
+    def observe(self, transaction, db):
+
+        ts = transaction.get_timestamp_obj().timestamp()
+        buckets = self._state(transaction, db)
+        with self._lock:
+            self._add(buckets, transaction.merchant_id, transaction.merchant_category, ts)
+            
+            current = self._bucket(ts)
+            for old in [b for b in buckets if b <= current - self._span()]:
+                del buckets[old]
+            self.user_state.put(transaction.user_id, buckets, self._size(buckets))
+    
+    def _params(self) -> str:
+
+        return f"{self.window_seconds}/{self.bucket_seconds}/{self.precision}"
+    
+    def dump_state(self) -> Optional[bytes]:
+
+        packer = Packer()
+        packer.str(self._params())
+        entries = self.user_state.items()
+        packer.u32(len(entries))
+        with self._lock:
+            for user_id, buckets in entries:
+                packer.str(user_id)
+                packer.u32(len(buckets))
+                for bucket, (merchants, categories) in buckets.items():
+                    packer.i64(bucket)
+                    packer.blob(bytes(merchants) + bytes(categories))
+        return packer.getvalue()
+    
+    def load_state(self, data: memoryview):
+
+        unpacker = Unpacker(data)
+        if unpacker.str() != self._params():
+            raise ValueError("Snapshot was taken with different register settings")
+        
+        size = 1 << self.precision
+        with self._lock:
+            self.user_state.clear()
+            # Entries were dumped least recently used first, so recency survives the reload
+            for _ in range(unpacker.u32()):
+                user_id = unpacker.str()
+                buckets = {}
+                for _ in range(unpacker.u32()):
+                    bucket = unpacker.i64()
+                    registers = unpacker.blob()
+                    buckets[bucket] = bytearray(registers[:size]), bytearray(registers[size:])
+                self.user_state.put(user_id, buckets, self._size(buckets))
+    
+    def replay(self, transaction):
+
+        ts = transaction.get_timestamp_obj().timestamp()
+        with self._lock:
+            buckets = self.user_state.get(transaction.user_id)
+            # Users without restored state rebuild from their window on their next transaction
+            if buckets is not None:
+                self._add(buckets, transaction.merchant_id, transaction.merchant_category, ts)
+    
+    def stats(self) -> Dict:
+
+        return self.user_state.stats()
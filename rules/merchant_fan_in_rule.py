@@ -0,0 +1,106 @@
+
+from rules.base_rule import BaseRule
+from utils.sketches import WindowedCountMin
+from utils.packing import Packer, Unpacker
+from typing import Optional, Dict
+import config
+
+
+class MerchantFanInRule(BaseRule):
+
+    # Distinct users per merchant in a sliding window, from count-min sketches:
+    # a (merchant, user) pair sketch detects a user's first visit in the window,
+    # and only first visits increment the merchant's counter
+    reads_database = False
+    
+    def __init__(self):
+        super().__init__("MERCHANT_FAN_IN")
+        self.window_seconds = config.MERCHANT_FANIN_WINDOW
+        self.medium_threshold = config.MERCHANT_FANIN_MEDIUM
+        self.high_threshold = config.MERCHANT_FANIN_HIGH
+        self.merchant_users = self._new_counter()
+        self.merchant_user_pairs = self._new_counter()
+    
+    def _new_counter(self) -> WindowedCountMin:
+
+        return WindowedCountMin(
+            window_seconds=config.MERCHANT_FANIN_WINDOW,
+            bucket_seconds=config.MERCHANT_FANIN_BUCKET_SECONDS,
+            epsilon=config.MERCHANT_FANIN_EPSILON,
+            delta=config.MERCHANT_FANIN_DELTA
+        )
+    
+    def _pair_key(self, transaction) -> str:
+
+        return f"{transaction.merchant_id}\x1f{transaction.user_id}"
+    
+    def evaluate(self, transaction, db) -> Optional[Dict]:
+
+        ts = transaction.get_timestamp_obj().timestamp()
+        
+        distinct_users = self.merchant_users.estimate(transaction.merchant_id, ts)
+        if self.merchant_user_pairs.estimate(self._pair_key(transaction), ts) == 0:
+            distinct_users += 1
+        
+
+        if distinct_users >= self.high_threshold:
+            severity = 'HIGH'
+        elif distinct_users >= self.medium_threshold:
+            severity = 'MEDIUM'
+        else:
+            return None
+        
+        return {
+            'triggered': True,
+            'rule_name': self.name,
+            'severity': severity,
+            'details': f'About {distinct_users} distinct users paid merchant {transaction.merchant_id} '
+                       f'in the last {self.window_seconds // 60} minutes (limit: {self.medium_threshold})'
+        }
+    
+    def observe(self, transaction, db):
+
+        ts = transaction.get_timestamp_obj().timestamp()
+        pair_key = self._pair_key(transaction)
+        
+        # A sketch never underestimates, so 0 means this user is certainly new in the window
+        if self.merchant_user_pairs.estimate(pair_key, ts) == 0:
+            self.merchant_users.add(transaction.merchant_id, ts)
+        self.merchant_user_pairs.add(pair_key, ts)
+    
+    def _params(self) -> str:
+
+        return (f"{config.MERCHANT_FANIN_WINDOW}/{config.MERCHANT_FANIN_BUCKET_SECONDS}/"
+                f"{config.MERCHANT_FANIN_EPSILON}/{config.MERCHANT_FANIN_DELTA}")
+    
+    def dump_state(self) -> Optional[bytes]:
+
+        packer = Packer()
+        packer.str(self._params())
+        self.merchant_users.dump(packer)
+        self.merchant_user_pairs.dump(packer)
+        return packer.getvalue()
+    
+    def load_state(self, data: memoryview):
+
+        unpacker = Unpacker(data)
+        if unpacker.str() != self._params():
+            raise ValueError("Snapshot was taken with different sketch settings")
+        
+        merchant_users = self._new_counter()
+        merchant_users.load(unpacker)
+        merchant_user_pairs = self._new_counter()
+        merchant_user_pairs.load(unpacker)
+        self.merchant_users, self.merchant_user_pairs = merchant_users, merchant_user_pairs
+    
+    def replay(self, transaction):
+
+        # observe() only counts a pair once per window, so replaying a transaction twice is harmless
+        self.observe(transaction, None)
+    
+    def stats(self) -> Dict:
+
+        return {
+            'merchant_users': self.merchant_users.stats(),
+            'merchant_user_pairs': self.merchant_user_pairs.stats()
+        }
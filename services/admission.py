@@ -0,0 +1,110 @@
+"""
+Admission control
+Bounds how many transactions are scored at once. A request over the limit
+waits in a short queue for its lane; freed slots go to the highest lane
+first, and to the oldest waiter within a lane. A request that finds its
+lane's queue full, or waits past its lane's deadline, is rejected at once,
+so the client backs off instead of timing out behind everyone else.
+
+Lanes, in admission order:
+    priority   amounts from ADMISSION_PRIORITY_AMOUNT up, and high-risk merchant categories
+    standard   everything else; a smaller queue and a shorter deadline, so
+               low-risk traffic is shed first under a burst
+"""
+
+from collections import deque
+from typing import Dict, Optional, Tuple
+import threading
+
+import config
+
+
+LANES = ('priority', 'standard')
+
+
+def classify(data: Dict) -> str:
+
+    if float(data['amount']) >= config.ADMISSION_PRIORITY_AMOUNT:
+        return 'priority'
+    if data.get('merchant_category') in config.HIGH_RISK_MERCHANTS:
+        return 'priority'
+    return 'standard'
+
+
+class _Waiter:
+
+    __slots__ = ('event', 'admitted')
+
+    def __init__(self):
+
+        self.event = threading.Event()
+        self.admitted = False
+
+
+class AdmissionController:
+    """In-flight limit with a bounded, deadline-limited queue per lane"""
+
+    def __init__(self, max_in_flight: int = None, queue_sizes: Dict[str, int] = None,
+                 queue_timeouts_ms: Dict[str, float] = None):
+
+        self.max_in_flight = max_in_flight or config.ADMISSION_MAX_IN_FLIGHT
+        self.queue_sizes = queue_sizes or config.ADMISSION_QUEUE_SIZE
+        self.queue_timeouts_ms = queue_timeouts_ms or config.ADMISSION_QUEUE_TIMEOUT_MS
+        self.in_flight = 0
+        self.admitted = {lane: 0 for lane in LANES}
+        self.rejected = {lane: {'queue_full': 0, 'timeout': 0} for lane in LANES}
+        self._queues = {lane: deque() for lane in LANES}
+        self._lock = threading.Lock()
+
+    def acquire(self, lane: str) -> Tuple[bool, Optional[str]]:
+
+        with self._lock:
+            # Waiters only exist while every slot is taken, so a free slot never jumps the queue
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                self.admitted[lane] += 1
+                return True, None
+
+            queue = self._queues[lane]
+            if len(queue) >= self.queue_sizes[lane]:
+                self.rejected[lane]['queue_full'] += 1
+                return False, 'queue_full'
+
+            waiter = _Waiter()
+            queue.append(waiter)
+
+        waiter.event.wait(self.queue_timeouts_ms[lane] / 1000)
+
+        with self._lock:
+            # Checked under the lock: a slot handed over just as the wait timed out is still taken
+            if waiter.admitted:
+                self.admitted[lane] += 1
+                return True, None
+
+            queue.remove(waiter)
+            self.rejected[lane]['timeout'] += 1
+            return False, 'timeout'
+
+    def release(self):
+
+        with self._lock:
+            # The slot passes straight to the next waiter, so in_flight only drops when nobody waits
+            for lane in LANES:
+                queue = self._queues[lane]
+                if queue:
+                    waiter = queue.popleft()
+                    waiter.admitted = True
+                    waiter.event.set()
+                    return
+            self.in_flight -= 1
+
+    def stats(self) -> Dict:
+
+        with self._lock:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self.in_flight,
+                'queued': {lane: len(queue) for lane, queue in self._queues.items()},
+                'admitted': dict(self.admitted),
+                'rejected': {lane: dict(counts) for lane, counts in self.rejected.items()}
+            }
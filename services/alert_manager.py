@@ -2,7 +2,8 @@
 from typing import List, Optional
 from models.alert import Alert
 from datetime import datetime
-import uuid
+from utils.ids import new_id
+import config
 
 
 class AlertManager:
@@ -14,7 +15,7 @@ class AlertManager:
     def create_alert(self, transaction, rule_result: dict) -> Alert:
 
         alert = Alert(
-            alert_id=f"ALERT_{uuid.uuid4().hex[:12].upper()}",
+            alert_id=new_id('ALERT'),
             transaction_id=transaction.transaction_id,
             rule_name=rule_result['rule_name'],
             severity=rule_result['severity'],
@@ -39,13 +40,10 @@ class AlertManager:
     
     def get_alert_by_id(self, alert_id: str) -> Optional[Alert]:
 
-        results = self.db.execute_query(
-            "SELECT * FROM alerts WHERE alert_id = ?",
-            (alert_id,)
-        )
+        result = self.db.get_alert(alert_id)
         
-        if results:
-            return Alert.from_dict(results[0])
+        if result:
+            return Alert.from_dict(result)
         return None
     
     def resolve_alert(self, alert_id: str, resolution: str, 
@@ -62,30 +60,96 @@ class AlertManager:
             return self.get_alert_by_id(alert_id)
         return None
     
-    def get_alert_statistics(self) -> dict:
+    def resolve_alerts(self, resolution: str, reviewed_by: str, notes: str = None,
+                       alert_ids: List[str] = None, filters: dict = None) -> dict:
 
-        all_alerts = self.db.execute_query("SELECT * FROM alerts")
+        updated, not_found = self.db.bulk_update_alert_status(
+            status=resolution,
+            resolved_by=reviewed_by,
+            notes=notes,
+            alert_ids=alert_ids,
+            filters=filters
+        )
         
+        return {
+            'resolution': resolution,
+            'requested': len(set(alert_ids)) if alert_ids is not None else None,
+            'resolved': updated,
+            'not_found': not_found
+        }
+    
+    def claim_alerts(self, analyst: str, limit: int, lease_seconds: int = None,
+                     severities: List[str] = None) -> List[Alert]:
+
+        # Severities outside the priority list are still claimable, after the listed ones
+        if severities is None:
+            severities = config.ALERT_SEVERITY_PRIORITY
+        else:
+            severities = sorted(
+                set(severities),
+                key=lambda s: config.ALERT_SEVERITY_PRIORITY.index(s)
+                if s in config.ALERT_SEVERITY_PRIORITY else len(config.ALERT_SEVERITY_PRIORITY)
+            )
+        
+        rows = self.db.claim_alerts(
+            owner=analyst,
+            limit=limit,
+            lease_seconds=lease_seconds or config.ALERT_LEASE_SECONDS,
+            severities=severities
+        )
+        return [Alert.from_dict(row) for row in rows]
+    
+    def renew_leases(self, analyst: str, alert_ids: List[str], lease_seconds: int = None) -> dict:
+
+        renewed = self.db.renew_alert_leases(analyst, alert_ids, lease_seconds or config.ALERT_LEASE_SECONDS)
+        held = set(renewed)
+        return {
+            'renewed': renewed,
+            'not_held': [alert_id for alert_id in dict.fromkeys(alert_ids) if alert_id not in held]
+        }
+    
+    def release_leases(self, analyst: str, alert_ids: List[str]) -> dict:
+
+        released = self.db.release_alert_leases(analyst, alert_ids)
+        held = set(released)
+        return {
+            'released': released,
+            'not_held': [alert_id for alert_id in dict.fromkeys(alert_ids) if alert_id not in held]
+        }
+    
+    def get_alert_statistics(self) -> dict:
+
         stats = {
-            'total_alerts': len(all_alerts),
+            'total_alerts': 0,
             'by_status': {},
             'by_severity': {},
             'by_rule': {}
         }
         
-        # Count by status
-        for alert in all_alerts:
-            status = alert['status']
-            stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
+        # One grouped query per dimension; each is answered from an index, not the table
+        for column, key in (('status', 'by_status'), ('severity', 'by_severity'), ('rule_name', 'by_rule')):
+            rows = self.db.execute_query(
+                f"SELECT {column} AS value, COUNT(*) AS count FROM alerts GROUP BY {column}"
+            )
+            stats[key] = {row['value']: row['count'] for row in rows}
+        
+        stats['total_alerts'] = sum(stats['by_status'].values())
         
-        # Count by severity
-        for alert in all_alerts:
-            severity = alert['severity']
-            stats['by_severity'][severity] = stats['by_severity'].get(severity, 0) + 1
+        return stats
+    
+    def get_alert_counts(self, start_time: str, end_time: str) -> dict:
+
+        # One row per rule and severity, counted from idx_alerts_rule_severity_time
+        rows = self.db.count_by_rule_and_severity('alerts', start_time, end_time)
+        
+        counts = {
+            'total_alerts': sum(row['n'] for row in rows),
+            'by_severity': {},
+            'by_rule': {}
+        }
         
-        # Count by rule
-        for alert in all_alerts:
-            rule = alert['rule_name']
-            stats['by_rule'][rule] = stats['by_rule'].get(rule, 0) + 1
+        for row in rows:
+            counts['by_severity'][row['severity']] = counts['by_severity'].get(row['severity'], 0) + row['n']
+            counts['by_rule'][row['rule_name']] = counts['by_rule'].get(row['rule_name'], 0) + row['n']
         
-        return stats
\ No newline at end of file
+        return counts
@@ -0,0 +1,371 @@
+"""
+Bulk export
+Writes transactions or alerts to a compressed file in fixed-size chunks, so
+memory stays flat however many rows match. Each chunk is its own short read,
+resuming after the last timestamp written, so a long export never holds a
+read transaction open and blocks WAL checkpoints. Parquet (zstd) is used when pyarrow is installed; gzip CSV is the
+fallback and always available.
+
+Jobs run on a small background pool and report progress, so a long export
+never occupies an API worker. Finished jobs and their files are dropped after
+EXPORT_RETENTION_SECONDS.
+
+Usage:
+    python -m services.export transactions --start 2024-01-01T00:00:00 --end 2024-03-31T23:59:59
+    python -m services.export alerts --format csv.gz --out alerts.csv.gz
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import gzip
+import os
+import sys
+import threading
+import time
+
+from utils.ids import new_id
+from utils.logger import logger, log_error
+import config
+
+
+# Column order and types of the exported files; types matter only for Parquet
+COLUMNS = {
+    'transactions': [
+        ('transaction_id', 'string'), ('user_id', 'string'), ('amount', 'float64'),
+        ('merchant_id', 'string'), ('merchant_category', 'string'), ('payment_method', 'string'),
+        ('timestamp', 'string'), ('location', 'string'), ('is_international', 'int64'),
+        ('merchant_country', 'string'), ('created_at', 'string')
+    ],
+    'alerts': [
+        ('alert_id', 'string'), ('transaction_id', 'string'), ('rule_name', 'string'),
+        ('severity', 'string'), ('details', 'string'), ('timestamp', 'string'), ('status', 'string'),
+        ('resolved_at', 'string'), ('resolved_by', 'string'), ('resolution_notes', 'string'),
+        ('created_at', 'string')
+    ]
+}
+
+# Unique per row; tells apart rows that share the timestamp a chunk resumes from
+KEY_COLUMNS = {'transactions': 'transaction_id', 'alerts': 'alert_id'}
+
+FORMATS = ('parquet', 'csv.gz')
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parquet_available() -> bool:
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def default_format() -> str:
+
+    return 'parquet' if parquet_available() else 'csv.gz'
+
+
+def build_query(kind: str, start_date: str = None, end_date: str = None,
+                user_id: str = None) -> Tuple[str, tuple]:
+
+    if kind not in COLUMNS:
+        raise ExportError(f"Unknown export kind: {kind}")
+    if user_id and kind != 'transactions':
+        raise ExportError("user_id filters only apply to transaction exports")
+
+    conditions = []
+    params = []
+
+    if user_id:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+
+    if start_date:
+        conditions.append("timestamp >= ?")
+        params.append(start_date)
+
+    if end_date:
+        conditions.append("timestamp <= ?")
+        params.append(end_date)
+
+    columns = ', '.join(name for name, _ in COLUMNS[kind])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Both filters are served by (user_id, timestamp) or a timestamp-leading index, so no sort step
+    return f"SELECT {columns} FROM {kind}{where} ORDER BY timestamp", tuple(params)
+
+
+def iter_chunks(db, kind: str, filters: Dict, chunk_rows: int) -> Iterator[List[Dict]]:
+
+    # Keyset pagination on timestamp: each chunk is one short query from the last timestamp
+    # written, skipping the rows at that timestamp already written
+    key = KEY_COLUMNS[kind]
+    resume_from = None
+    written_at_resume = set()
+
+    while True:
+        chunk_filters = dict(filters, start_date=resume_from) if resume_from else filters
+        query, params = build_query(kind, **chunk_filters)
+        limit = chunk_rows + len(written_at_resume)
+        rows = db.execute_query(f"{query} LIMIT ?", params + (limit,))
+
+        fresh = [row for row in rows if row[key] not in written_at_resume]
+        if fresh:
+            yield fresh
+        if len(rows) < limit:
+            return
+
+        last = fresh[-1]['timestamp']
+        if last != resume_from:
+            resume_from = last
+            written_at_resume = set()
+        written_at_resume.update(row[key] for row in fresh if row['timestamp'] == last)
+
+
+class _CsvWriter:
+
+    def __init__(self, path: str, kind: str):
+
+        self._file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        self._columns = [name for name, _ in COLUMNS[kind]]
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self._columns)
+
+    def write(self, rows: List[Dict]):
+
+        columns = self._columns
+        self._writer.writerows([row[c] for c in columns] for row in rows)
+
+    def close(self):
+
+        self._file.close()
+
+
+class _ParquetWriter:
+
+    def __init__(self, path: str, kind: str):
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._columns = [name for name, _ in COLUMNS[kind]]
+        self._schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in COLUMNS[kind]])
+        self._writer = pq.ParquetWriter(path, self._schema, compression='zstd')
+
+    def write(self, rows: List[Dict]):
+
+        # One row group per chunk: the file is written as it goes, never held whole
+        arrays = {c: [row[c] for row in rows] for c in self._columns}
+        self._writer.write_table(self._pa.Table.from_pydict(arrays, schema=self._schema))
+
+    def close(self):
+
+        self._writer.close()
+
+
+def open_writer(path: str, kind: str, fmt: str):
+
+    if fmt == 'parquet':
+        if not parquet_available():
+            raise ExportError("pyarrow is required for Parquet exports; use format csv.gz")
+        return _ParquetWriter(path, kind)
+    if fmt == 'csv.gz':
+        return _CsvWriter(path, kind)
+    raise ExportError(f"Unknown export format: {fmt}")
+
+
+@dataclass
+class ExportJob:
+    """Progress and outcome of one export"""
+
+    kind: str
+    format: str
+    path: str
+    filters: Dict = field(default_factory=dict)
+    job_id: str = field(default_factory=lambda: new_id('EXPORT'))
+    status: str = 'QUEUED'
+    total_rows: Optional[int] = None
+    rows_written: int = 0
+    bytes_written: int = 0
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+
+        data = asdict(self)
+        data['progress'] = (
+            round(self.rows_written / self.total_rows, 4) if self.total_rows else None
+        )
+        data['file_name'] = os.path.basename(self.path)
+        del data['path']
+        return data
+
+
+def run_export(db, job: ExportJob, chunk_rows: int = None) -> ExportJob:
+
+    chunk_rows = chunk_rows or config.EXPORT_CHUNK_ROWS
+    query, params = build_query(job.kind, **job.filters)
+
+    job.status = 'RUNNING'
+    job.started_at = datetime.now().isoformat()
+    # A count over the same range reads only the index, and turns progress into a fraction
+    job.total_rows = db.execute_query(f"SELECT COUNT(*) AS n FROM ({query})", params)[0]['n']
+
+    tmp_path = f"{job.path}.part"
+    writer = open_writer(tmp_path, job.kind, job.format)
+    try:
+        last_progress = time.perf_counter()
+        for rows in iter_chunks(db, job.kind, job.filters, chunk_rows):
+            writer.write(rows)
+            job.rows_written += len(rows)
+
+            now = time.perf_counter()
+            if now - last_progress >= config.EXPORT_PROGRESS_SECONDS:
+                last_progress = now
+                logger.info(f"Export {job.job_id}: {job.rows_written:,}/{job.total_rows:,} rows")
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+
+    # Visible under its final name only once complete
+    os.replace(tmp_path, job.path)
+    job.bytes_written = os.path.getsize(job.path)
+    job.status = 'COMPLETED'
+    job.finished_at = datetime.now().isoformat()
+    return job
+
+
+class ExportManager:
+    """Runs export jobs on a bounded pool and keeps their status for polling"""
+
+    def __init__(self, db, export_dir: str = None, max_workers: int = None):
+
+        self.db = db
+        self.export_dir = export_dir or config.EXPORT_DIR
+        self.retention_seconds = config.EXPORT_RETENTION_SECONDS
+        self.jobs: Dict[str, ExportJob] = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or config.EXPORT_MAX_CONCURRENT,
+            thread_name_prefix='export'
+        )
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fmt: str = None, start_date: str = None, end_date: str = None,
+               user_id: str = None) -> ExportJob:
+
+        fmt = fmt or default_format()
+        filters = {'start_date': start_date, 'end_date': end_date, 'user_id': user_id}
+        filters = {key: value for key, value in filters.items() if value}
+
+        # Bad kinds, filters or formats fail here, before a job exists
+        build_query(kind, **filters)
+        if fmt not in FORMATS:
+            raise ExportError(f"Unknown export format: {fmt}")
+        if fmt == 'parquet' and not parquet_available():
+            raise ExportError("pyarrow is required for Parquet exports; use format csv.gz")
+
+        self.prune()
+        os.makedirs(self.export_dir, exist_ok=True)
+        job = ExportJob(kind=kind, format=fmt, path='', filters=filters)
+        job.path = os.path.join(self.export_dir, f"{kind}_{job.job_id}.{fmt}")
+
+        with self._lock:
+            self.jobs[job.job_id] = job
+        self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job: ExportJob):
+
+        try:
+            run_export(self.db, job)
+            logger.info(f"Export {job.job_id} completed: {job.rows_written:,} rows, {job.bytes_written:,} bytes")
+        except Exception as e:
+            job.status = 'FAILED'
+            job.error = str(e)
+            job.finished_at = datetime.now().isoformat()
+            log_error(f"Export {job.job_id} failed", e)
+
+    def prune(self) -> int:
+
+        cutoff = (datetime.now() - timedelta(seconds=self.retention_seconds)).isoformat()
+        with self._lock:
+            expired = [
+                job for job in self.jobs.values()
+                if job.status in ('COMPLETED', 'FAILED') and job.finished_at < cutoff
+            ]
+            for job in expired:
+                del self.jobs[job.job_id]
+
+        for job in expired:
+            try:
+                os.remove(job.path)
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[ExportJob]:
+
+        with self._lock:
+            return sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self, wait: bool = True):
+
+        self._pool.shutdown(wait=wait)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Export transactions or alerts to a compressed file")
+    parser.add_argument('kind', choices=sorted(COLUMNS))
+    parser.add_argument('--format', choices=FORMATS, help="default: parquet if pyarrow is installed, else csv.gz")
+    parser.add_argument('--start', help="first timestamp to include (ISO 8601)")
+    parser.add_argument('--end', help="last timestamp to include (ISO 8601)")
+    parser.add_argument('--user', help="only this user's transactions")
+    parser.add_argument('--out', help="output file (default: EXPORT_DIR/<kind>_<job>.<format>)")
+    parser.add_argument('--chunk-rows', type=int, default=config.EXPORT_CHUNK_ROWS, help="rows fetched per chunk")
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    from database.db import Database
+
+    fmt = args.format or default_format()
+    filters = {'start_date': args.start, 'end_date': args.end, 'user_id': args.user}
+    job = ExportJob(
+        kind=args.kind,
+        format=fmt,
+        path=args.out or '',
+        filters={key: value for key, value in filters.items() if value}
+    )
+    if not job.path:
+        os.makedirs(config.EXPORT_DIR, exist_ok=True)
+        job.path = os.path.join(config.EXPORT_DIR, f"{args.kind}_{job.job_id}.{fmt}")
+
+    started = time.perf_counter()
+    try:
+        run_export(Database(args.db), job, chunk_rows=args.chunk_rows)
+    except ExportError as e:
+        parser.error(str(e))
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {job.rows_written:,} rows ({job.bytes_written:,} bytes) to {job.path} in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,409 @@
+"""
+Streaming file ingestion
+Scores JSONL or CSV transaction files through the same path as the API,
+without HTTP and without loading the file into memory.
+
+    reader (parse) -> bounded queue -> validator -> bounded queue -> scorer/writer
+
+Rows are inserted and scored in the writer thread and committed in chunks,
+together with a checkpoint, so an interrupted run resumes exactly after the
+last committed record.
+
+Usage:
+    python -m services.ingest settlement.jsonl
+    python -m services.ingest settlement.csv --commit-size 10000 --resume
+    zcat settlement.jsonl.gz | python -m services.ingest - --checkpoint settlement-2024-06-01
+"""
+
+from dataclasses import dataclass, asdict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from utils.validators import validate_transaction_data
+from utils.logger import logger
+import config
+
+
+_END = object()
+
+_CSV_BOOLEANS = {'1': True, 'true': True, 'yes': True, '0': False, 'false': False, 'no': False}
+
+
+@dataclass
+class IngestReport:
+    """Counters for one ingest run"""
+
+    source: str
+    start_record: int = 0
+    records: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    flagged: int = 0
+    alerts: int = 0
+    commits: int = 0
+    byte_offset: Optional[int] = None
+    elapsed_seconds: float = 0.0
+
+    @property
+    def records_per_second(self) -> float:
+
+        return self.records / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self) -> Dict:
+
+        data = asdict(self)
+        data['records_per_second'] = round(self.records_per_second, 1)
+        return data
+
+
+class _Failure:
+
+    def __init__(self, exception: Exception):
+
+        self.exception = exception
+
+
+def read_jsonl(stream: BinaryIO, offset: int = 0) -> Iterator[Tuple[Optional[int], Optional[dict], Optional[str]]]:
+
+    for line in stream:
+        offset += len(line)
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield offset, None, f"Invalid JSON: {e}"
+            continue
+
+        if not isinstance(record, dict):
+            yield offset, None, "Record must be a JSON object"
+            continue
+
+        yield offset, record, None
+
+
+def read_csv(stream: BinaryIO, header: List[str], offset: int = 0) -> Iterator[Tuple[Optional[int], Optional[dict], Optional[str]]]:
+
+    consumed = [offset]
+
+    def lines():
+
+        for line in stream:
+            consumed[0] += len(line)
+            yield line.decode('utf-8')
+
+    if not header:
+        return
+
+    reader = csv.reader(lines())
+
+    # csv.reader pulls lines lazily, so the consumed count ends exactly at each record
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            yield consumed[0], None, f"Expected {len(header)} columns, got {len(row)}"
+            continue
+        yield consumed[0], coerce_csv_row(dict(zip(header, row))), None
+
+
+def read_csv_header(stream: BinaryIO) -> List[str]:
+
+    first = stream.readline().decode('utf-8-sig')
+    return next(csv.reader([first]), [])
+
+
+def coerce_csv_row(row: Dict[str, str]) -> Dict:
+
+    # Empty cells mean "not provided", matching a JSON record without the key
+    record = {key: value for key, value in row.items() if value != ''}
+
+    if 'is_international' in record:
+        flag = _CSV_BOOLEANS.get(record['is_international'].strip().lower())
+        if flag is not None:
+            record['is_international'] = flag
+
+    return record
+
+
+class IngestPipeline:
+
+    def __init__(self, transaction_service, source: str,
+                 commit_size: int = None, commit_interval: float = None,
+                 queue_size: int = None, rejects: Optional[BinaryIO] = None):
+
+        self.transaction_service = transaction_service
+        self.db = transaction_service.db
+        self.source = source
+        self.commit_size = commit_size or config.INGEST_COMMIT_SIZE
+        self.commit_interval = commit_interval or config.INGEST_COMMIT_INTERVAL_SECONDS
+        self.queue_size = queue_size or config.INGEST_QUEUE_SIZE
+        self.rejects = rejects
+        self._stop = threading.Event()
+
+    def run(self, records: Iterator, start_record: int = 0, totals: Tuple[int, int] = (0, 0)) -> IngestReport:
+
+        report = IngestReport(source=self.source, start_record=start_record)
+        parsed = queue.Queue(maxsize=self.queue_size)
+        validated = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._read, args=(records, start_record, parsed), name='ingest-reader', daemon=True),
+            threading.Thread(target=self._validate, args=(parsed, validated), name='ingest-validator', daemon=True)
+        ]
+
+        started = time.perf_counter()
+        for stage in stages:
+            stage.start()
+
+        completed = False
+        try:
+            self._score_and_write(validated, report, totals, started)
+            completed = True
+        finally:
+            # Unblocks producers waiting on a queue if the writer failed
+            self._stop.set()
+            for stage in stages:
+                # A reader blocked on a pipe cannot be interrupted; it is a daemon thread
+                stage.join(timeout=None if completed else 1.0)
+
+        report.elapsed_seconds = time.perf_counter() - started
+        return report
+
+    def _put(self, target: queue.Queue, item) -> bool:
+
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _read(self, records: Iterator, start_record: int, parsed: queue.Queue):
+
+        try:
+            record_no = start_record
+            for offset, record, error in records:
+                record_no += 1
+                if not self._put(parsed, (record_no, offset, record, error)):
+                    return
+            self._put(parsed, _END)
+        except Exception as e:
+            self._put(parsed, _Failure(e))
+
+    def _validate(self, parsed: queue.Queue, validated: queue.Queue):
+
+        while True:
+            item = self._get(parsed)
+            if item is _END or isinstance(item, _Failure):
+                self._put(validated, item)
+                return
+
+            record_no, offset, record, error = item
+            if error is None:
+                try:
+                    is_valid, error = validate_transaction_data(record)
+                except (TypeError, ValueError) as e:
+                    is_valid, error = False, str(e)
+                if not is_valid:
+                    record = None
+
+            if not self._put(validated, (record_no, offset, record, error)):
+                return
+
+    def _score_and_write(self, validated: queue.Queue, report: IngestReport,
+                         totals: Tuple[int, int], started: float):
+
+        accepted_total, rejected_total = totals
+        last_progress = started
+        done = False
+
+        while not done:
+            rejected_lines = []
+            batch_records = 0
+            deadline = None
+
+            # Inserts and rule reads share one connection, so each chunk sees its own rows
+            with self.db.write_batch():
+                while batch_records < self.commit_size:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    try:
+                        item = validated.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+
+                    if item is _END:
+                        done = True
+                        break
+                    if isinstance(item, _Failure):
+                        raise item.exception
+
+                    if deadline is None:
+                        # Bounds how long a slow producer can keep the write lock
+                        deadline = time.monotonic() + self.commit_interval
+
+                    record_no, offset, record, error = item
+                    if record is not None:
+                        try:
+                            # This thread holds the write batch and already handles records in order
+                            result = self.transaction_service.process_transaction(record, inline=True)
+                        except sqlite3.IntegrityError as e:
+                            error = f"Rejected by database: {e}"
+                        else:
+                            report.accepted += 1
+                            report.alerts += result['alert_count']
+                            report.flagged += result['status'] == 'FLAGGED'
+
+                    if error is not None:
+                        report.rejected += 1
+                        rejected_lines.append({'record': record_no, 'error': error})
+
+                    report.records += 1
+                    report.byte_offset = offset
+                    batch_records += 1
+
+                if batch_records:
+                    self.db.save_ingest_checkpoint(
+                        self.source,
+                        report.start_record + report.records,
+                        report.byte_offset,
+                        accepted_total + report.accepted,
+                        rejected_total + report.rejected
+                    )
+
+            if batch_records:
+                report.commits += 1
+
+            if self.rejects is not None and rejected_lines:
+                for entry in rejected_lines:
+                    self.rejects.write((json.dumps(entry) + '\n').encode('utf-8'))
+                self.rejects.flush()
+
+            now = time.perf_counter()
+            if now - last_progress >= config.INGEST_PROGRESS_SECONDS:
+                last_progress = now
+                logger.info(
+                    f"Ingest progress: {report.start_record + report.records:,} records | "
+                    f"{report.records / (now - started):,.0f} records/s | "
+                    f"rejected {report.rejected:,} | alerts {report.alerts:,} | "
+                    f"queued {validated.qsize():,}"
+                )
+
+
+def ingest(transaction_service, path: str, fmt: str = None, checkpoint: str = None,
+           resume: bool = False, rejects_path: str = None, **pipeline_options) -> IngestReport:
+
+    from_stdin = path == '-'
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    source = checkpoint or ('stdin' if from_stdin else os.path.abspath(path))
+
+    state = transaction_service.db.get_ingest_checkpoint(source) if resume else None
+    start_record = state['records'] if state else 0
+    totals = (state['accepted'], state['rejected']) if state else (0, 0)
+
+    stream = sys.stdin.buffer if from_stdin else open(path, 'rb')
+    rejects = open(rejects_path, 'ab' if state else 'wb') if rejects_path else None
+
+    try:
+        header = read_csv_header(stream) if fmt == 'csv' else None
+        offset = stream.tell() if not from_stdin else None
+
+        if state and state['byte_offset'] is not None and not from_stdin:
+            stream.seek(state['byte_offset'])
+            offset = state['byte_offset']
+
+        if fmt == 'csv':
+            records = read_csv(stream, header, offset or 0)
+        else:
+            records = read_jsonl(stream, offset or 0)
+
+        if state and from_stdin:
+            # A pipe cannot seek: parse past the records that were already committed
+            for _ in range(start_record):
+                if next(records, None) is None:
+                    break
+
+        if from_stdin:
+            records = ((None, record, error) for _, record, error in records)
+
+        pipeline = IngestPipeline(transaction_service, source, rejects=rejects, **pipeline_options)
+        return pipeline.run(records, start_record, totals)
+    finally:
+        if not from_stdin:
+            stream.close()
+        if rejects is not None:
+            rejects.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Score a JSONL or CSV transaction file without going through HTTP")
+    parser.add_argument('path', help="input file, or - for stdin")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="input format (default: from the file extension)")
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="SQLite database path")
+    parser.add_argument('--commit-size', type=int, default=config.INGEST_COMMIT_SIZE, help="records per commit")
+    parser.add_argument('--commit-interval', type=float, default=config.INGEST_COMMIT_INTERVAL_SECONDS,
+                        help="commit at least this often (seconds) when input is slow")
+    parser.add_argument('--queue-size', type=int, default=config.INGEST_QUEUE_SIZE, help="records buffered between stages")
+    parser.add_argument('--checkpoint', help="checkpoint name (default: absolute input path, or 'stdin')")
+    parser.add_argument('--resume', action='store_true', help="continue after the last committed record")
+    parser.add_argument('--rejects', help="write rejected record numbers and reasons to this JSONL file")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    from database.db import Database
+    from services.rule_engine import RuleEngine
+    from services.alert_manager import AlertManager
+    from services.transaction_service import TransactionService
+
+    db = Database(args.db)
+    alert_manager = AlertManager(db)
+    # A backfill wants every rule's decision however long it takes, so no time budgets
+    transaction_service = TransactionService(db, RuleEngine(budgeted=False), alert_manager)
+
+    report = ingest(
+        transaction_service, args.path,
+        fmt=args.format,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
+        rejects_path=args.rejects,
+        commit_size=args.commit_size,
+        commit_interval=args.commit_interval,
+        queue_size=args.queue_size
+    )
+
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(f"Source:     {report.source}")
+        if report.start_record:
+            print(f"Resumed at: record {report.start_record:,}")
+        print(f"Records:    {report.records:,} ({report.accepted:,} accepted, {report.rejected:,} rejected)")
+        print(f"Flagged:    {report.flagged:,} transactions, {report.alerts:,} alerts")
+        print(f"Commits:    {report.commits:,}")
+        print(f"Elapsed:    {report.elapsed_seconds:.1f}s ({report.records_per_second:,.0f} records/s)")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,42 +1,204 @@
 
-from typing import List, Dict
+from contextlib import nullcontext
+from typing import List, Dict, Optional, Tuple
 from rules.amount_threshold_rule import AmountThresholdRule
 from rules.velocity_rule import VelocityRule
 from rules.daily_limit_rule import DailyLimitRule
 from rules.high_risk_merchant_rule import HighRiskMerchantRule
 from rules.rapid_succession_rule import RapidSuccessionRule
+from rules.amount_anomaly_rule import AmountAnomalyRule
+from rules.merchant_fan_in_rule import MerchantFanInRule
+from rules.merchant_diversity_rule import MerchantDiversityRule
+from rules.context import EvaluationContext
+from rules.dsl import load_rule_file, RuleDefinitionError
+from utils.circuit_breaker import CircuitBreaker
+from utils.logger import logger
+import config
+import sqlite3
+import threading
+import time
+import os
 
 
 class RuleEngine:
 
-    def __init__(self):
+    def __init__(self, custom_rules_path: str = None, budgeted: bool = True):
 
-        self.rules = [
+        self.builtin_rules = [
             AmountThresholdRule(),
             VelocityRule(),
             DailyLimitRule(),
             HighRiskMerchantRule(),
-            RapidSuccessionRule()
+            RapidSuccessionRule(),
+            AmountAnomalyRule(),
+            MerchantFanInRule(),
+            MerchantDiversityRule()
         ]
+        self.rules = list(self.builtin_rules)
+        self.shadow = None
+        self.budgeted = budgeted and bool(config.RULE_BUDGET_MS)
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.RULE_BREAKER_FAILURES,
+            cooldown_seconds=config.RULE_BREAKER_COOLDOWN_SECONDS
+        )
+        self.skipped = 0
+        self.degraded = 0
+        self._stats_lock = threading.Lock()
+        self.window_seconds = max(config.VELOCITY_DAY_WINDOW, config.RAPID_SUCCESSION_WINDOW)
+        
+        self.custom_rules_path = custom_rules_path or config.CUSTOM_RULES_PATH
+        if self.custom_rules_path and os.path.exists(self.custom_rules_path):
+            self.load_custom_rules()
     
     def evaluate_transaction(self, transaction, db) -> List[Dict]:
 
+        alerts, _ = self.evaluate_with_status(transaction, db)
+        return alerts
+    
+    def evaluate_with_status(self, transaction, db) -> Tuple[List[Dict], List[Dict]]:
+
         alerts = []
+        degraded = []
         
-
-        for rule in self.rules:
+        # One context per transaction so every rule shares the same window query
+        rules = self.rules
+        context = EvaluationContext(transaction, db, prefetch_seconds=self.window_seconds)
+        
+        deadline = None
+        if self.budgeted and config.RULE_DEADLINE_MS:
+            deadline = time.monotonic() + config.RULE_DEADLINE_MS / 1000
+        
+        for rule in rules:
 
             if not rule.is_enabled():
                 continue
             
 
-            result = rule.evaluate(transaction, db)
+            # Rules that only look at the transaction always decide, however slow the database is
+            if self.budgeted and rule.reads_database:
+                result, status = self._evaluate_budgeted(rule, transaction, context, deadline)
+                if status is not None:
+                    degraded.append(status)
+            else:
+                result = rule.evaluate(transaction, context)
             
 
             if result and result.get('triggered'):
                 alerts.append(result)
         
-        return alerts
+        # State updates come last, so every rule scored against history without this transaction
+        undecided = {status['rule_name'] for status in degraded}
+        for rule in rules:
+            if not rule.is_enabled() or rule.name in undecided:
+                # A rule that missed its budget also skips its state update, which would wait on the same database
+                continue
+            if self.budgeted and rule.reads_database:
+                self._observe_budgeted(rule, transaction, context, deadline)
+            else:
+                rule.observe(transaction, context)
+        
+        # Candidate rules score the same context later, on their own threads
+        if self.shadow is not None:
+            self.shadow.submit(transaction, context)
+        
+        return alerts, degraded
+    
+    def _evaluate_budgeted(self, rule, transaction, context,
+                           deadline: Optional[float]) -> Tuple[Optional[Dict], Optional[Dict]]:
+
+        budget = config.RULE_BUDGETS_MS.get(rule.name, config.RULE_BUDGET_MS) / 1000
+        if deadline is not None:
+            budget = min(budget, deadline - time.monotonic())
+            if budget <= 0:
+                return None, self._record_status(rule, 'SKIPPED', 'deadline')
+        
+        if not self.breaker.allow():
+            return None, self._record_status(rule, 'SKIPPED', 'circuit_open')
+        
+        guard = getattr(context.db, 'deadline', None)
+        started = time.monotonic()
+        succeeded = None
+        try:
+            with guard(budget) if guard is not None else nullcontext():
+                result = rule.evaluate(transaction, context)
+            succeeded = time.monotonic() - started <= budget
+        except sqlite3.Error as e:
+            succeeded = False
+            # The guard interrupts a statement with an OperationalError once its deadline has passed
+            if isinstance(e, sqlite3.OperationalError) and time.monotonic() >= started + budget:
+                return None, self._record_status(rule, 'DEGRADED', 'timeout')
+            logger.warning(f"Rule {rule.name} skipped for {transaction.transaction_id}: {e}")
+            return None, self._record_status(rule, 'DEGRADED', 'database_error')
+        finally:
+            # Every exit reports back, or a half-open breaker would wait forever on its probe
+            if succeeded is None:
+                self.breaker.release()
+            elif succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        
+        if not succeeded:
+            # Finished late (not every wait can be interrupted): the result stands, the breaker counts it
+            return result, self._record_status(rule, 'DEGRADED', 'over_budget')
+        return result, None
+    
+    def _observe_budgeted(self, rule, transaction, context, deadline: Optional[float]):
+
+        remaining = deadline - time.monotonic() if deadline is not None else config.RULE_BUDGET_MS / 1000
+        if remaining <= 0:
+            logger.debug(f"Rule {rule.name} state update skipped for {transaction.transaction_id}: deadline")
+            return
+        
+        # Bounds the wait for the writer and any reads; the write itself, once started, runs to the end
+        guard = getattr(context.db, 'deadline', None)
+        try:
+            with guard(remaining) if guard is not None else nullcontext():
+                rule.observe(transaction, context)
+        except sqlite3.Error as e:
+            self.breaker.record_failure()
+            logger.warning(f"Rule {rule.name} state update skipped for {transaction.transaction_id}: {e}")
+    
+    def _record_status(self, rule, status: str, reason: str) -> Dict:
+
+        with self._stats_lock:
+            if status == 'SKIPPED':
+                self.skipped += 1
+            else:
+                self.degraded += 1
+        return {'rule_name': rule.name, 'status': status, 'reason': reason}
+    
+    def stats(self) -> Dict:
+
+        with self._stats_lock:
+            return {
+                'budgeted': self.budgeted,
+                'skipped': self.skipped,
+                'degraded': self.degraded,
+                'breaker': self.breaker.stats()
+            }
+    
+    def load_custom_rules(self, path: str = None) -> int:
+
+        path = path or self.custom_rules_path
+        compiled = load_rule_file(path)
+        
+        builtin_names = {rule.name for rule in self.builtin_rules}
+        for rule in compiled:
+            if rule.name in builtin_names:
+                raise RuleDefinitionError(f"Rule {rule.name} clashes with a built-in rule")
+        
+        window_seconds = max(
+            [config.VELOCITY_DAY_WINDOW, config.RAPID_SUCCESSION_WINDOW]
+            + [rule.window_seconds for rule in compiled]
+        )
+        
+        # Swap in a single assignment so in-flight evaluations keep a consistent rule list
+        self.rules = self.builtin_rules + compiled
+        self.window_seconds = window_seconds
+        self.custom_rules_path = path
+        
+        return len(compiled)
     
     def get_active_rules(self) -> List:
 
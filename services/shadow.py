@@ -0,0 +1,179 @@
+"""
+Shadow rule evaluation
+Candidate rules, written in the custom rule format (rules/dsl.py), run
+against live traffic without affecting decisions. After the live rules
+have scored a transaction, RuleEngine hands the transaction and its
+evaluation context to this pool. Shadow rules then see the same window rows
+the live rules saw. Their would-be alerts go to `shadow_alerts`, in batches.
+
+The hand-off never blocks: when the bounded queue is full, the transaction
+is skipped for shadow purposes and counted as shed. Live latency therefore
+does not depend on how slow the shadow rules are.
+"""
+
+from queue import Empty, Full, Queue
+from typing import Dict, List
+import threading
+import time
+
+from rules.dsl import load_rule_file
+from utils.ids import new_id
+from utils.logger import log_error
+import config
+
+
+class ShadowEvaluator:
+
+    def __init__(self, db, workers: int = None, queue_size: int = None):
+
+        self.db = db
+        self.rules = []
+        self.rules_path = None
+        self.workers = workers or config.SHADOW_WORKERS
+        self.queue_size = queue_size or config.SHADOW_QUEUE_SIZE
+        self.submitted = 0
+        self.shed = 0
+        self.evaluated = 0
+        self.alerts = 0
+        self.errors = 0
+        self._queue = Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def load(self, path: str = None) -> int:
+
+        path = path or config.SHADOW_RULES_PATH
+        # Compiled in full before the swap, so a bad file leaves the current candidates running
+        self.rules = load_rule_file(path)
+        self.rules_path = path
+        return len(self.rules)
+
+    def start(self) -> 'ShadowEvaluator':
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'shadow-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, transaction, context) -> bool:
+
+        if not self.rules or not self._threads:
+            return False
+
+        try:
+            self._queue.put_nowait((transaction, context))
+        except Full:
+            with self._lock:
+                self.shed += 1
+            return False
+
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def evaluate(self, transaction, context) -> List[Dict]:
+
+        # Separate feature cache: a shadow feature may share a name with a live one but differ
+        context = context.fork()
+        results = []
+        for rule in self.rules:
+            if not rule.is_enabled():
+                continue
+            result = rule.evaluate(transaction, context)
+            if result and result.get('triggered'):
+                results.append({
+                    'shadow_alert_id': new_id('SHADOW'),
+                    'transaction_id': transaction.transaction_id,
+                    'rule_name': result['rule_name'],
+                    'severity': result['severity'],
+                    'details': result['details'],
+                    'timestamp': transaction.timestamp
+                })
+        return results
+
+    def _run(self):
+
+        pending = []
+        flush_at = time.monotonic() + config.SHADOW_FLUSH_INTERVAL_SECONDS
+
+        while True:
+            timeout = max(flush_at - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except Empty:
+                item = False
+
+            if item is None:
+                self._flush(pending)
+                return
+
+            if item:
+                transaction, context = item
+                try:
+                    pending.extend(self.evaluate(transaction, context))
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    log_error(f"Shadow evaluation failed for {transaction.transaction_id}", e)
+                with self._lock:
+                    self.evaluated += 1
+
+            # Written in batches, so shadow alerts take the writer lock rarely, not once per alert
+            if len(pending) >= config.SHADOW_FLUSH_SIZE or time.monotonic() >= flush_at:
+                self._flush(pending)
+                pending = []
+                flush_at = time.monotonic() + config.SHADOW_FLUSH_INTERVAL_SECONDS
+
+    def _flush(self, pending: List[Dict]):
+
+        if not pending:
+            return
+        try:
+            self.db.insert_shadow_alerts(pending)
+            with self._lock:
+                self.alerts += len(pending)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            log_error(f"Error writing {len(pending)} shadow alerts", e)
+
+    def stop(self):
+
+        # Queued items are evaluated and pending alerts flushed before the workers exit
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def summary(self, start_time: str, end_time: str) -> Dict:
+
+        # One row per rule and severity, counted from idx_shadow_alerts_rule_severity_time
+        rows = self.db.count_by_rule_and_severity('shadow_alerts', start_time, end_time)
+
+        by_rule = {}
+        for row in rows:
+            by_rule.setdefault(row['rule_name'], {})[row['severity']] = row['n']
+
+        return {
+            'start_time': start_time,
+            'end_time': end_time,
+            'total_alerts': sum(row['n'] for row in rows),
+            'by_rule': by_rule
+        }
+
+    def stats(self) -> Dict:
+
+        with self._lock:
+            return {
+                'rules': [rule.name for rule in self.rules],
+                'workers': len(self._threads),
+                'queued': self._queue.qsize(),
+                'queue_size': self.queue_size,
+                'submitted': self.submitted,
+                'evaluated': self.evaluated,
+                'shed': self.shed,
+                'alerts': self.alerts,
+                'errors': self.errors
+            }
@@ -0,0 +1,274 @@
+"""
+Rule state snapshots
+Periodically writes the in-memory user windows and rule sketches to one
+binary file, and on startup maps that file back in and replays transactions
+stored since it was written. A restarted process then scores with the same
+state it had before, without reloading every user from SQLite.
+
+File layout (little-endian, see utils/packing.py):
+    magic, version, snapshot time, stored position, section count
+    per section: name, length, payload
+
+Replay covers every row stored after the position (the highest transaction
+rowid when the snapshot began), however old its timestamp, plus rows
+timestamped from SNAPSHOT_REPLAY_MARGIN_SECONDS before the snapshot time,
+which may have been stored but not yet applied to the in-memory state while
+it was dumped. Replaying a row twice does not change any state.
+
+A missing, unreadable or stale file is ignored and state starts cold.
+
+Usage:
+    python -m services.snapshot state.snapshot    # list the sections of a snapshot
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from models.transaction import Transaction
+from utils.logger import logger, log_error
+from utils.packing import Packer, Unpacker
+import config
+
+
+MAGIC = b'TMSNAP'
+VERSION = 2
+
+_USER_STATE = 'user_state'
+_RULE_PREFIX = 'rule:'
+
+
+def write_snapshot(transaction_service, path: str) -> Dict:
+
+    started = time.perf_counter()
+    # Taken before any state is read, so replay covers changes made during the dump
+    snapshot_time = datetime.now().isoformat()
+    position = transaction_service.db.transaction_high_water()
+
+    sections = []
+    if transaction_service.user_state is not None:
+        packer = Packer()
+        transaction_service.user_state.dump(packer)
+        sections.append((_USER_STATE, packer.getvalue()))
+
+    for rule in transaction_service.rule_engine.builtin_rules:
+        state = rule.dump_state()
+        if state is not None:
+            sections.append((_RULE_PREFIX + rule.name, state))
+
+    header = Packer()
+    header.buffer += MAGIC
+    header.u32(VERSION)
+    header.str(snapshot_time)
+    header.u64(position)
+    header.u32(len(sections))
+
+    # Written beside the target under a unique name and renamed, so a crash mid-write leaves the
+    # previous snapshot intact and processes writing the same path never share a temporary file
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.buffer)
+            for name, payload in sections:
+                section = Packer()
+                section.str(name)
+                section.u64(len(payload))
+                f.write(section.buffer)
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return {
+        'path': path,
+        'snapshot_time': snapshot_time,
+        'sections': [name for name, _ in sections],
+        'bytes': os.path.getsize(path),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def read_sections(buffer) -> Dict:
+
+    unpacker = Unpacker(buffer)
+    if bytes(unpacker.view(len(MAGIC))) != MAGIC:
+        raise ValueError("Not a snapshot file")
+
+    version = unpacker.u32()
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+
+    snapshot_time = unpacker.str()
+    position = unpacker.u64()
+    sections = {}
+    for _ in range(unpacker.u32()):
+        name = unpacker.str()
+        # Views into the mapping: nothing is copied until a section is decoded
+        sections[name] = unpacker.view(unpacker.u64())
+    return {'snapshot_time': snapshot_time, 'position': position, 'sections': sections}
+
+
+def restore_snapshot(transaction_service, path: str, max_age_seconds: int = None) -> Dict:
+
+    started = time.perf_counter()
+    report = {'loaded': False, 'path': path, 'users': 0, 'rules': [], 'replayed': 0}
+
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        report['reason'] = 'no snapshot'
+        return report
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        # Handled inside the mapping: an error escaping it would hold views and make closing it fail
+        try:
+            snapshot = read_sections(mapped)
+        except (ValueError, struct.error) as e:
+            snapshot = None
+            report['reason'] = f"unreadable snapshot: {e}"
+
+        if snapshot is not None:
+            try:
+                loaded = _load_sections(transaction_service, snapshot, report, max_age_seconds)
+            finally:
+                # Decoded state holds no references into the mapping, which must be released before it closes
+                for view in snapshot['sections'].values():
+                    view.release()
+
+    if snapshot is None or not loaded:
+        # A bad file must not stop the service from starting; it starts cold instead
+        logger.warning(f"Snapshot {path} not restored: {report['reason']}")
+        return report
+
+    report['replayed'] = replay(transaction_service, snapshot['snapshot_time'], snapshot['position'])
+    report['loaded'] = True
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def _load_sections(transaction_service, snapshot: Dict, report: Dict, max_age_seconds: int = None) -> bool:
+
+    snapshot_time = snapshot['snapshot_time']
+    sections = snapshot['sections']
+    age = (datetime.now() - datetime.fromisoformat(snapshot_time)).total_seconds()
+    report['snapshot_time'] = snapshot_time
+    report['age_seconds'] = round(age, 1)
+
+    max_age = max_age_seconds or config.SNAPSHOT_MAX_AGE_SECONDS
+    if age > max_age:
+        # Replaying that much history costs more than letting users reload on demand
+        report['reason'] = f"older than {max_age} seconds"
+        return False
+
+    user_state = transaction_service.user_state
+    if user_state is not None and _USER_STATE in sections:
+        try:
+            report['users'] = user_state.load(Unpacker(sections[_USER_STATE]))
+        except (ValueError, struct.error) as e:
+            # Partly loaded windows would be missing rows, so none are kept
+            user_state.clear()
+            report['reason'] = f"unreadable user state: {e}"
+            return False
+
+    for rule in transaction_service.rule_engine.builtin_rules:
+        data = sections.get(_RULE_PREFIX + rule.name)
+        if data is None:
+            continue
+        try:
+            rule.load_state(data)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Snapshot state for {rule.name} not restored: {e}")
+        else:
+            report['rules'].append(rule.name)
+    return True
+
+
+def replay(transaction_service, snapshot_time: str, position: int) -> int:
+
+    start_time = (
+        datetime.fromisoformat(snapshot_time) - timedelta(seconds=config.SNAPSHOT_REPLAY_MARGIN_SECONDS)
+    ).isoformat()
+
+    user_state = transaction_service.user_state
+    rules = transaction_service.rule_engine.builtin_rules
+
+    replayed = 0
+    for row in transaction_service.db.iter_transactions_stored_since(position, start_time):
+        if user_state is not None:
+            user_state.record_row(row)
+
+        transaction = Transaction.from_dict(row)
+        for rule in rules:
+            rule.replay(transaction)
+        replayed += 1
+    return replayed
+
+
+class SnapshotScheduler:
+    """Background thread that rewrites the snapshot every interval and once more on stop"""
+
+    def __init__(self, transaction_service, path: str, interval_seconds: float = None):
+
+        self.transaction_service = transaction_service
+        self.path = path
+        self.interval_seconds = interval_seconds or config.SNAPSHOT_INTERVAL_SECONDS
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+
+    def start(self):
+
+        self._thread.start()
+        return self
+
+    def _run(self):
+
+        while not self._stop.wait(self.interval_seconds):
+            self.write()
+
+    def write(self):
+
+        try:
+            self.last_report = write_snapshot(self.transaction_service, self.path)
+            logger.info(
+                f"Snapshot written: {self.last_report['bytes']:,} bytes "
+                f"in {self.last_report['elapsed_ms']} ms"
+            )
+        except Exception as e:
+            log_error("Error writing rule state snapshot", e)
+
+    def stop(self, final_snapshot: bool = True):
+
+        self._stop.set()
+        self._thread.join(timeout=self.interval_seconds)
+        if final_snapshot:
+            self.write()
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="List the sections of a rule state snapshot")
+    parser.add_argument('path', nargs='?', default=config.SNAPSHOT_PATH, help="snapshot file")
+    args = parser.parse_args(argv)
+
+    if not args.path:
+        parser.error("a path is required when SNAPSHOT_PATH is not configured")
+
+    with open(args.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        snapshot = read_sections(mapped)
+        print(f"Snapshot time: {snapshot['snapshot_time']} (replay from transaction row {snapshot['position']})")
+        for name, view in snapshot['sections'].items():
+            print(f"  {name:<32}{len(view):>14,} bytes")
+            view.release()
+
+
+if __name__ == '__main__':
+    main()
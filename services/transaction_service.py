@@ -1,8 +1,29 @@
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from models.transaction import Transaction
+from utils.cache import LRUCache
+from utils.executor import KeyedExecutor
+from services.user_state import UserStateManager
 from datetime import datetime
+import hashlib
+import json
+import time
 import uuid
+import config
+
+
+class IdempotencyConflictError(ValueError):
+    """An idempotency key was reused with a different request body"""
+
+
+class IdempotencyInProgressError(RuntimeError):
+    """Another request with the same idempotency key is still being scored"""
+
+
+def request_fingerprint(transaction_data: dict) -> str:
+
+    canonical = json.dumps(transaction_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 
 class TransactionService:
@@ -12,18 +33,131 @@ class TransactionService:
         self.db = db
         self.rule_engine = rule_engine
         self.alert_manager = alert_manager
+        self.idempotency_cache = LRUCache(
+            max_entries=config.IDEMPOTENCY_CACHE_SIZE,
+            ttl_seconds=config.IDEMPOTENCY_TTL_SECONDS
+        )
+        self._next_idempotency_purge = 0.0
+        self.executor = None
+        if config.ORDERED_EXECUTION:
+            self.executor = KeyedExecutor(
+                max_workers=config.ORDERED_EXECUTOR_WORKERS,
+                name='user-executor'
+            )
+        
+        # Windows can only be kept in memory while each user's transactions run in order
+        self.user_state = None
+        if config.ORDERED_EXECUTION and config.USER_STATE_MAX_BYTES:
+            self.user_state = UserStateManager(db, rule_engine=rule_engine)
+    
+    def process_transaction(self, transaction_data: dict, idempotency_key: str = None,
+                            inline: bool = False) -> Dict:
+
+        if not idempotency_key:
+            return self._run(transaction_data, inline)
+        
+        fingerprint = request_fingerprint(transaction_data)
+        stored = self.get_idempotent_result(idempotency_key, transaction_data)
+        if stored is not None:
+            return stored
+        
+        if time.monotonic() >= self._next_idempotency_purge:
+            self._next_idempotency_purge = time.monotonic() + config.IDEMPOTENCY_PURGE_INTERVAL_SECONDS
+            self.db.purge_idempotency_keys(config.IDEMPOTENCY_TTL_SECONDS)
+        
+        result = self._run(transaction_data, inline, idempotency_key, fingerprint)
+        if result is None:
+            # Another thread or process holds the key and is still scoring; wait briefly for its decision
+            return self._wait_for_result(idempotency_key, transaction_data)
+        
+        self.idempotency_cache.put(idempotency_key, {'fingerprint': fingerprint, 'response': result})
+        return result
     
-    def process_transaction(self, transaction_data: dict) -> Dict:
+    def get_idempotent_result(self, idempotency_key: str, transaction_data: dict = None) -> Optional[Dict]:
+
+        entry = self.idempotency_cache.get(idempotency_key)
+        if entry is None:
+            record = self.db.get_idempotent_response(
+                idempotency_key,
+                max_age_seconds=config.IDEMPOTENCY_TTL_SECONDS
+            )
+            if not record:
+                return None
+            
+            entry = {'fingerprint': record['fingerprint'], 'response': json.loads(record['response'])}
+            self.idempotency_cache.put(idempotency_key, entry)
+        
+        # Keys stored before fingerprints were recorded have none and are not checked
+        if transaction_data is not None and entry['fingerprint'] is not None \
+                and entry['fingerprint'] != request_fingerprint(transaction_data):
+            raise IdempotencyConflictError("Idempotency-Key was already used with a different request body")
+        return entry['response']
+    
+    def _wait_for_result(self, idempotency_key: str, transaction_data: dict) -> Dict:
+
+        give_up_at = time.monotonic() + config.IDEMPOTENCY_PENDING_WAIT_SECONDS
+        while True:
+            stored = self.get_idempotent_result(idempotency_key, transaction_data)
+            if stored is not None:
+                return stored
+            if time.monotonic() >= give_up_at:
+                raise IdempotencyInProgressError(
+                    "A request with this Idempotency-Key is still being processed; retry later"
+                )
+            time.sleep(0.01)
+    
+    def _run(self, transaction_data: dict, inline: bool, idempotency_key: str = None,
+             fingerprint: str = None) -> Optional[Dict]:
+
+        if self.executor is None or inline:
+            return self._process(transaction_data, idempotency_key, fingerprint)
+        
+        # Same-user transactions run one at a time, so window counts never depend on thread interleaving
+        return self.executor.run(
+            transaction_data.get('user_id'), self._process, transaction_data, idempotency_key, fingerprint
+        )
+    
+    def _process(self, transaction_data: dict, idempotency_key: str = None,
+                 fingerprint: str = None) -> Optional[Dict]:
 
         transaction = Transaction.from_dict(transaction_data)
+        if idempotency_key is None:
+            self.db.insert_transaction(transaction)
+            return self._record(transaction, *self._evaluate(transaction))
         
-  
-        self.db.insert_transaction(transaction)
+        # Only the writes hold the writer, in two short batches; rules are scored in between, so keyed
+        # requests for different users run in parallel. The committed reservation guards retries meanwhile
+        with self.db.write_batch():
+            if not self.db.reserve_idempotency_key(
+                idempotency_key, transaction.transaction_id, fingerprint,
+                max_age_seconds=config.IDEMPOTENCY_TTL_SECONDS,
+                pending_seconds=config.IDEMPOTENCY_PENDING_TIMEOUT_SECONDS
+            ):
+                return None
+            self.db.insert_transaction(transaction)
         
-  
-        rule_results = self.rule_engine.evaluate_transaction(transaction, self.db)
+        try:
+            rule_results, degraded_rules = self._evaluate(transaction)
+            with self.db.write_batch():
+                result = self._record(transaction, rule_results, degraded_rules)
+                self.db.save_idempotent_response(idempotency_key, json.dumps(result))
+        except Exception:
+            # A retry scores again, as a new transaction; the undecided row stays, as on the unkeyed path
+            self.db.release_idempotency_key(idempotency_key)
+            raise
+        return result
+    
+    def _evaluate(self, transaction: Transaction) -> Tuple[List[Dict], List[Dict]]:
+
+        source = self.db
+        if self.user_state is not None:
+            self.user_state.record(transaction)
+            source = self.user_state
         
+        return self.rule_engine.evaluate_with_status(transaction, source)
     
+    def _record(self, transaction: Transaction, rule_results: List[Dict], degraded_rules: List[Dict]) -> Dict:
+
         alerts = []
         for rule_result in rule_results:
             alert = self.alert_manager.create_alert(transaction, rule_result)
@@ -37,7 +171,9 @@ class TransactionService:
             'transaction_id': transaction.transaction_id,
             'status': status,
             'alerts': [alert.to_dict() for alert in alerts],
-            'alert_count': len(alerts)
+            'alert_count': len(alerts),
+            # Rules that did not decide in time; empty when every rule ran within its budget
+            'degraded_rules': degraded_rules
         }
     
     def get_transaction(self, transaction_id: str) -> Optional[Dict]:
@@ -67,6 +203,18 @@ class TransactionService:
         
         return self.db.execute_query(query, tuple(params) if params else None)
     
+    def get_transaction_totals(self, start_date: str, end_date: str) -> Dict:
+
+        rows = self.db.execute_query(
+            """
+            SELECT COUNT(*) AS total_transactions, COALESCE(SUM(amount), 0) AS total_volume
+            FROM transaction_amounts
+            WHERE timestamp >= ? AND timestamp <= ?
+            """,
+            (start_date, end_date)
+        )
+        return rows[0]
+    
     def get_user_statistics(self, user_id: str) -> Dict:
 
         transactions = self.db.execute_query(
@@ -0,0 +1,212 @@
+"""
+Per-user transaction windows
+Keeps the recent transactions of active users in memory, within a byte
+budget, so rule windows are answered without a query. Cold users are evicted
+least recently used first and reloaded from the database on their next
+transaction. State is per process and assumes one user's transactions are
+processed one at a time (ORDERED_EXECUTION).
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List
+import sys
+import threading
+
+from utils.cache import LRUCache, estimate_size
+from utils.packing import Packer, Unpacker
+import config
+
+
+class UserWindow:
+    """Rows from start_time onwards, oldest first, with their timestamps kept alongside for bisection"""
+
+    __slots__ = ('start_time', 'timestamps', 'rows', 'ids', 'size')
+
+    def __init__(self, start_time: str, rows: List[Dict]):
+
+        self.start_time = start_time
+        self.rows = sorted(rows, key=lambda row: row['timestamp'])
+        self.timestamps = [row['timestamp'] for row in self.rows]
+        self.ids = {row['transaction_id'] for row in self.rows}
+        self.size = sys.getsizeof(self.rows) + sum(estimate_size(row) for row in self.rows)
+
+    def insert(self, row: Dict) -> bool:
+
+        if row['timestamp'] < self.start_time or row['transaction_id'] in self.ids:
+            return False
+
+        position = bisect_right(self.timestamps, row['timestamp'])
+        self.timestamps.insert(position, row['timestamp'])
+        self.rows.insert(position, row)
+        self.ids.add(row['transaction_id'])
+        self.size += estimate_size(row)
+        return True
+
+    def trim(self, start_time: str):
+
+        if start_time <= self.start_time:
+            return
+
+        cut = bisect_left(self.timestamps, start_time)
+        for row in self.rows[:cut]:
+            self.ids.discard(row['transaction_id'])
+            self.size -= estimate_size(row)
+        del self.rows[:cut]
+        del self.timestamps[:cut]
+        self.start_time = start_time
+
+
+class UserStateManager:
+    """Serves get_user_transactions_in_window from memory and delegates everything else to the database"""
+
+    def __init__(self, db, window_seconds: int = None, max_users: int = None, max_bytes: int = None,
+                 rule_engine=None):
+
+        self.db = db
+        self.rule_engine = rule_engine
+        self._window_seconds = window_seconds or config.VELOCITY_DAY_WINDOW
+        self.windows = LRUCache(
+            max_entries=max_users or config.USER_STATE_MAX_USERS,
+            max_bytes=max_bytes or config.USER_STATE_MAX_BYTES
+        )
+        self.hits = 0
+        self.misses = 0
+        self.rehydrations = 0
+        self.rows_loaded = 0
+        self._locks = [threading.Lock() for _ in range(64)]
+        # A rolled-back write batch may have left rows here that were never committed
+        db.add_rollback_listener(self.clear)
+
+    def __getattr__(self, name):
+
+        if name in ('db', 'rule_engine', '_window_seconds'):
+            raise AttributeError(name)
+        return getattr(self.db, name)
+
+    @property
+    def window_seconds(self) -> int:
+
+        # Read on every trim: a rules reload can widen the engine's longest window
+        if self.rule_engine is not None:
+            return self.rule_engine.window_seconds
+        return self._window_seconds
+
+    def _lock(self, user_id: str) -> threading.Lock:
+
+        return self._locks[hash(user_id) % len(self._locks)]
+
+    def _put(self, user_id: str, window: UserWindow):
+
+        self.windows.put(user_id, window, size=window.size)
+
+    def get_user_transactions_in_window(self, user_id: str, start_time: str, end_time: str = None) -> List[Dict]:
+
+        with self._lock(user_id):
+            window = self.windows.get(user_id)
+            if window is not None and start_time >= window.start_time:
+                self.hits += 1
+            else:
+                # Evicted, never seen, or asked for more history than is resident
+                self.misses += 1
+                self.rehydrations += 1
+                rows = self.db.get_user_transactions_in_window(user_id, start_time)
+                self.rows_loaded += len(rows)
+                window = UserWindow(start_time, rows)
+                self._put(user_id, window)
+
+            start = bisect_left(window.timestamps, start_time)
+            end = len(window.rows) if end_time is None else bisect_right(window.timestamps, end_time)
+            rows = window.rows[start:end]
+
+        # Same order as the query: newest first
+        rows.reverse()
+        return rows
+
+    def record(self, transaction):
+
+        with self._lock(transaction.user_id):
+            window = self.windows.get(transaction.user_id)
+            if window is None:
+                # Loaded from the database, this row included, on the user's next read
+                return
+
+            # Served from the object cache that insert_transaction just filled, or inside a batch from the writer
+            row = self.db.get_transaction(transaction.transaction_id)
+            if row is not None:
+                self._append(transaction.user_id, window, row)
+
+    def record_row(self, row: Dict):
+
+        with self._lock(row['user_id']):
+            window = self.windows.get(row['user_id'])
+            if window is not None:
+                self._append(row['user_id'], window, row)
+
+    def _append(self, user_id: str, window: UserWindow, row: Dict):
+
+        if not window.insert(row):
+            return
+
+        latest = datetime.fromisoformat(window.timestamps[-1])
+        window.trim((latest - timedelta(seconds=self.window_seconds)).isoformat())
+        self._put(user_id, window)
+
+    def dump(self, packer: Packer):
+
+        entries = self.windows.items()
+        packer.u32(len(entries))
+        for user_id, window in entries:
+            with self._lock(user_id):
+                rows = list(window.rows)
+                start_time = window.start_time
+            columns = list(rows[0]) if rows else []
+
+            packer.str(user_id)
+            packer.str(start_time)
+            packer.u32(len(columns))
+            for column in columns:
+                packer.str(column)
+            packer.u32(len(rows))
+            for row in rows:
+                for column in columns:
+                    packer.value(row.get(column))
+
+    def load(self, unpacker: Unpacker) -> int:
+
+        self.windows.clear()
+        for _ in range(unpacker.u32()):
+            user_id = unpacker.str()
+            start_time = unpacker.str()
+            columns = [unpacker.str() for _ in range(unpacker.u32())]
+            rows = [
+                {column: unpacker.value() for column in columns}
+                for _ in range(unpacker.u32())
+            ]
+            # Least recently used first, so the budget keeps the users that were hottest
+            self._put(user_id, UserWindow(start_time, rows))
+        return len(self.windows)
+
+    def invalidate(self, user_id: str):
+
+        self.windows.invalidate(user_id)
+
+    def clear(self):
+
+        self.windows.clear()
+
+    def stats(self) -> Dict:
+
+        lookups = self.hits + self.misses
+        windows = self.windows.stats()
+        return {
+            'users': windows['entries'],
+            'bytes': windows['bytes'],
+            'max_bytes': windows['max_bytes'],
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': windows['evictions'],
+            'rehydrations': self.rehydrations,
+            'rows_loaded': self.rows_loaded
+        }
@@ -8,8 +8,14 @@ from rules.velocity_rule import VelocityRule
 from rules.daily_limit_rule import DailyLimitRule
 from rules.high_risk_merchant_rule import HighRiskMerchantRule
 from rules.rapid_succession_rule import RapidSuccessionRule
+from rules.amount_anomaly_rule import AmountAnomalyRule
+from rules.merchant_fan_in_rule import MerchantFanInRule
+from rules.merchant_diversity_rule import MerchantDiversityRule
 from database.db import Database
+from rules.dsl import compile_rules
 from datetime import datetime, timedelta
+import config
+import uuid
 
 print("=" * 70)
 print("COMPREHENSIVE RULE TESTING")
@@ -162,6 +168,169 @@ if len(triggered_rules) >= 2:
 else:
     print(f"\n  ✗ FAIL: Expected multiple rules, got {len(triggered_rules)}")
 
+# Test 6: Declarative rule compiled from a definition
+print("\n" + "=" * 70)
+print("TEST 6: Declarative Rule (burst of electronics purchases)")
+print("=" * 70)
+declarative_rules = compile_rules({
+    'features': {
+        'txn_count_1h': {'aggregate': 'count', 'window': 3600},
+        'spend_1h': {'aggregate': 'sum', 'window': 3600}
+    },
+    'rules': [{
+        'name': 'ELECTRONICS_BURST',
+        'tiers': [{
+            'severity': 'HIGH',
+            'all': [
+                {'field': 'merchant_category', 'op': 'in', 'value': ['Electronics', 'mobile_phones']},
+                {'feature': 'txn_count_1h', 'op': '>=', 'value': {'config': 'VELOCITY_MAX_PER_HOUR'}}
+            ],
+            'message': '{txn_count_1h} electronics purchases totalling ₹{spend_1h:,.0f} in the last hour'
+        }]
+    }]
+})
+
+burst_result = declarative_rules[0].evaluate(txn_velocity, db)
+quiet_result = declarative_rules[0].evaluate(txn1, db)
+
+if burst_result and burst_result['severity'] == 'HIGH' and quiet_result is None:
+    print(f"  ✓ PASS: {burst_result['rule_name']}: {burst_result['details']}")
+else:
+    print(f"  ✗ FAIL: Unexpected declarative results {burst_result}, {quiet_result}")
+
+# Test 7: Amount outlier against the user's own baseline
+print("\n" + "=" * 70)
+print("TEST 7: Amount Anomaly (per-user baseline)")
+print("=" * 70)
+anomaly_rule = AmountAnomalyRule()
+anomaly_user = f"USER_ANOMALY_{uuid.uuid4().hex[:12]}"
+
+def anomaly_txn(amount):
+    return Transaction(
+        transaction_id=f"TXN_ANOMALY_{uuid.uuid4().hex[:12]}",
+        user_id=anomaly_user,
+        amount=amount,
+        merchant_id="MERCHANT_LOCAL",
+        merchant_category="groceries",
+        payment_method="upi",
+        timestamp=datetime.now().isoformat()
+    )
+
+for amount in [1800, 2100, 1950, 2400, 2000, 1700, 2250, 1900, 2050, 2300, 2150, 1850]:
+    anomaly_rule.observe(anomaly_txn(amount), db)
+
+outlier_result = anomaly_rule.evaluate(anomaly_txn(90000), db)
+usual_result = anomaly_rule.evaluate(anomaly_txn(2600), db)
+
+if outlier_result and usual_result is None:
+    print(f"  ✓ PASS: {outlier_result['severity']} - {outlier_result['details']}")
+else:
+    print(f"  ✗ FAIL: Unexpected anomaly results {outlier_result}, {usual_result}")
+
+# Test 8: Many distinct users paying one merchant
+print("\n" + "=" * 70)
+print("TEST 8: Merchant Fan-In (count-min sketch)")
+print("=" * 70)
+fan_in_rule = MerchantFanInRule()
+fan_in_start = datetime.now()
+
+def merchant_txn(i, user_id, merchant_id):
+    return Transaction(
+        transaction_id=f"TXN_FANIN_{i}",
+        user_id=user_id,
+        amount=999,
+        merchant_id=merchant_id,
+        merchant_category="electronics",
+        payment_method="upi",
+        timestamp=(fan_in_start + timedelta(seconds=i)).isoformat()
+    )
+
+mule_results = []
+regular_results = []
+for i in range(config.MERCHANT_FANIN_HIGH):
+    for txn, results in [
+        (merchant_txn(i, f"USER_MULE_{i}", "MERCHANT_MULE"), mule_results),
+        (merchant_txn(i, "USER_REGULAR", "MERCHANT_REGULAR"), regular_results)
+    ]:
+        results.append(fan_in_rule.evaluate(txn, db))
+        fan_in_rule.observe(txn, db)
+
+if mule_results[-1] and mule_results[-1]['severity'] == 'HIGH' and not any(regular_results):
+    print(f"  ✓ PASS: {mule_results[-1]['details']}")
+else:
+    print(f"  ✗ FAIL: Unexpected fan-in results {mule_results[-1]}, {[r for r in regular_results if r][:1]}")
+
+# Test 9: One user paying many distinct merchants (card testing)
+print("\n" + "=" * 70)
+print("TEST 9: Merchant Diversity (HyperLogLog)")
+print("=" * 70)
+diversity_rule = MerchantDiversityRule()
+diversity_start = datetime.now() - timedelta(hours=1)
+tester_id = f"USER_CARDTEST_{uuid.uuid4().hex[:8]}"
+steady_id = f"USER_STEADY_{uuid.uuid4().hex[:8]}"
+
+def diversity_txn(i, user_id, merchant_id):
+    return Transaction(
+        transaction_id=f"TXN_DIVERSITY_{user_id}_{i}",
+        user_id=user_id,
+        amount=10,
+        merchant_id=merchant_id,
+        merchant_category=["electronics", "groceries", "travel"][i % 3],
+        payment_method="card",
+        timestamp=(diversity_start + timedelta(minutes=i)).isoformat()
+    )
+
+tester_results = []
+steady_results = []
+for i in range(config.MERCHANT_DIVERSITY_MERCHANTS_HIGH):
+    for txn, results in [
+        (diversity_txn(i, tester_id, f"MERCHANT_TEST_{i}"), tester_results),
+        (diversity_txn(i, steady_id, f"MERCHANT_STEADY_{i % 2}"), steady_results)
+    ]:
+        db.insert_transaction(txn)
+        results.append(diversity_rule.evaluate(txn, db))
+        diversity_rule.observe(txn, db)
+
+# A fresh rule has no state and must rebuild it from the stored window
+rebuilt_result = MerchantDiversityRule().evaluate(
+    diversity_txn(config.MERCHANT_DIVERSITY_MERCHANTS_HIGH, tester_id, "MERCHANT_TEST_NEW"), db
+)
+
+if (tester_results[-1] and tester_results[-1]['severity'] == 'HIGH' and not any(steady_results)
+        and rebuilt_result and rebuilt_result['severity'] == 'HIGH'):
+    print(f"  ✓ PASS: {tester_results[-1]['details']}")
+else:
+    print(f"  ✗ FAIL: Unexpected diversity results {tester_results[-1]}, {rebuilt_result}, "
+          f"{[r for r in steady_results if r][:1]}")
+
+# Its registers are per process, so it only runs when configured on
+if MerchantDiversityRule().is_enabled() == config.MERCHANT_DIVERSITY_ENABLED:
+    print("  ✓ PASS: Merchant diversity follows MERCHANT_DIVERSITY_ENABLED")
+else:
+    print("  ✗ FAIL: Merchant diversity ignores MERCHANT_DIVERSITY_ENABLED")
+
+# The window replay must not hold the rule's lock
+class LockProbeDatabase:
+    def __init__(self, rule):
+        self.rule = rule
+        self.lock_free = None
+    
+    def get_user_transactions_in_window(self, user_id, start_time, end_time):
+        self.lock_free = self.rule._lock.acquire(blocking=False)
+        if self.lock_free:
+            self.rule._lock.release()
+        return db.get_user_transactions_in_window(user_id, start_time, end_time)
+
+probe_rule = MerchantDiversityRule()
+probe_db = LockProbeDatabase(probe_rule)
+probe_result = probe_rule.evaluate(
+    diversity_txn(config.MERCHANT_DIVERSITY_MERCHANTS_HIGH, tester_id, "MERCHANT_TEST_NEW"), probe_db
+)
+if probe_db.lock_free and probe_result and probe_result['severity'] == 'HIGH':
+    print("  ✓ PASS: Diversity state rebuilt outside the rule lock")
+else:
+    print(f"  ✗ FAIL: Rebuild held the rule lock ({probe_db.lock_free}) or lost state {probe_result}")
+
 print("\n" + "=" * 70)
 print("ALL RULES TESTED SUCCESSFULLY!")
 print("=" * 70)
\ No newline at end of file
@@ -6,7 +6,18 @@ from database.db import Database
 from services.rule_engine import RuleEngine
 from services.alert_manager import AlertManager
 from services.transaction_service import TransactionService
-from datetime import datetime
+from services.ingest import ingest
+from services.user_state import UserStateManager
+from models.transaction import Transaction
+from datetime import datetime, timedelta
+import tempfile
+import config
+import json
+import uuid
+import os
+
+# In-memory user windows are opt-in; this script is the only writer to its database
+config.USER_STATE_MAX_BYTES = 64 * 1024 * 1024
 
 print("=" * 70)
 print("TESTING SERVICES LAYER")
@@ -106,6 +117,785 @@ print(f"   Total transactions: {stats['total_transactions']}")
 print(f"   Total amount: ₹{stats['total_amount']:,.0f}")
 print(f"   Average amount: ₹{stats['average_amount']:,.0f}")
 
+# Test idempotent replay
+print("\n9. Testing idempotency keys...")
+idempotency_key = f"IDEMPOTENCY_TEST_{datetime.now().timestamp()}"
+retry_data = {
+    'user_id': 'USER_IDEMPOTENCY_TEST',
+    'amount': 25000,
+    'merchant_id': 'MERCHANT_ABC',
+    'merchant_category': 'groceries',
+    'payment_method': 'upi'
+}
+
+first = transaction_service.process_transaction(dict(retry_data), idempotency_key=idempotency_key)
+transaction_service.idempotency_cache.clear()  # force the database backstop
+replay = transaction_service.process_transaction(dict(retry_data), idempotency_key=idempotency_key)
+retry_txns = transaction_service.get_transactions(user_id='USER_IDEMPOTENCY_TEST')
+
+if replay == first and len(retry_txns) == 1:
+    print(f"   ✓ PASS: Replay returned {first['transaction_id']} without re-processing")
+else:
+    print(f"   ✗ FAIL: Expected 1 stored transaction, found {len(retry_txns)}")
+
+from services.transaction_service import IdempotencyConflictError
+try:
+    transaction_service.process_transaction(dict(retry_data, amount=26000), idempotency_key=idempotency_key)
+    print("   ✗ FAIL: A reused key with a different body was processed")
+except IdempotencyConflictError:
+    print("   ✓ PASS: A reused key with a different body is refused")
+
+# Two services with their own connections, locks and caches stand in for two worker processes
+import threading
+other_db = Database()
+other_service = TransactionService(other_db, RuleEngine(), AlertManager(other_db))
+shared_key = f"IDEMPOTENCY_SHARED_{datetime.now().timestamp()}"
+shared_data = dict(retry_data, user_id='USER_IDEMPOTENCY_SHARED')
+start_together = threading.Barrier(2)
+shared_results = []
+
+def submit_shared(service):
+    start_together.wait()
+    shared_results.append(service.process_transaction(dict(shared_data), idempotency_key=shared_key))
+
+workers = [threading.Thread(target=submit_shared, args=(service,)) for service in (transaction_service, other_service)]
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+shared_txns = transaction_service.get_transactions(user_id='USER_IDEMPOTENCY_SHARED')
+if len(shared_txns) == 1 and len(shared_results) == 2 and shared_results[0] == shared_results[1]:
+    print("   ✓ PASS: Concurrent workers with one key stored one transaction and returned one decision")
+else:
+    print(f"   ✗ FAIL: Concurrent workers stored {len(shared_txns)} transactions for one key")
+
+from rules.base_rule import BaseRule
+from services.transaction_service import IdempotencyInProgressError
+
+class WriterProbeRule(BaseRule):
+    # While a keyed request is being scored, checks that the writer is free and the key is taken
+
+    reads_database = False
+
+    def __init__(self):
+        super().__init__("WRITER_PROBE")
+        self.findings = {}
+
+    def evaluate(self, transaction, db):
+        writer = threading.Thread(target=lambda: other_db.purge_idempotency_keys(config.IDEMPOTENCY_TTL_SECONDS))
+        writer.start()
+        writer.join(timeout=2)
+        self.findings['writer_free'] = not writer.is_alive()
+
+        saved_wait = config.IDEMPOTENCY_PENDING_WAIT_SECONDS
+        config.IDEMPOTENCY_PENDING_WAIT_SECONDS = 0
+        try:
+            other_service.process_transaction(dict(probe_data), idempotency_key=probe_key)
+            self.findings['duplicate'] = 'processed'
+        except IdempotencyInProgressError:
+            self.findings['duplicate'] = 'in_progress'
+        finally:
+            config.IDEMPOTENCY_PENDING_WAIT_SECONDS = saved_wait
+        return None
+
+probe_rule = WriterProbeRule()
+probe_key = f"IDEMPOTENCY_PROBE_{datetime.now().timestamp()}"
+probe_data = dict(retry_data, user_id='USER_IDEMPOTENCY_PROBE')
+probe_rules_engine = RuleEngine()
+probe_rules_engine.rules = [probe_rule]
+TransactionService(db, probe_rules_engine, alert_manager).process_transaction(dict(probe_data), idempotency_key=probe_key)
+if probe_rule.findings == {'writer_free': True, 'duplicate': 'in_progress'}:
+    print("   ✓ PASS: Keyed requests are scored without holding the writer; a duplicate meanwhile gets in-progress")
+else:
+    print(f"   ✗ FAIL: Keyed scoring held the writer or let a duplicate through: {probe_rule.findings}")
+
+class FailingRule(BaseRule):
+
+    def __init__(self):
+        super().__init__("FAILING")
+
+    def evaluate(self, transaction, db):
+        raise ZeroDivisionError("rule bug")
+
+failing_engine = RuleEngine()
+failing_engine.rules = [FailingRule()]
+failing_key = f"IDEMPOTENCY_FAILING_{datetime.now().timestamp()}"
+try:
+    TransactionService(db, failing_engine, alert_manager).process_transaction(dict(retry_data), idempotency_key=failing_key)
+except ZeroDivisionError:
+    pass
+if not db.execute_query("SELECT 1 FROM idempotency_keys WHERE idempotency_key = ?", (failing_key,)):
+    print("   ✓ PASS: A request that fails while scoring releases its key for the retry")
+else:
+    print("   ✗ FAIL: A failed request left its key reserved")
+
+db.execute_update(
+    "INSERT INTO idempotency_keys (idempotency_key, transaction_id, response, created_at) "
+    "VALUES ('IDEMPOTENCY_EXPIRED', 'TXN_EXPIRED', '{}', datetime('now', '-2 days'))"
+)
+db.purge_idempotency_keys(config.IDEMPOTENCY_TTL_SECONDS)
+if not db.execute_query("SELECT 1 FROM idempotency_keys WHERE idempotency_key = 'IDEMPOTENCY_EXPIRED'"):
+    print("   ✓ PASS: Expired idempotency keys are purged")
+else:
+    print("   ✗ FAIL: Expired idempotency key survived the purge")
+
+# Test bulk alert resolution
+print("\n10. Testing bulk alert resolution...")
+bulk_ids = [alert['alert_id'] for alert in result2['alerts']]
+bulk = alert_manager.resolve_alerts(
+    resolution='FALSE_POSITIVE',
+    reviewed_by='COMPLIANCE_TEST',
+    alert_ids=bulk_ids + ['ALERT_DOES_NOT_EXIST']
+)
+print(f"   Resolved: {bulk['resolved']}, not found: {bulk['not_found']}")
+
+resolved_statuses = {alert_manager.get_alert_by_id(alert_id).status for alert_id in bulk_ids}
+if bulk['resolved'] == len(bulk_ids) and bulk['not_found'] == ['ALERT_DOES_NOT_EXIST'] \
+        and resolved_statuses == {'FALSE_POSITIVE'}:
+    print("   ✓ PASS: Bulk resolution updated every alert and reported the missing ID")
+else:
+    print("   ✗ FAIL: Bulk resolution result is wrong")
+
+repeat = alert_manager.resolve_alerts(resolution='APPROVED', reviewed_by='SECOND_REVIEWER', alert_ids=bulk_ids)
+repeated = [alert_manager.get_alert_by_id(alert_id) for alert_id in bulk_ids]
+if repeat['resolved'] == 0 and repeat['not_found'] == [] \
+        and all(a.status == 'FALSE_POSITIVE' and a.resolved_by == 'COMPLIANCE_TEST' for a in repeated):
+    print("   ✓ PASS: Resolving the same alerts twice kept the first resolver")
+else:
+    print(f"   ✗ FAIL: Second bulk resolution overwrote the first {repeat}")
+
+from utils.validators import validate_bulk_alert_resolution
+
+blank_filters = [
+    validate_bulk_alert_resolution({'filter': bad_filter, 'resolution': 'APPROVED', 'reviewed_by': 'COMPLIANCE_TEST'})[0]
+    for bad_filter in [{'rule_name': ''}, {'severity': None}, {'severity': 'SEVERE'}, {'rule_name': '  '}]
+]
+narrow_filter = validate_bulk_alert_resolution(
+    {'filter': {'rule_name': 'VELOCITY', 'severity': 'HIGH'}, 'resolution': 'APPROVED', 'reviewed_by': 'COMPLIANCE_TEST'}
+)
+if not any(blank_filters) and narrow_filter == (True, None):
+    print("   ✓ PASS: Blank, null and unknown filter values are rejected")
+else:
+    print(f"   ✗ FAIL: Filter validation accepted a value it should reject: {blank_filters}")
+
+if alert_manager.resolve_alert('ALERT_DOES_NOT_EXIST', 'APPROVED', 'COMPLIANCE_TEST') is None:
+    print("   ✓ PASS: Resolving a missing alert reports not found")
+else:
+    print("   ✗ FAIL: Missing alert should not resolve")
+
+# Test streaming file ingestion
+print("\n11. Testing file ingestion...")
+with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+    for i in range(5):
+        f.write(json.dumps(dict(transaction_data, amount=1000 + i, user_id='USER_INGEST_TEST')) + '\n')
+    f.write('{"user_id": "USER_INGEST_TEST", "amount": -5}\n')
+    ingest_path = f.name
+
+try:
+    report = ingest(transaction_service, ingest_path, checkpoint=f"test-{datetime.now().timestamp()}")
+    resumed = ingest(transaction_service, ingest_path, checkpoint=report.source, resume=True)
+finally:
+    os.remove(ingest_path)
+
+print(f"   Accepted: {report.accepted}, rejected: {report.rejected}, commits: {report.commits}")
+if report.accepted == 5 and report.rejected == 1 and resumed.records == 0:
+    print("   ✓ PASS: File ingested in one pass and resume skipped committed records")
+else:
+    print("   ✗ FAIL: Unexpected ingestion counts")
+
+# Test per-user ordering under concurrency
+print("\n12. Testing concurrent transactions for one user...")
+from concurrent.futures import ThreadPoolExecutor
+
+concurrent_user = f"USER_ORDERED_{uuid.uuid4().hex[:12]}"
+with ThreadPoolExecutor(max_workers=8) as pool:
+    concurrent_results = list(pool.map(
+        lambda i: transaction_service.process_transaction(dict(transaction_data, user_id=concurrent_user, amount=1000)),
+        range(8)
+    ))
+
+minute_counts = sorted(
+    int(alert['details'].split()[2])
+    for r in concurrent_results for alert in r['alerts']
+    if alert['rule_name'] == 'VELOCITY' and 'last minute' in alert['details']
+)
+print(f"   Per-minute counts seen by VELOCITY: {minute_counts}")
+if minute_counts == list(range(config.VELOCITY_MAX_PER_MINUTE, 9)) \
+        and transaction_service.executor.stats()['active_keys'] == 0:
+    print("   ✓ PASS: Each transaction saw exactly the ones before it; idle user released")
+else:
+    print("   ✗ FAIL: Window counts depend on interleaving")
+
+# Test in-memory user windows
+print("\n13. Testing bounded user state...")
+
+state = UserStateManager(db, max_users=2)
+state_users = [f"USER_STATE_{uuid.uuid4().hex[:12]}" for _ in range(3)]
+for user in state_users:
+    for i in range(3):
+        transaction_service.process_transaction(dict(transaction_data, user_id=user, amount=500 + i))
+
+day_start = (datetime.now() - timedelta(days=1)).isoformat()
+first_read = state.get_user_transactions_in_window(state_users[0], day_start)
+extra = Transaction.from_dict(dict(transaction_data, user_id=state_users[0], amount=777))
+db.insert_transaction(extra)
+state.record(extra)
+second_read = state.get_user_transactions_in_window(state_users[0], day_start)
+for user in state_users:
+    state.get_user_transactions_in_window(user, day_start)
+evicted_read = state.get_user_transactions_in_window(state_users[0], day_start)
+
+expected_ids = [row['transaction_id'] for row in db.get_user_transactions_in_window(state_users[0], day_start)]
+state_stats = state.stats()
+print(f"   Hits: {state_stats['hits']}, rehydrations: {state_stats['rehydrations']}, evictions: {state_stats['evictions']}")
+if len(first_read) == 3 and [row['transaction_id'] for row in second_read] == expected_ids \
+        and [row['transaction_id'] for row in evicted_read] == expected_ids \
+        and state_stats['evictions'] >= 1 and state_stats['users'] == 2:
+    print("   ✓ PASS: Windows match the database across recording, eviction and rehydration")
+else:
+    print("   ✗ FAIL: In-memory window diverged from the database")
+
+widening_engine = RuleEngine()
+widening_state = UserStateManager(db, rule_engine=widening_engine)
+widening_engine.window_seconds += 86400
+if widening_state.window_seconds == widening_engine.window_seconds:
+    print("   ✓ PASS: Trim window follows the rule engine after a reload widens it")
+else:
+    print("   ✗ FAIL: Trim window was fixed at construction")
+
+# Test snapshot and warm restart
+print("\n14. Testing rule state snapshot...")
+from services.snapshot import write_snapshot, restore_snapshot
+
+snapshot_path = os.path.join(tempfile.mkdtemp(), 'state.snapshot')
+write_snapshot(transaction_service, snapshot_path)
+late = transaction_service.process_transaction(dict(transaction_data, user_id=concurrent_user, amount=1000))
+# Stored after the snapshot but timestamped long before it, outside the replay margin
+backdated = transaction_service.process_transaction(dict(
+    transaction_data, user_id=concurrent_user, amount=1100,
+    timestamp=(datetime.now() - timedelta(minutes=30)).isoformat()
+))
+
+restarted = TransactionService(db, RuleEngine(), AlertManager(db))
+restore = restore_snapshot(restarted, snapshot_path)
+os.remove(snapshot_path)
+
+hour_start = (datetime.now() - timedelta(hours=1)).isoformat()
+restored_ids = [row['transaction_id'] for row in restarted.user_state.get_user_transactions_in_window(concurrent_user, hour_start)]
+stored_ids = [row['transaction_id'] for row in db.get_user_transactions_in_window(concurrent_user, hour_start)]
+print(f"   Users: {restore['users']}, rules: {restore['rules']}, replayed: {restore['replayed']}")
+if restore['loaded'] and late['transaction_id'] in restored_ids and backdated['transaction_id'] in restored_ids \
+        and restored_ids == stored_ids \
+        and restarted.user_state.stats()['rehydrations'] == 0:
+    print("   ✓ PASS: Restarted service resumed with the snapshot plus the transactions after it")
+else:
+    print("   ✗ FAIL: Restored state is incomplete")
+
+with open(snapshot_path, 'wb') as f:
+    f.write(b'TMSNAP\x02\x00')
+corrupt = restore_snapshot(TransactionService(db, RuleEngine(), AlertManager(db)), snapshot_path)
+os.remove(snapshot_path)
+if not corrupt['loaded'] and corrupt['reason'].startswith('unreadable'):
+    print("   ✓ PASS: A truncated snapshot is reported and skipped, not raised")
+else:
+    print(f"   ✗ FAIL: Truncated snapshot gave {corrupt}")
+
+# Test the alert work queue
+print("\n15. Testing alert claims and leases...")
+queue_txn = transaction_service.process_transaction(dict(transaction_data, amount=750000))
+first_claim = alert_manager.claim_alerts('ANALYST_A', limit=config.ALERT_CLAIM_MAX_BATCH)
+second_claim = alert_manager.claim_alerts('ANALYST_B', limit=config.ALERT_CLAIM_MAX_BATCH)
+first_ids = {alert.alert_id for alert in first_claim}
+ranks = [config.ALERT_SEVERITY_PRIORITY.index(alert.severity) for alert in first_claim]
+
+stolen = alert_manager.renew_leases('ANALYST_B', [alert.alert_id for alert in first_claim[:1]])
+released = alert_manager.release_leases('ANALYST_A', [alert.alert_id for alert in first_claim[:1]])
+reclaimed = alert_manager.claim_alerts('ANALYST_B', limit=1, severities=[first_claim[0].severity]) if first_claim else []
+resolved_leased = alert_manager.resolve_alert(first_claim[-1].alert_id, 'APPROVED', 'ANALYST_A') if first_claim else None
+
+print(f"   Claimed: {len(first_claim)} then {len(second_claim)}, reclaimed after release: {len(reclaimed)}")
+if first_claim and ranks == sorted(ranks) and not first_ids & {alert.alert_id for alert in second_claim} \
+        and all(alert.lease_owner == 'ANALYST_A' for alert in first_claim) \
+        and stolen['renewed'] == [] and len(released['released']) == 1 and len(reclaimed) == 1 \
+        and resolved_leased.lease_owner is None:
+    print("   ✓ PASS: Claims are disjoint, severity-ordered, owner-only, and resolving frees the lease")
+else:
+    print("   ✗ FAIL: Work queue leases are wrong")
+
+# Test chunked export
+print("\n16. Testing chunked export...")
+import csv
+import gzip
+from services.export import ExportManager, iter_chunks
+
+exports = ExportManager(db, export_dir=tempfile.mkdtemp(), max_workers=1)
+export_job = exports.submit('transactions', fmt='csv.gz', user_id=concurrent_user)
+exports.shutdown()
+
+with gzip.open(export_job.path, 'rt', newline='') as f:
+    exported_ids = [row['transaction_id'] for row in csv.DictReader(f)]
+stored_ids = [row['transaction_id'] for row in transaction_service.get_transactions(user_id=concurrent_user)]
+print(f"   Status: {export_job.status}, rows: {export_job.rows_written}/{export_job.total_rows}, bytes: {export_job.bytes_written:,}")
+if export_job.status == 'COMPLETED' and sorted(exported_ids) == sorted(stored_ids) \
+        and export_job.rows_written == export_job.total_rows == len(stored_ids):
+    print("   ✓ PASS: Export holds exactly the filtered rows")
+else:
+    print("   ✗ FAIL: Export is incomplete or unfiltered")
+
+tied_user = f"USER_TIED_{uuid.uuid4().hex[:12]}"
+tied_time = datetime.now().isoformat()
+for amount in [10, 20, 30, 40, 50]:
+    db.insert_transaction(Transaction.from_dict(dict(transaction_data, user_id=tied_user, amount=amount, timestamp=tied_time)))
+chunks = list(iter_chunks(db, 'transactions', {'user_id': tied_user}, chunk_rows=2))
+chunked_ids = [row['transaction_id'] for rows in chunks for row in rows]
+if len(chunked_ids) == 5 and len(set(chunked_ids)) == 5 and [len(rows) for rows in chunks] == [2, 2, 1]:
+    print("   ✓ PASS: Keyset chunks resume within a shared timestamp without gaps or repeats")
+else:
+    print("   ✗ FAIL: Keyset chunks skipped or repeated rows")
+
+exports.retention_seconds = 0
+pruned = exports.prune()
+if pruned == 1 and exports.get(export_job.job_id) is None and not os.path.exists(export_job.path):
+    print("   ✓ PASS: Finished jobs and their files are pruned after the retention period")
+else:
+    print("   ✗ FAIL: Expired export job was kept")
+
+# Test the columnar archive
+print("\n17. Testing columnar archive...")
+from analytics.archive import Archive, build_archive
+
+archive_root = tempfile.mkdtemp()
+today = datetime.now().date().isoformat()
+build_archive(db, archive_root, today, today)
+archive = Archive(archive_root)
+archived = archive.load_day(today)
+
+stored = db.execute_query(
+    "SELECT COUNT(*) AS n, SUM(amount) AS total FROM transactions WHERE timestamp >= ? AND timestamp < ?",
+    (today, (datetime.now().date() + timedelta(days=1)).isoformat())
+)[0]
+users = archived['user']
+user_code = archive.code('user', concurrent_user)
+user_times = archived['ts'][users == user_code]
+print(f"   Rows: {len(users)}, users: {len(archive.dictionaries['users'])}")
+if len(users) == stored['n'] and abs(float(archived['amount'].sum()) - stored['total']) < 0.01 \
+        and (users[1:] >= users[:-1]).all() and (user_times[1:] >= user_times[:-1]).all() \
+        and len(user_times) == len(transaction_service.get_transactions(user_id=concurrent_user)):
+    print("   ✓ PASS: Archived day matches the database, sorted by user and time")
+else:
+    print("   ✗ FAIL: Archived day differs from the database")
+
+# Test the what-if simulator against the rule engine
+print("\n18. Testing what-if simulator...")
+from analytics.simulator import Simulator, SEVERITIES
+
+simulation_db = Database(os.path.join(tempfile.mkdtemp(), 'simulation.db'))
+simulation_service = TransactionService(simulation_db, RuleEngine(), AlertManager(simulation_db))
+simulated_day = (datetime.now().date() - timedelta(days=1)).isoformat()
+simulated_time = datetime.fromisoformat(simulated_day)
+for i in range(120):
+    simulated_time += timedelta(seconds=[2, 15, 40, 300][i % 4])
+    simulation_service.process_transaction(dict(
+        transaction_data,
+        user_id=f"USER_SIM_{i % 7}",
+        amount=[900, 250000, 620000, 40000][i % 5 % 4],
+        merchant_category=['groceries', 'crypto_exchange', 'jewelry'][i % 3],
+        timestamp=simulated_time.isoformat()
+    ))
+
+simulation_archive = os.path.join(tempfile.mkdtemp(), 'archive')
+build_archive(simulation_db, simulation_archive, simulated_day, simulated_day)
+archive = Archive(simulation_archive)
+simulator = Simulator(archive.load_day(simulated_day), archive.dictionaries['categories'].values)
+simulated = simulator.run({})[0]['alerts']
+
+raised = {
+    (row['rule_name'], row['severity']): row['n']
+    for row in simulation_db.execute_query("SELECT rule_name, severity, COUNT(*) AS n FROM alerts GROUP BY rule_name, severity")
+}
+mismatches = [
+    (rule, severity) for rule, severities in SEVERITIES.items() for severity in severities
+    if simulated[rule][severity] != raised.get((rule, severity), 0)
+]
+print(f"   Simulated alerts: {sum(sum(s.values()) for s in simulated.values())}, mismatches: {mismatches}")
+if not mismatches:
+    print("   ✓ PASS: Simulated baseline matches the alerts the engine raised")
+else:
+    print("   ✗ FAIL: Simulator disagrees with the rule engine")
+
+# Test shadow rules
+print("\n19. Testing shadow rule evaluation...")
+from services.shadow import ShadowEvaluator
+
+shadow = ShadowEvaluator(db, workers=1)
+shadow.load('rules/shadow_rules.example.json')
+rule_engine.shadow = shadow.start()
+shadowed = transaction_service.process_transaction(dict(transaction_data, amount=450000))
+live_alerts = {alert['rule_name'] for alert in shadowed['alerts']}
+shadow.stop()
+rule_engine.shadow = None
+
+shadow_rows = db.execute_query(
+    "SELECT rule_name FROM shadow_alerts WHERE transaction_id = ?",
+    (shadowed['transaction_id'],)
+)
+shadow_stats = shadow.stats()
+print(f"   Live alerts: {sorted(live_alerts)}, shadow alerts: {[row['rule_name'] for row in shadow_rows]}")
+if 'AMOUNT_THRESHOLD_400K' in {row['rule_name'] for row in shadow_rows} \
+        and not live_alerts & {rule.name for rule in shadow.rules} \
+        and shadow_stats['evaluated'] == shadow_stats['submitted'] == 1 and shadow_stats['shed'] == 0:
+    print("   ✓ PASS: Candidate rules recorded would-be alerts without touching the live decision")
+else:
+    print("   ✗ FAIL: Shadow evaluation did not record the expected alerts")
+
+# Test rule time budgets and the database circuit breaker
+print("\n20. Testing rule budgets and degraded mode...")
+import sqlite3
+
+try:
+    with db.deadline(0):
+        db.execute_query("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10000000) SELECT COUNT(*) FROM n")
+    interrupted = False
+except sqlite3.OperationalError:
+    interrupted = True
+
+database_rules = {rule.name for rule in RuleEngine().get_active_rules() if rule.reads_database}
+saved_budget, saved_failures = config.RULE_BUDGET_MS, config.RULE_BREAKER_FAILURES
+config.RULE_BUDGET_MS = 0.001  # every database rule overruns
+config.RULE_BREAKER_FAILURES = len(database_rules)  # so the first transaction alone opens the breaker
+budgeted_engine = RuleEngine()
+budgeted_service = TransactionService(db, budgeted_engine, alert_manager)
+overrun = budgeted_service.process_transaction(dict(transaction_data, user_id="USER_BUDGET", amount=600000))
+tripped = budgeted_service.process_transaction(dict(transaction_data, user_id="USER_BUDGET", amount=600000))
+config.RULE_BUDGET_MS, config.RULE_BREAKER_FAILURES = saved_budget, saved_failures
+
+print(f"   First: {[(r['rule_name'], r['reason']) for r in overrun['degraded_rules']]}")
+print(f"   Second: {[(r['rule_name'], r['reason']) for r in tripped['degraded_rules']]}")
+if interrupted and {r['rule_name'] for r in tripped['degraded_rules']} == database_rules \
+        and all(r['status'] == 'SKIPPED' and r['reason'] == 'circuit_open' for r in tripped['degraded_rules']) \
+        and 'AMOUNT_THRESHOLD' in {alert['rule_name'] for alert in tripped['alerts']} \
+        and budgeted_engine.stats()['breaker']['state'] == 'OPEN':
+    print("   ✓ PASS: Overrunning rules opened the breaker; stateless rules still decided")
+else:
+    print("   ✗ FAIL: Budgets or breaker did not degrade as expected")
+
+if db.get_user_amount_stats("USER_BUDGET") is None:
+    print("   ✓ PASS: Rules that missed their budget skipped their database state update")
+else:
+    print("   ✗ FAIL: A degraded rule still wrote its state")
+
+from rules.base_rule import BaseRule
+from utils.circuit_breaker import CircuitBreaker
+
+class BrokenRule(BaseRule):
+
+    def __init__(self):
+        super().__init__("BROKEN")
+
+    def evaluate(self, transaction, db):
+        raise ValueError("bad expression")
+
+probe_engine = RuleEngine()
+probe_engine.rules = [BrokenRule()]
+probe_engine.breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0)
+probe_engine.breaker.record_failure()
+try:
+    probe_engine.evaluate_with_status(Transaction.from_dict(transaction_data), db)
+except ValueError:
+    pass
+if probe_engine.breaker.allow():
+    print("   ✓ PASS: A probe that raised a non-database error released the half-open breaker")
+else:
+    print("   ✗ FAIL: The breaker is stuck waiting for its probe")
+
+# A long write under an expired deadline, inside a batch: an interrupt here would roll back the batch
+deadline_txn = Transaction.from_dict(dict(transaction_data, user_id="USER_DEADLINE_WRITE"))
+try:
+    with db.write_batch():
+        db.insert_transaction(deadline_txn)
+        with db.deadline(0):
+            db.execute_update(
+                "UPDATE user_amount_stats SET updated_at = updated_at WHERE user_id IN ("
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200000) "
+                "SELECT 'USER_' || i FROM n)"
+            )
+    write_interrupted = False
+except sqlite3.OperationalError:
+    write_interrupted = True
+if not write_interrupted and db.get_transaction(deadline_txn.transaction_id) is not None:
+    print("   ✓ PASS: A write past the deadline ran to the end and its batch committed")
+else:
+    print("   ✗ FAIL: The deadline interrupted a write inside a batch")
+
+lost_first = Transaction.from_dict(dict(transaction_data, user_id="USER_LOST_BATCH"))
+lost_second = Transaction.from_dict(dict(transaction_data, user_id="USER_LOST_BATCH"))
+try:
+    with db.write_batch():
+        db.insert_transaction(lost_first)
+        # Stands in for SQLite rolling the transaction back on its own, e.g. on a full disk
+        db._get_writer().rollback()
+        db.insert_transaction(lost_second)
+    lost_batch_raised = False
+except sqlite3.OperationalError:
+    lost_batch_raised = True
+if lost_batch_raised and not db.execute_query("SELECT 1 FROM transactions WHERE user_id = 'USER_LOST_BATCH'"):
+    print("   ✓ PASS: A batch that SQLite rolled back fails instead of committing its remainder")
+else:
+    print("   ✗ FAIL: The rest of a rolled-back batch was committed on its own")
+
+# Test admission control lanes
+print("\n21. Testing admission control...")
+import threading
+import time
+from services.admission import AdmissionController, classify
+
+admission = AdmissionController(
+    max_in_flight=1,
+    queue_sizes={'priority': 1, 'standard': 1},
+    queue_timeouts_ms={'priority': 2000, 'standard': 2000}
+)
+admission_order = []
+
+def wait_for_slot(lane):
+    if admission.acquire(lane)[0]:
+        admission_order.append(lane)
+        admission.release()
+
+admission.acquire('standard')
+waiters = []
+for lane in ['standard', 'priority']:
+    waiters.append(threading.Thread(target=wait_for_slot, args=(lane,)))
+    waiters[-1].start()
+    while admission.stats()['queued'][lane] == 0:
+        time.sleep(0.001)
+overflow = admission.acquire('standard')
+admission.release()
+for waiter in waiters:
+    waiter.join()
+
+timed_out = AdmissionController(1, {'priority': 1, 'standard': 1}, {'priority': 50, 'standard': 50})
+timed_out.acquire('priority')
+late = timed_out.acquire('standard')
+
+lanes = [classify(dict(transaction_data, amount=amount, merchant_category=category))
+         for amount, category in [(500, 'groceries'), (250000, 'groceries'), (500, 'crypto_exchange')]]
+admission_stats = admission.stats()
+print(f"   Order: {admission_order}, overflow: {overflow}, late: {late}, lanes: {lanes}")
+if admission_order == ['priority', 'standard'] and overflow == (False, 'queue_full') \
+        and late == (False, 'timeout') and lanes == ['standard', 'priority', 'priority'] \
+        and admission_stats['in_flight'] == 0 and admission_stats['rejected']['standard']['queue_full'] == 1:
+    print("   ✓ PASS: Priority lane admitted first; full and expired queues rejected")
+else:
+    print("   ✗ FAIL: Admission control did not order or shed as expected")
+
+# Test cached GET responses
+print("\n22. Testing response cache and ETags...")
+from flask import Flask
+from api.routes import api, init_routes
+
+cache_app = Flask(__name__)
+cache_app.register_blueprint(api)
+init_routes(transaction_service, alert_manager)
+client = cache_app.test_client()
+
+cached_alert_id = result2['alerts'][0]['alert_id']
+first_get = client.get(f'/api/alerts/{cached_alert_id}')
+etag = first_get.headers.get('ETag')
+not_modified = client.get(f'/api/alerts/{cached_alert_id}', headers={'If-None-Match': etag})
+
+# A second Database on the same file stands in for another worker process
+Database(db.db_path).update_alert_status(cached_alert_id, 'INVESTIGATING', notes='updated elsewhere')
+after_outside_write = client.get(f'/api/alerts/{cached_alert_id}', headers={'If-None-Match': etag})
+
+print(f"   Statuses: {first_get.status_code}, {not_modified.status_code}, {after_outside_write.status_code}")
+if first_get.status_code == 200 and etag and not_modified.status_code == 304 \
+        and after_outside_write.status_code == 200 \
+        and after_outside_write.get_json()['status'] == 'INVESTIGATING' \
+        and after_outside_write.headers.get('ETag') != etag:
+    print("   ✓ PASS: Matching ETag got 304; another process's update invalidated the entry")
+else:
+    print("   ✗ FAIL: Cached response was stale or not conditional")
+
+from models.alert import Alert
+
+batch_open = threading.Event()
+batch_may_commit = threading.Event()
+
+def write_alert_in_batch():
+    with db.write_batch():
+        db.insert_alert(Alert.create_from_rule_result(
+            result2['transaction_id'], {'rule_name': 'BATCH_RULE', 'severity': 'LOW', 'details': 'written in a batch'}
+        ))
+        batch_open.set()
+        batch_may_commit.wait()
+
+alerts_before = client.get('/api/alerts').get_json()['count']
+batch_writer = threading.Thread(target=write_alert_in_batch)
+batch_writer.start()
+batch_open.wait()
+during_batch = client.get('/api/alerts').get_json()['count']
+batch_may_commit.set()
+batch_writer.join()
+after_commit = client.get('/api/alerts').get_json()['count']
+
+print(f"   Alert count: before {alerts_before}, during batch {during_batch}, after commit {after_commit}")
+if during_batch == alerts_before and after_commit == alerts_before + 1:
+    print("   ✓ PASS: A listing cached during an open batch is replaced once the batch commits")
+else:
+    print("   ✗ FAIL: A listing cached before the commit outlived it")
+
+# Test the socket decision protocol
+print("\n23. Testing socket framing and pipelining...")
+import socket
+from api.socket_server import CODECS, create_server
+
+for framing in ['line', 'length']:
+    server = create_server(transaction_service, 'tcp:127.0.0.1:0', framing)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    codec = CODECS[framing]()
+
+    frames = b''.join(
+        codec.encode(dict(transaction_data, user_id=f"USER_SOCKET_{i}", request_id=f"req-{i}")) for i in range(3)
+    ) + codec.encode({'request_id': 'req-bad', 'amount': 'not a number'})
+    with socket.create_connection(server.server_address) as client_socket:
+        # Sent split mid-frame, so the server has to reassemble before answering
+        client_socket.sendall(frames[:7])
+        time.sleep(0.05)
+        client_socket.sendall(frames[7:])
+
+        replies = []
+        received = bytearray()
+        while len(replies) < 4:
+            received += client_socket.recv(65536)
+            decoded, consumed = codec.split(received, config.SOCKET_MAX_FRAME_BYTES)
+            del received[:consumed]
+            replies += [json.loads(frame) for frame in decoded]
+    server.shutdown()
+    server.server_close()
+
+    print(f"   {framing}: {[reply.get('request_id') for reply in replies]}")
+    if [reply.get('request_id') for reply in replies] == ['req-0', 'req-1', 'req-2', 'req-bad'] \
+            and all('transaction_id' in reply for reply in replies[:3]) and 'error' in replies[3]:
+        print(f"   ✓ PASS: Pipelined {framing} frames answered in request order")
+    else:
+        print(f"   ✗ FAIL: {framing} framing replies are missing or out of order")
+
+# Test the read-only / writer connection split
+print("\n24. Testing read-only connections and read snapshots...")
+try:
+    with db.get_connection(readonly=True) as conn:
+        conn.execute("DELETE FROM alerts WHERE alert_id = ?", (cached_alert_id,))
+    read_only_rejected = False
+except sqlite3.OperationalError:
+    read_only_rejected = True
+
+snapshot_user = f"USER_SNAPSHOT_{uuid.uuid4().hex[:12]}"
+count_query = "SELECT COUNT(*) AS n FROM transactions WHERE user_id = ?"
+with db.read_snapshot():
+    before_write = db.execute_query(count_query, (snapshot_user,))[0]['n']
+    db.insert_transaction(Transaction.from_dict(dict(transaction_data, user_id=snapshot_user)))
+    inside_snapshot = db.execute_query(count_query, (snapshot_user,))[0]['n']
+after_snapshot = db.execute_query(count_query, (snapshot_user,))[0]['n']
+
+print(f"   Counts: before {before_write}, inside snapshot {inside_snapshot}, after {after_snapshot}")
+if read_only_rejected:
+    print("   ✓ PASS: Read-only connections reject writes")
+else:
+    print("   ✗ FAIL: A read-only connection accepted a write")
+if before_write == inside_snapshot == 0 and after_snapshot == 1:
+    print("   ✓ PASS: Reads inside read_snapshot() see one snapshot; the writer's commit shows after it")
+else:
+    print("   ✗ FAIL: read_snapshot() reads were not pinned to one snapshot")
+
+# Test read-through object caches
+print("\n25. Testing object cache invalidation...")
+cache_result = transaction_service.process_transaction(dict(suspicious_data, user_id=f"USER_CACHE_{uuid.uuid4().hex[:12]}"))
+single_id, bulk_id = [alert['alert_id'] for alert in cache_result['alerts'][:2]]
+
+alert_manager.get_alert_by_id(single_id)
+alert_manager.get_alert_by_id(bulk_id)
+was_cached = db.alert_cache.get(single_id) is not None and db.alert_cache.get(bulk_id) is not None
+
+resolved_single = alert_manager.resolve_alert(single_id, 'APPROVED', 'analyst_cache')
+alert_manager.resolve_alerts('FALSE_POSITIVE', 'analyst_cache', alert_ids=[bulk_id])
+resolved_bulk = alert_manager.get_alert_by_id(bulk_id)
+
+print(f"   Statuses after resolving: {resolved_single.status}, {resolved_bulk.status}")
+if was_cached and resolved_single.status == 'APPROVED' and resolved_bulk.status == 'FALSE_POSITIVE' \
+        and resolved_bulk.resolved_by == 'analyst_cache':
+    print("   ✓ PASS: Single and bulk resolutions replaced the cached alert rows")
+else:
+    print("   ✗ FAIL: A cached alert outlived its update")
+
+uncommitted = Transaction.from_dict(dict(transaction_data, user_id="USER_UNCOMMITTED"))
+batch_open = threading.Event()
+batch_may_finish = threading.Event()
+
+def insert_then_roll_back():
+    try:
+        with db.write_batch():
+            db.insert_transaction(uncommitted)
+            batch_open.set()
+            batch_may_finish.wait()
+            raise RuntimeError("roll back")
+    except RuntimeError:
+        pass
+
+rolled_back_writer = threading.Thread(target=insert_then_roll_back)
+rolled_back_writer.start()
+batch_open.wait()
+seen_before_commit = db.get_transaction(uncommitted.transaction_id)
+batch_may_finish.set()
+rolled_back_writer.join()
+seen_after_rollback = db.get_transaction(uncommitted.transaction_id)
+
+if seen_before_commit is None and seen_after_rollback is None:
+    print("   ✓ PASS: Rows from an open or rolled-back batch are never served from the cache")
+else:
+    print("   ✗ FAIL: The transaction cache served a row that was not committed")
+
+# Test the compact storage layout
+print("\n26. Testing compact transaction storage...")
+from database.compact import convert, is_compact
+
+compact_path = os.path.join(tempfile.mkdtemp(), 'compact.db')
+before_convert = Transaction.from_dict(dict(transaction_data, user_id="USER_COMPACT", amount=1234.56))
+Database(compact_path).insert_transaction(before_convert)
+converted = convert(compact_path)
+
+# A fresh Database, so nothing is served from the object cache of the one that inserted
+compact_db = Database(compact_path)
+through_view = [
+    Transaction.from_dict(dict(transaction_data, user_id="USER_COMPACT", amount=99.99)),
+    Transaction.from_dict(dict(transaction_data, user_id="USER_COMPACT_NEW", merchant_id="MERCHANT_COMPACT",
+                               merchant_category="jewelry", amount=0.01, is_international=True,
+                               merchant_country="AE", location="Dubai"))
+]
+for transaction in through_view:
+    compact_db.insert_transaction(transaction)
+
+compared = ['transaction_id', 'user_id', 'amount', 'merchant_id', 'merchant_category', 'payment_method',
+            'timestamp', 'location', 'is_international', 'merchant_country']
+read_back = Database(compact_path).execute_query(
+    "SELECT * FROM transactions WHERE user_id IN (?, ?) ORDER BY amount DESC", ("USER_COMPACT", "USER_COMPACT_NEW")
+)
+expected_rows = [
+    dict(transaction.to_dict(), is_international=int(transaction.is_international), merchant_country=transaction.merchant_country or 'IN')
+    for transaction in [before_convert] + through_view
+]
+with compact_db.get_connection(readonly=True) as conn:
+    compact = is_compact(conn)
+    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    positions = [row[0] for row in conn.execute("SELECT transaction_id FROM transaction_facts ORDER BY txn_key")]
+
+print(f"   Converted: {converted}, rows: {len(read_back)}, users: {users}")
+if converted and compact and [{key: row[key] for key in compared} for row in read_back] == \
+        [{key: row[key] for key in compared} for row in expected_rows] \
+        and users == 2 and positions == [before_convert.transaction_id] + [t.transaction_id for t in through_view]:
+    print("   ✓ PASS: Rows converted and inserted through the view read back unchanged, in insertion order")
+else:
+    print("   ✗ FAIL: Compact storage changed a row or its order")
+
 print("\n" + "=" * 70)
 print("SERVICES LAYER - ALL TESTS COMPLETE!")
 print("=" * 70)
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Query plan audit
+Runs the seeded API workload against both storage layouts and fails on any
+full scan or temp B-tree that is not listed in ALLOWED_SCANS.
+"""
+
+from database.query_audit import audit
+
+
+def test_row_storage_has_no_unexpected_scans():
+
+    assert audit() == 0
+
+
+def test_compact_storage_has_no_unexpected_scans():
+
+    assert audit(compact=True) == 0
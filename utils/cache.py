@@ -0,0 +1,125 @@
+"""
+In-process caching helpers
+Bounded LRU cache with optional per-entry time-to-live and byte budget
+"""
+
+from collections import OrderedDict
+from dataclasses import is_dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import threading
+import sys
+import time
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and, optionally, total size"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, size: int = 0):
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never worth evicting everything else for one oversized value
+            self.invalidate(key)
+            return
+
+        expires_at = None
+        if self.ttl_seconds:
+            expires_at = time.monotonic() + self.ttl_seconds
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires_at, size)
+            self.current_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.current_bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions
+        }
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+
+        # Least recently used first; putting them back in this order restores recency
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def _remove(self, key: Hashable):
+
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def __len__(self) -> int:
+
+        return len(self._entries)
+
+
+def estimate_size(value: Any) -> int:
+
+    # Shallow-plus-one-level estimate: good enough to budget rows and small objects
+    if is_dataclass(value):
+        value = vars(value)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
@@ -0,0 +1,82 @@
+"""
+Circuit breaker
+Stops calling a dependency after repeated failures, so callers fail fast
+instead of queueing behind it. After a cooldown one probe call is let
+through; its outcome closes the breaker or restarts the cooldown.
+"""
+
+from typing import Dict
+import threading
+import time
+
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HALF_OPEN = 'HALF_OPEN'
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, for `cooldown_seconds`"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 10.0):
+
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = HALF_OPEN
+
+            # Half-open admits a single probe; everyone else keeps failing fast until it reports back
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+
+        # For a call that ended without saying anything about the dependency (e.g. a bug in the caller)
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict:
+
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
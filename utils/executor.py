@@ -0,0 +1,85 @@
+"""
+Keyed executor
+Runs tasks for different keys in parallel on a thread pool while tasks that
+share a key run one at a time, in submission order
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+import threading
+
+
+class KeyedExecutor:
+    """Thread pool with a FIFO queue per key; idle keys hold no memory"""
+
+    def __init__(self, max_workers: int = 8, burst: int = 32, name: str = 'keyed'):
+
+        self.burst = burst
+        self.submitted = 0
+        self.completed = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._max_workers = max_workers
+        # A key is present exactly while a drain for it is scheduled or running
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs) -> Future:
+
+        future = Future()
+        with self._lock:
+            pending = self._queues.get(key)
+            schedule = pending is None
+            if schedule:
+                pending = self._queues[key] = deque()
+            pending.append((future, fn, args, kwargs))
+            self.submitted += 1
+
+        if schedule:
+            self._pool.submit(self._drain, key)
+        return future
+
+    def run(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+
+        return self.submit(key, fn, *args, **kwargs).result()
+
+    def _drain(self, key: Hashable):
+
+        for _ in range(self.burst):
+            with self._lock:
+                pending = self._queues[key]
+                future, fn, args, kwargs = pending[0]
+
+            # The task stays at the head while it runs, so new submissions queue behind it
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+
+            with self._lock:
+                pending.popleft()
+                self.completed += 1
+                if not pending:
+                    del self._queues[key]
+                    return
+
+        # A busy key yields its worker so other keys are not starved
+        self._pool.submit(self._drain, key)
+
+    def stats(self) -> Dict[str, int]:
+
+        with self._lock:
+            return {
+                'workers': self._max_workers,
+                'active_keys': len(self._queues),
+                'queued': sum(len(pending) for pending in self._queues.values()),
+                'submitted': self.submitted,
+                'completed': self.completed
+            }
+
+    def shutdown(self, wait: bool = True):
+
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,61 @@
+"""
+Time-ordered identifiers
+ULID-style IDs: 48-bit millisecond timestamp followed by 80 random bits,
+encoded as 26 Crockford base32 characters so string order is time order.
+"""
+
+import os
+import threading
+import time
+
+
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+
+class IdGenerator:
+    """Monotonic ULID generator, safe across threads and forked processes"""
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+        self._pid = os.getpid()
+
+    def new_ulid(self) -> str:
+
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+
+            # A forked child must not continue the parent's random sequence
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._last_ms = -1
+
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_random = int.from_bytes(os.urandom(10), 'big')
+            elif self._last_random < _RANDOM_MAX:
+                # Same millisecond (or clock stepped back): keep strictly increasing
+                self._last_random += 1
+            else:
+                self._last_ms += 1
+                self._last_random = int.from_bytes(os.urandom(10), 'big')
+
+            value = (self._last_ms << _RANDOM_BITS) | self._last_random
+
+        chars = []
+        for _ in range(26):
+            chars.append(_ALPHABET[value & 31])
+            value >>= 5
+        return ''.join(reversed(chars))
+
+
+_generator = IdGenerator()
+
+
+def new_id(prefix: str) -> str:
+
+    return f"{prefix}_{_generator.new_ulid()}"
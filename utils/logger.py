@@ -5,6 +5,21 @@ from datetime import datetime
 import config
 
 
+class LazyFileHandler(logging.FileHandler):
+
+    # Neither the log directory nor the file is touched until the first record is written
+    def __init__(self, filename: str):
+
+        super().__init__(filename, delay=True)
+    
+    def _open(self):
+
+        log_dir = os.path.dirname(self.baseFilename)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        return super()._open()
+
+
 def setup_logger(name: str = 'transaction_monitor') -> logging.Logger:
 
     logger = logging.getLogger(name)
@@ -15,12 +30,7 @@ def setup_logger(name: str = 'transaction_monitor') -> logging.Logger:
         return logger
     
 
-    log_dir = os.path.dirname(config.LOG_FILE)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-
-    file_handler = logging.FileHandler(config.LOG_FILE)
+    file_handler = LazyFileHandler(config.LOG_FILE)
     file_handler.setLevel(logging.DEBUG)
     
 
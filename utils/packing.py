@@ -0,0 +1,142 @@
+"""
+Binary packing helpers
+Length-prefixed little-endian encoding for snapshot files. Unpacker reads
+straight from a buffer (bytes, memoryview or mmap) without copying it first.
+"""
+
+from typing import Any
+import struct
+
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+
+# Type tags for value()
+_NONE, _INT, _FLOAT, _STR, _TRUE, _FALSE = range(6)
+
+
+class Packer:
+
+    def __init__(self):
+
+        self.buffer = bytearray()
+
+    def u8(self, value: int):
+
+        self.buffer += _U8.pack(value)
+
+    def u32(self, value: int):
+
+        self.buffer += _U32.pack(value)
+
+    def u64(self, value: int):
+
+        self.buffer += _U64.pack(value)
+
+    def i64(self, value: int):
+
+        self.buffer += _I64.pack(value)
+
+    def f64(self, value: float):
+
+        self.buffer += _F64.pack(value)
+
+    def blob(self, value: bytes):
+
+        self.u32(len(value))
+        self.buffer += value
+
+    def str(self, value: str):
+
+        self.blob(value.encode('utf-8'))
+
+    def value(self, value: Any):
+
+        # Tagged scalar, for database rows whose column types vary
+        if value is None:
+            self.u8(_NONE)
+        elif value is True or value is False:
+            self.u8(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            self.u8(_INT)
+            self.i64(value)
+        elif isinstance(value, float):
+            self.u8(_FLOAT)
+            self.f64(value)
+        else:
+            self.u8(_STR)
+            self.str(str(value))
+
+    def getvalue(self) -> bytes:
+
+        return bytes(self.buffer)
+
+
+class Unpacker:
+
+    def __init__(self, buffer, offset: int = 0):
+
+        self.buffer = memoryview(buffer)
+        self.offset = offset
+
+    def _read(self, fmt: struct.Struct):
+
+        (value,) = fmt.unpack_from(self.buffer, self.offset)
+        self.offset += fmt.size
+        return value
+
+    def u8(self) -> int:
+
+        return self._read(_U8)
+
+    def u32(self) -> int:
+
+        return self._read(_U32)
+
+    def u64(self) -> int:
+
+        return self._read(_U64)
+
+    def i64(self) -> int:
+
+        return self._read(_I64)
+
+    def f64(self) -> float:
+
+        return self._read(_F64)
+
+    def view(self, length: int) -> memoryview:
+
+        if self.offset + length > len(self.buffer):
+            raise ValueError("Truncated buffer")
+        view = self.buffer[self.offset:self.offset + length]
+        self.offset += length
+        return view
+
+    def blob(self) -> memoryview:
+
+        return self.view(self.u32())
+
+    def str(self) -> str:
+
+        return str(self.blob(), 'utf-8')
+
+    def value(self) -> Any:
+
+        tag = self.u8()
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _INT:
+            return self.i64()
+        if tag == _FLOAT:
+            return self.f64()
+        if tag == _STR:
+            return self.str()
+        raise ValueError(f"Unknown value tag {tag}")
@@ -0,0 +1,209 @@
+"""
+Probabilistic counters
+Count-min sketches with fixed memory regardless of key cardinality, a
+time-bucketed ring of them for sliding-window counts, and HyperLogLog
+registers for distinct counts
+"""
+
+from array import array
+from typing import Dict, Iterable, Tuple
+import hashlib
+import math
+import threading
+
+from utils.packing import Packer, Unpacker
+
+
+def _hash_pair(key: str) -> Tuple[int, int]:
+
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class CountMinSketch:
+    """Never underestimates; overestimates by at most epsilon * total with probability 1 - delta"""
+
+    def __init__(self, width: int, depth: int):
+
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._table = array('I', bytes(4 * width * depth))
+
+    @classmethod
+    def from_error(cls, epsilon: float, delta: float) -> 'CountMinSketch':
+
+        return cls(
+            width=math.ceil(math.e / epsilon),
+            depth=math.ceil(math.log(1 / delta))
+        )
+
+    def _cells(self, key: str):
+
+        # Kirsch-Mitzenmacher: depth indexes from two hashes instead of depth hash functions
+        h1, h2 = _hash_pair(key)
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1):
+
+        table = self._table
+        for cell in self._cells(key):
+            table[cell] += count
+        self.total += count
+
+    def estimate(self, key: str) -> int:
+
+        table = self._table
+        return min(table[cell] for cell in self._cells(key))
+
+    @property
+    def memory_bytes(self) -> int:
+
+        return self._table.itemsize * len(self._table)
+
+
+class WindowedCountMin:
+    """Ring of count-min sketches, one per time bucket, covering a sliding window"""
+
+    def __init__(self, window_seconds: int, bucket_seconds: int, epsilon: float, delta: float):
+
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.epsilon = epsilon
+        self.delta = delta
+        self._buckets: Dict[int, CountMinSketch] = {}
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def _live(self, bucket: int) -> bool:
+
+        span = math.ceil(self.window_seconds / self.bucket_seconds)
+        return self._latest is None or bucket > self._latest - span
+
+    def _advance(self, bucket: int):
+
+        if self._latest is not None and bucket <= self._latest:
+            return
+
+        self._latest = bucket
+        for old in [b for b in self._buckets if not self._live(b)]:
+            del self._buckets[old]
+
+    def add(self, key: str, timestamp: float, count: int = 1):
+
+        bucket = int(timestamp // self.bucket_seconds)
+        with self._lock:
+            self._advance(bucket)
+            if not self._live(bucket):
+                # Older than the window: it can no longer affect any estimate
+                return
+
+            sketch = self._buckets.get(bucket)
+            if sketch is None:
+                sketch = self._buckets[bucket] = CountMinSketch.from_error(self.epsilon, self.delta)
+            sketch.add(key, count)
+
+    def estimate(self, key: str, timestamp: float) -> int:
+
+        bucket = int(timestamp // self.bucket_seconds)
+        span = math.ceil(self.window_seconds / self.bucket_seconds)
+        with self._lock:
+            return sum(
+                sketch.estimate(key)
+                for b, sketch in self._buckets.items()
+                if bucket - span < b <= bucket
+            )
+
+    def dump(self, packer: Packer):
+
+        with self._lock:
+            packer.i64(self._latest if self._latest is not None else -1)
+            packer.u32(len(self._buckets))
+            for bucket, sketch in self._buckets.items():
+                packer.i64(bucket)
+                packer.u32(sketch.width)
+                packer.u32(sketch.depth)
+                packer.u64(sketch.total)
+                packer.blob(sketch._table.tobytes())
+
+    def load(self, unpacker: Unpacker):
+
+        latest = unpacker.i64()
+        buckets = {}
+        for _ in range(unpacker.u32()):
+            bucket = unpacker.i64()
+            sketch = CountMinSketch(unpacker.u32(), unpacker.u32())
+            sketch.total = unpacker.u64()
+            table = unpacker.blob()
+            if len(table) != len(sketch._table) * sketch._table.itemsize:
+                raise ValueError("Sketch size does not match its dimensions")
+            sketch._table = array('I')
+            sketch._table.frombytes(table)
+            buckets[bucket] = sketch
+
+        with self._lock:
+            self._buckets = buckets
+            self._latest = latest if latest >= 0 else None
+
+    def stats(self) -> Dict:
+
+        with self._lock:
+            sketches = list(self._buckets.values())
+        return {
+            'buckets': len(sketches),
+            'events': sum(s.total for s in sketches),
+            'memory_bytes': sum(s.memory_bytes for s in sketches)
+        }
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision one-byte registers; mergeable by register-wise max"""
+
+    def __init__(self, precision: int = 6, registers: bytearray = None):
+
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    def add(self, key: str):
+
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        h = int.from_bytes(digest, 'little')
+        index = h >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = h & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+
+        self.registers = merge_registers([self.registers, other.registers])
+
+    def count(self) -> int:
+
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is far more accurate while most registers are still empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def copy(self) -> 'HyperLogLog':
+
+        return HyperLogLog(self.precision, bytearray(self.registers))
+
+
+def merge_registers(register_sets: Iterable[bytearray]) -> bytearray:
+
+    merged = None
+    for registers in register_sets:
+        if merged is None:
+            merged = bytearray(registers)
+        else:
+            merged = bytearray(map(max, merged, registers))
+    return merged
@@ -1,6 +1,7 @@
 
 from typing import Tuple, Dict
 from datetime import datetime
+import config
 
 
 def validate_transaction_data(data: dict) -> Tuple[bool, str]:
@@ -89,6 +90,17 @@ def validate_timestamp(timestamp: str) -> Tuple[bool, str]:
         return False, "timestamp must be in ISO 8601 format (e.g., '2026-01-26T14:30:00')"
 
 
+def validate_idempotency_key(idempotency_key: str) -> Tuple[bool, str]:
+
+    if not idempotency_key or not idempotency_key.strip():
+        return False, "Idempotency-Key must be a non-empty string"
+    
+    if len(idempotency_key) > 255:
+        return False, "Idempotency-Key must be at most 255 characters"
+    
+    return True, None
+
+
 def validate_alert_resolution(data: dict) -> Tuple[bool, str]:
 
     if 'resolution' not in data:
@@ -102,4 +114,127 @@ def validate_alert_resolution(data: dict) -> Tuple[bool, str]:
     if data['resolution'] not in valid_resolutions:
         return False, f"Invalid resolution. Must be one of: {', '.join(valid_resolutions)}"
     
-    return True, None
\ No newline at end of file
+    return True, None
+
+
+def validate_bulk_alert_resolution(data: dict) -> Tuple[bool, str]:
+
+    is_valid, error = validate_alert_resolution(data)
+    if not is_valid:
+        return False, error
+    
+
+    has_ids = 'alert_ids' in data
+    has_filter = 'filter' in data
+    if has_ids == has_filter:
+        return False, "Provide exactly one of: alert_ids, filter"
+    
+
+    if has_ids:
+        alert_ids = data['alert_ids']
+        if not isinstance(alert_ids, list) or not alert_ids:
+            return False, "alert_ids must be a non-empty list"
+        
+        if len(alert_ids) > 50000:
+            return False, "alert_ids must contain at most 50000 IDs"
+        
+        if not all(isinstance(alert_id, str) and alert_id for alert_id in alert_ids):
+            return False, "alert_ids must contain non-empty strings"
+        
+        return True, None
+    
+
+    filters = data['filter']
+    allowed = {'rule_name', 'severity', 'start_time', 'end_time'}
+    if not isinstance(filters, dict) or not filters:
+        return False, f"filter must be an object with at least one of: {', '.join(sorted(allowed))}"
+    
+    unknown = set(filters) - allowed
+    if unknown:
+        return False, f"Unknown filter field(s): {', '.join(sorted(unknown))}"
+    
+    # A blank or null value would otherwise widen the update to every OPEN alert
+    for field, value in filters.items():
+        if not isinstance(value, str) or not value.strip():
+            return False, f"filter.{field} must be a non-empty string"
+    
+    if 'severity' in filters and filters['severity'] not in config.ALERT_SEVERITY_PRIORITY:
+        return False, f"filter.severity must be one of: {', '.join(config.ALERT_SEVERITY_PRIORITY)}"
+    
+    for field in ('start_time', 'end_time'):
+        if field in filters:
+            is_valid, error = validate_timestamp(filters[field])
+            if not is_valid:
+                return False, f"{field}: {error}"
+    
+    return True, None
+
+
+def validate_alert_claim(data: dict) -> Tuple[bool, str]:
+
+    analyst = data.get('analyst')
+    if not isinstance(analyst, str) or not analyst.strip():
+        return False, "Missing required field: analyst"
+    
+    limit = data.get('limit', 1)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= config.ALERT_CLAIM_MAX_BATCH:
+        return False, f"limit must be an integer between 1 and {config.ALERT_CLAIM_MAX_BATCH}"
+    
+    severities = data.get('severities')
+    if severities is not None:
+        if not isinstance(severities, list) or not severities \
+                or not all(isinstance(s, str) and s for s in severities):
+            return False, "severities must be a non-empty list of strings"
+    
+    return _validate_lease_seconds(data)
+
+
+def validate_alert_lease(data: dict) -> Tuple[bool, str]:
+
+    analyst = data.get('analyst')
+    if not isinstance(analyst, str) or not analyst.strip():
+        return False, "Missing required field: analyst"
+    
+    alert_ids = data.get('alert_ids')
+    if not isinstance(alert_ids, list) or not alert_ids:
+        return False, "alert_ids must be a non-empty list"
+    
+    if len(alert_ids) > config.ALERT_CLAIM_MAX_BATCH:
+        return False, f"alert_ids must contain at most {config.ALERT_CLAIM_MAX_BATCH} IDs"
+    
+    if not all(isinstance(alert_id, str) and alert_id for alert_id in alert_ids):
+        return False, "alert_ids must contain non-empty strings"
+    
+    return _validate_lease_seconds(data)
+
+
+def _validate_lease_seconds(data: dict) -> Tuple[bool, str]:
+
+    lease_seconds = data.get('lease_seconds')
+    if lease_seconds is None:
+        return True, None
+    
+    if not isinstance(lease_seconds, int) or isinstance(lease_seconds, bool) \
+            or not 1 <= lease_seconds <= config.ALERT_LEASE_MAX_SECONDS:
+        return False, f"lease_seconds must be an integer between 1 and {config.ALERT_LEASE_MAX_SECONDS}"
+    
+    return True, None
+
+
+def validate_export_request(data: dict) -> Tuple[bool, str]:
+
+    kind = data.get('kind')
+    if not isinstance(kind, str) or not kind:
+        return False, "Missing required field: kind"
+    
+    for field in ('format', 'user_id'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return False, f"{field} must be a string"
+    
+    for field in ('start_date', 'end_date'):
+        if data.get(field) is not None:
+            is_valid, _ = validate_timestamp(data[field])
+            if not is_valid:
+                return False, f"{field} must be in ISO 8601 format (e.g., '2026-01-26T14:30:00')"
+    
+    return True, None